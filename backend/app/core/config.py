@@ -15,6 +15,7 @@ class Settings(BaseSettings):
     # App
     DEBUG: bool = True
     CORS_ORIGINS: str = "http://localhost:3000"
+    ADMIN_USER_IDS: str = ""  # Comma-separated user ids allowed to call /api/admin endpoints
 
     # Trading / IPO (primary offering)
     IPO_PERCENT: float = 0.20  # 20% of total shares sold by the system at IPO price
@@ -32,15 +33,67 @@ class Settings(BaseSettings):
     TRADING_BAND_BASE_MAX_MULTIPLIER: float = 2.0  # Base max multiplier before hype bonus
     TRADING_BAND_HYPE_FACTOR: float = 0.05  # Each completed trade adds this to max multiplier
 
+    # Post-IPO price adjustments applied on top of the last trade price
+    # new_price = trade_price * (1 + DEMAND * demand_boost - SUPPLY * supply_pressure + ENGAGEMENT * engagement_score)
+    POST_IPO_DEMAND_FACTOR: float = 0.05  # Max boost when a buy sweeps the whole ask side
+    POST_IPO_SUPPLY_FACTOR: float = 0.03  # Max discount when a listing doubles (or creates) ask supply
+    POST_IPO_ENGAGEMENT_FACTOR: float = 0.02  # Max nudge from net upvote/downvote sentiment
+    POST_IPO_COMMENTS_WEIGHT: float = 0.5  # Weight of comments in the engagement score
+
     # Secondary-market fees (seller-only)
     MAKER_FEE_BPS: int = 30  # 0.30% fee taken from seller proceeds
     BURN_SHARE_BPS: int = 5000  # 50% of the fee is burned
     CREATOR_FEE_SHARE_BPS: int = 2000  # 20% of remaining fee goes to creator
     TREASURY_DOC_ID: str = "admin"  # db.treasury document id for admin fees
+    FEE_FLUSH_INTERVAL_SECONDS: float = 5.0  # Buffered treasury fees are written at least this often
+    FEE_FLUSH_MAX_FILLS: int = 500  # ...or as soon as this many fee-paying fills have accumulated
+
+    # Rolling 24h stats (volume_24h, price_change_24h, high/low, trend_status) are written to memes this often
+    ROLLING_STATS_PERSIST_SECONDS: float = 30.0
+    # trend_status from streaming estimators over tick returns
+    TREND_EWMA_ALPHA: float = 0.2  # Weight of the newest tick in the EWMA return / variance
+    TREND_MOVE_PCT: float = 10.0  # 24h change (in the EWMA's direction) that makes a meme HOT or COLD
+    TREND_VOLATILE_PCT: float = 5.0  # Rolling stddev of tick returns (%) that makes a meme VOLATILE
+
+    # Votes/comments/reports reprice a meme at most once per this many seconds
+    ENGAGEMENT_REPRICE_SECONDS: float = 1.0
+
+    # Matching actors (one single-writer worker per meme)
+    MATCHING_MAX_BATCH: int = 64  # Max queued orders a worker drains per tick
+    MATCHING_ACTOR_IDLE_SECONDS: float = 300.0  # Stop a meme's worker after this long without orders
+    BATCH_MAX_ORDERS: int = 100  # Max orders accepted by POST /trading/orders/batch
+
+    # Bulk intrinsic value / trading band recompute
+    BAND_RECOMPUTE_CHUNK_SIZE: int = 10000  # Memes per bulk_write
+
+    # MemeStreet market index (GET /api/market/index)
+    MARKET_INDEX_BASE: float = 1000.0  # Index level when it is first computed
+    MARKET_INDEX_TICK_SECONDS: float = 5.0  # Index levels are recorded as candle ticks this often
+
+    # Live price stream (GET /api/stream/prices)
+    PRICE_STREAM_MIN_INTERVAL: float = 0.25  # Ticks are conflated per client and sent at most this often
+    PRICE_STREAM_KEEPALIVE_SECONDS: float = 15.0  # Comment line sent when a client had no ticks for this long
+    PRICE_STREAM_MAX_MEMES: int = 200  # Max memes in one subscription
+
+    # List pagination (meme list, transaction history)
+    LIST_COUNT_CACHE_SECONDS: float = 30.0  # Exact totals are recounted at most this often per filter
+    LIST_COUNT_CACHE_MAX_ENTRIES: int = 10000  # Cached totals kept across all filters
+
+    # Meme search (GET /memes?search=)
+    SEARCH_MAX_RESULTS: int = 200  # Ranked results per search; deeper pages are empty
+
+    # Response cache for GET /memes, /memes/trending, /memes/featured
+    RESPONSE_CACHE_TTL_SECONDS: float = 5.0  # Entries expire after this long even without invalidation
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1024  # Least recently used entries are evicted beyond this
     
+
     @property
     def cors_origins_list(self) -> List[str]:
         return [origin.strip() for origin in self.CORS_ORIGINS.split(",")]
+
+    @property
+    def admin_user_ids_list(self) -> List[str]:
+        return [uid.strip() for uid in self.ADMIN_USER_IDS.split(",") if uid.strip()]
     
     class Config:
         env_file = ".env"
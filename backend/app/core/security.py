@@ -143,3 +143,16 @@ async def get_optional_user_id(
         return None
     
     return payload.get("sub")
+
+
+async def require_admin(user_id: str = Depends(get_current_user_id)) -> str:
+    """
+    Dependency for admin-only endpoints.
+    Admins are the user ids listed in settings.ADMIN_USER_IDS.
+    """
+    if user_id not in settings.admin_user_ids_list:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
+        )
+    return user_id
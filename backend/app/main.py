@@ -3,8 +3,20 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.config import settings
 from app.core.database import connect_to_mongo, close_mongo_connection
-from app.routes import auth_router, memes_router, trading_router
-from app.services.meme_service import seed_sample_memes, migrate_legacy_memes
+from app.routes import auth_router, memes_router, trading_router, admin_router, stream_router, market_router
+from app.services.meme_service import (
+    seed_sample_memes, migrate_legacy_memes, reconcile_open_order_counters, ensure_meme_indexes,
+)
+from app.services.trading_service import ensure_transaction_indexes
+from app.services.search_service import ensure_search_indexes
+from app.services.vote_service import ensure_vote_indexes, migrate_vote_arrays, reconcile_vote_counters
+from app.services.orderbook import load_order_books
+from app.services.candle_service import ensure_candle_indexes, migrate_price_history_to_candles
+from app.services.matching_actor import stop_matching_actors
+from app.services.fee_accumulator import fee_accumulator
+from app.services.rolling_stats import rolling_stats
+from app.services.engagement_repricer import engagement_repricer
+from app.services.market_index import market_index
 
 # Create FastAPI app
 app = FastAPI(
@@ -34,11 +46,57 @@ async def startup_event():
     await seed_sample_memes()
     # Migrate legacy memes to use orderbook system
     await migrate_legacy_memes()
+    # Compound indexes for the cursor-paginated meme list and transaction histories
+    await ensure_meme_indexes()
+    await ensure_transaction_indexes()
+    # Ticker prefix and full-text indexes for meme search
+    await ensure_search_indexes()
+    # Move legacy upvoted_by/downvoted_by/reported_by arrays into the votes and reports collections
+    await ensure_vote_indexes()
+    moved = await migrate_vote_arrays()
+    if moved:
+        print(f"Moved votes and reports of {moved} memes into their own collections")
+    # Move embedded price_history arrays into the candles collection
+    await ensure_candle_indexes()
+    moved = await migrate_price_history_to_candles()
+    if moved:
+        print(f"Moved price history of {moved} memes into candles")
+    # Rebuild in-memory order books from open orders
+    loaded = await load_order_books()
+    print(f"Loaded {loaded} open orders into the order books")
+    # Repair drift in the denormalized open order counters on memes
+    fixed = await reconcile_open_order_counters()
+    if fixed:
+        print(f"Reconciled open order counters on {fixed} memes")
+    # Repair drift in the denormalized vote and report counters on memes
+    fixed = await reconcile_vote_counters()
+    if fixed:
+        print(f"Reconciled vote counters on {fixed} memes")
+    # Rebuild rolling 24h stats from the last day of candles, then keep them persisted
+    tracked = await rolling_stats.load_from_candles()
+    await rolling_stats.reset_untracked()
+    await rolling_stats.persist()
+    print(f"Rolling 24h stats tracking {tracked} memes")
+    rolling_stats.start()
+    # Sum market caps once; the index is then kept up to date by every price change
+    indexed = await market_index.load()
+    print(f"Market index over {indexed} memes at {market_index.snapshot()['value']}")
+    market_index.start()
+    # Apply debounced engagement repricing
+    engagement_repricer.start()
+    # Start periodic treasury fee flushes
+    fee_accumulator.start()
 
 
 # Shutdown event - close MongoDB connection
 @app.on_event("shutdown")
 async def shutdown_event():
+    # Let queued trades finish before the connection goes away
+    await stop_matching_actors()
+    await engagement_repricer.stop()
+    await fee_accumulator.stop()
+    await market_index.stop()
+    await rolling_stats.stop()
     await close_mongo_connection()
 
 
@@ -61,6 +119,9 @@ async def health_check():
 app.include_router(auth_router, prefix="/api")
 app.include_router(memes_router, prefix="/api")
 app.include_router(trading_router, prefix="/api")
+app.include_router(admin_router, prefix="/api")
+app.include_router(stream_router, prefix="/api")
+app.include_router(market_router, prefix="/api")
 
 
 # For debugging - show all routes
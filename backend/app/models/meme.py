@@ -27,6 +27,14 @@ class TrendStatus(str, Enum):
     VOLATILE = "volatile"  # Big swings
 
 
+class CandleResolution(str, Enum):
+    """OHLCV bar sizes kept in the candles collection."""
+    ONE_MINUTE = "1m"
+    FIVE_MINUTES = "5m"
+    ONE_HOUR = "1h"
+    ONE_DAY = "1d"
+
+
 # ============ Comment Model ============
 class CommentBase(BaseModel):
     """Base comment fields."""
@@ -76,6 +84,8 @@ class MemeInDB(MemeBase):
     previous_price: float = 10.0
     price_change_24h: float = 0.0
     price_change_percent_24h: float = 0.0
+    high_24h: Optional[float] = None
+    low_24h: Optional[float] = None
     all_time_high: float = 10.0
     all_time_low: float = 10.0
     
@@ -101,11 +111,7 @@ class MemeInDB(MemeBase):
     comments_count: int = 0
     reports_count: int = 0
     shares_count: int = 0  # Social shares
-    
-    # Lists of user IDs who engaged
-    upvoted_by: List[str] = []
-    downvoted_by: List[str] = []
-    reported_by: List[str] = []
+    # Who voted/reported is kept in the votes and reports collections (vote_service)
     
     # Status
     trend_status: TrendStatus = TrendStatus.STABLE
@@ -118,9 +124,6 @@ class MemeInDB(MemeBase):
     
     # Comments stored inline (for simplicity)
     comments: List[Comment] = []
-    
-    # Price history (last 30 data points)
-    price_history: List[dict] = []  # [{timestamp, price}]
 
 
 class MemeResponse(BaseModel):
@@ -137,6 +140,8 @@ class MemeResponse(BaseModel):
     previous_price: float
     price_change_24h: float
     price_change_percent_24h: float
+    high_24h: Optional[float] = None
+    low_24h: Optional[float] = None
     
     total_shares: int
     available_shares: int
@@ -167,10 +172,22 @@ class MemeResponse(BaseModel):
 class MemeListResponse(BaseModel):
     """Response for meme list with pagination."""
     memes: List[MemeResponse]
-    total: int
+    total: Optional[int] = None  # Omitted when include_total=false
     page: int
     per_page: int
-    total_pages: int
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None  # Pass as `cursor` for the next page; None on the last page
+
+
+# ============ Candle Models ============
+class Candle(BaseModel):
+    """One OHLCV bar; `t` is the start of the bar (UTC)."""
+    t: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: int = 0
 
 
 # ============ Price Update Rules ============
@@ -10,6 +10,13 @@ class TransactionType(str, Enum):
     SELL = "sell"
 
 
+class TimeInForce(str, Enum):
+    """How long an order may stay in the book."""
+    GTC = "GTC"  # Good 'til cancelled: any unfilled remainder rests in the book
+    IOC = "IOC"  # Immediate or cancel: fill what is available now, drop the rest
+    FOK = "FOK"  # Fill or kill: fill the whole quantity now or nothing
+
+
 class TransactionStatus(str, Enum):
     """Transaction status."""
     PENDING = "pending"
@@ -26,6 +33,8 @@ class TransactionCreate(BaseModel):
     quantity: int = Field(..., ge=1)
     # Optional seller-defined minimum price per share for post-IPO sell listings.
     limit_price: Optional[float] = Field(None, gt=0)
+    # Post-IPO only; IOC/FOK orders never rest in the book.
+    time_in_force: TimeInForce = TimeInForce.GTC
 
 
 class TransactionInDB(BaseModel):
@@ -60,12 +69,29 @@ class TransactionResponse(BaseModel):
     created_at: datetime
 
 
+class BatchOrderRequest(BaseModel):
+    """Several orders submitted in one request (market makers, bots)."""
+    orders: List[TransactionCreate] = Field(..., min_length=1)
+
+
+class BatchOrderResult(BaseModel):
+    """Outcome of one order in a batch, in request order."""
+    index: int
+    meme_id: str
+    success: bool
+    transaction: Optional[TransactionResponse] = None
+    new_balance: Optional[float] = None
+    error: Optional[str] = None
+
+
 class TransactionHistory(BaseModel):
     """User's transaction history."""
     transactions: List[TransactionResponse]
-    total: int
+    total: Optional[int] = None
     page: int
     per_page: int
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None
 
 
 # ============ Engagement Actions ============
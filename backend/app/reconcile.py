@@ -0,0 +1,49 @@
+"""
+Maintenance jobs that recompute denormalized meme fields.
+
+    python -m app.reconcile            # same as `counters`
+    python -m app.reconcile counters
+    python -m app.reconcile votes
+    python -m app.reconcile bands
+
+counters: recompute open_sell_qty / open_buy_qty on memes from open
+orders. The API also does this on startup; run it by hand after manual
+edits to `orders`, preferably while trading is quiet (counters are $set).
+
+votes: recompute upvotes / downvotes / reports_count on memes from the
+votes and reports collections. Also run on startup.
+
+bands: recompute intrinsic value and trading band for every meme with the
+current settings (also available as POST /api/admin/recompute-bands).
+"""
+
+import asyncio
+import sys
+
+from app.core.database import connect_to_mongo, close_mongo_connection
+from app.services.meme_service import reconcile_open_order_counters
+from app.services.vote_service import reconcile_vote_counters
+
+
+async def main(job: str):
+    await connect_to_mongo()
+    try:
+        if job == "votes":
+            fixed = await reconcile_vote_counters()
+            print(f"Reconciled vote counters on {fixed} memes")
+        elif job == "bands":
+            from app.services.valuation import recompute_all_bands
+            stats = await recompute_all_bands()
+            print(f"Recomputed bands for {stats['memes']} memes ({stats['updated']} changed) in {stats['total_seconds']}s")
+        else:
+            fixed = await reconcile_open_order_counters()
+            print(f"Reconciled open order counters on {fixed} memes")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    job = sys.argv[1] if len(sys.argv) > 1 else "counters"
+    if job not in ("counters", "votes", "bands"):
+        sys.exit(f"Unknown job {job!r}; expected 'counters', 'votes' or 'bands'")
+    asyncio.run(main(job))
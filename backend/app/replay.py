@@ -0,0 +1,96 @@
+"""
+Replay recorded order flow under alternative settings and compare the results.
+
+    python -m app.replay --since 2026-09-01 --until 2026-10-01 \
+        --grid POST_IPO_DEMAND_FACTOR=0.02,0.05,0.1,0.2 \
+        --grid MAKER_FEE_BPS=10,30,50,100
+
+Every combination of the --grid values is one configuration (the example
+is 16); the current settings are always replayed first as the baseline.
+The history is loaded once and configurations run in parallel worker
+processes (--workers, default: CPU count). Results are printed as a table;
+--json writes them to a file as well. See services/market_replay.py for
+what is and isn't replayed.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List
+
+from app.core.database import connect_to_mongo, close_mongo_connection
+from app.services.market_replay import REPLAY_SETTINGS, load_history, init_worker, replay_in_worker
+
+
+COLUMNS = (
+    "orders", "rejected", "trades", "volume", "notional", "fees",
+    "tick_volatility_pct", "mean_abs_drift_vs_recorded_pct", "seconds",
+)
+
+
+def parse_grid(specs: List[str]) -> List[Dict[str, float]]:
+    """['A=1,2', 'B=3'] -> [{'A': 1.0, 'B': 3.0}, {'A': 2.0, 'B': 3.0}]"""
+    axes = []
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        name = name.strip()
+        if name not in REPLAY_SETTINGS:
+            raise ValueError(f"{name!r} can't be replayed; choose from {', '.join(REPLAY_SETTINGS)}")
+        axes.append([(name, float(v)) for v in values.split(",") if v.strip()])
+    return [dict(combo) for combo in itertools.product(*axes)] if axes else []
+
+
+def _print_table(results: List[dict]) -> None:
+    print("config".ljust(48) + "".join(c[:12].rjust(14) for c in COLUMNS))
+    for result in results:
+        label = ", ".join(f"{k}={v:g}" for k, v in result["overrides"].items()) or "baseline (current settings)"
+        print(label[:47].ljust(48) + "".join(str(result[c]).rjust(14) for c in COLUMNS))
+
+
+async def load(args) -> tuple:
+    await connect_to_mongo()
+    try:
+        return await load_history(args.since, args.until, args.memes)
+    finally:
+        await close_mongo_connection()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Start of the window (UTC, ISO format)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="End of the window (UTC, ISO format)")
+    parser.add_argument("--memes", type=lambda s: [m.strip() for m in s.split(",") if m.strip()], help="Comma-separated meme ids")
+    parser.add_argument("--grid", action="append", default=[], metavar="SETTING=v1,v2,...")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    try:
+        configs = [{}] + parse_grid(args.grid)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    started = time.perf_counter()
+    memes, events = asyncio.run(load(args))
+    print(f"Loaded {len(events)} order events on {len(memes)} memes in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    workers = max(1, min(args.workers, len(configs)))
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(memes, events)) as pool:
+        results = list(pool.map(replay_in_worker, configs))
+    print(f"Replayed {len(configs)} configurations on {workers} workers in {time.perf_counter() - started:.1f}s\n")
+
+    _print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
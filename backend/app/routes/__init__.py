@@ -1,5 +1,8 @@
 from .auth import router as auth_router
 from .memes import router as memes_router
 from .trading import router as trading_router
+from .admin import router as admin_router
+from .stream import router as stream_router
+from .market import router as market_router
 
-__all__ = ["auth_router", "memes_router", "trading_router"]
+__all__ = ["auth_router", "memes_router", "trading_router", "admin_router", "stream_router", "market_router"]
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, Query
+
+from app.core.security import require_admin
+from app.services.valuation import recompute_all_bands
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+
+@router.post("/recompute-bands", response_model=dict)
+async def recompute_bands(
+    chunk_size: int = Query(0, ge=0, le=100000),
+    admin_id: str = Depends(require_admin)
+):
+    """
+    Recompute intrinsic value and trading band for every meme with the current
+    settings and store them (only memes whose values changed are written).
+    Prices outside their new band are clamped into it.
+    """
+    stats = await recompute_all_bands(chunk_size)
+    return {"success": True, **stats}
+
+
+@router.get("/band-cache", response_model=dict)
+async def band_cache_stats(admin_id: str = Depends(require_admin)):
+    """Trading band cache size and hit/miss counters."""
+    from app.services.band_cache import band_cache
+    return band_cache.stats()
+
+
+@router.get("/response-cache", response_model=dict)
+async def response_cache_stats(admin_id: str = Depends(require_admin)):
+    """Meme list/trending/featured response cache size and hit/miss counters."""
+    from app.services.response_cache import response_cache
+    return response_cache.stats()
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Query
+from typing import Optional
+from datetime import datetime
+
+from app.models.meme import MemeCategory, CandleResolution
+from app.services.market_index import market_index, INDEX_KEY, category_key
+from app.services.candle_service import get_candles
+
+router = APIRouter(prefix="/market", tags=["Market"])
+
+
+@router.get("/index")
+async def get_market_index():
+    """
+    MemeStreet index: cap-weighted level of the whole market, with 24h stats,
+    plus one sub-index per meme category.
+    """
+    return market_index.snapshot()
+
+
+@router.get("/index/candles")
+async def get_market_index_candles(
+    category: Optional[MemeCategory] = None,
+    res: CandleResolution = CandleResolution.ONE_HOUR,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    limit: int = Query(500, ge=1, le=1000),
+):
+    """
+    OHLC bars of the market index (or a category sub-index), oldest first.
+    Without `from`, returns the most recent `limit` bars.
+    """
+    key = category_key(category.value) if category else INDEX_KEY
+    candles = await get_candles(key, res, start, end, limit)
+    return {"index": key, "res": res.value, "candles": candles}
@@ -1,17 +1,23 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import Optional
+from datetime import datetime
+from bson import ObjectId
 
 from app.core.security import get_current_user_id, get_optional_user_id
-from app.models.meme import MemeCreate, MemeResponse, MemeListResponse, MemeCategory
+from app.models.meme import MemeCreate, MemeResponse, MemeListResponse, MemeCategory, CandleResolution
 from app.models.transaction import EngagementAction, EngagementResponse, EngagementType
 from app.services.meme_service import (
     create_meme, get_meme_by_id, get_meme_by_ticker, get_all_memes,
     upvote_meme, downvote_meme, add_comment, report_meme,
     get_meme_comments, get_trending_memes, get_featured_memes,
     seed_sample_memes,
-    is_ipo_active, calculate_intrinsic_value, get_trading_band,
+    get_available_shares,
 )
+from app.services.orderbook import get_depth
+from app.services.candle_service import get_candles
+from app.services.band_cache import band_cache
 from app.services.user_service import get_user_by_id
+from app.services.vote_service import UP, DOWN, user_votes
 
 router = APIRouter(prefix="/memes", tags=["Memes"])
 
@@ -24,28 +30,43 @@ async def list_memes(
     category: Optional[str] = None,
     sort_by: str = Query("market_cap", regex="^(market_cap|price|volume|change|upvotes|newest)$"),
     sort_order: str = Query("desc", regex="^(asc|desc)$"),
-    search: Optional[str] = None,
+    search: Optional[str] = Query(None, max_length=100),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
     user_id: Optional[str] = Depends(get_optional_user_id)
 ):
-    """Get all memes with pagination and filters."""
-    memes, total = await get_all_memes(
-        page=page,
-        per_page=per_page,
-        category=category,
-        sort_by=sort_by,
-        sort_order=sort_order,
-        search=search,
-        user_id=user_id
-    )
+    """
+    Get all memes with pagination and filters.
+
+    For infinite scroll, pass the previous response's `next_cursor` as `cursor`
+    (constant cost at any depth; `page` is then ignored) and include_total=false
+    to skip counting. With `search`, results are ranked by relevance (ticker
+    prefix, then full text) and sort_by/sort_order are ignored.
+    """
+    try:
+        memes, total, next_cursor = await get_all_memes(
+            page=page,
+            per_page=per_page,
+            category=category,
+            sort_by=sort_by,
+            sort_order=sort_order,
+            search=search,
+            user_id=user_id,
+            cursor=cursor,
+            include_total=include_total,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    total_pages = (total + per_page - 1) // per_page
+    total_pages = (total + per_page - 1) // per_page if total is not None else None
     
     return MemeListResponse(
         memes=memes,
         total=total,
         page=page,
         per_page=per_page,
-        total_pages=total_pages
+        total_pages=total_pages,
+        next_cursor=next_cursor,
     )
 
 
@@ -67,30 +88,51 @@ async def get_categories():
     return [{"value": c.value, "label": c.value.title()} for c in MemeCategory]
 
 
+@router.get("/{meme_id}/orderbook")
+async def get_meme_orderbook(
+    meme_id: str,
+    levels: int = Query(10, ge=1, le=50)
+):
+    """
+    Aggregated order book depth (price, total quantity, order count per level).
+    Served from the in-memory book, so polling it doesn't touch the database.
+    """
+    if not ObjectId.is_valid(meme_id):
+        raise HTTPException(status_code=404, detail="Meme not found")
+    return get_depth(meme_id, levels)
+
+
+@router.get("/{meme_id}/candles")
+async def get_meme_candles(
+    meme_id: str,
+    res: CandleResolution = CandleResolution.ONE_MINUTE,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    limit: int = Query(500, ge=1, le=1000)
+):
+    """
+    OHLCV bars for a meme at 1m / 5m / 1h / 1d resolution, oldest first.
+    Without `from`, returns the most recent `limit` bars.
+    """
+    if not ObjectId.is_valid(meme_id):
+        raise HTTPException(status_code=404, detail="Meme not found")
+    candles = await get_candles(meme_id, res, start, end, limit)
+    return {"meme_id": meme_id, "res": res.value, "candles": candles}
+
+
 @router.get("/{meme_id}/trading-band")
 async def get_meme_trading_band(meme_id: str):
     """
     Get the trading band for a meme (Post-IPO price limits).
     Returns intrinsic value and min/max allowed listing prices.
+    Served from the band cache; the meme is only loaded after it changed.
     """
-    meme = await get_meme_by_id(meme_id)
-    if not meme:
+    if not ObjectId.is_valid(meme_id):
         raise HTTPException(status_code=404, detail="Meme not found")
-    
-    intrinsic = calculate_intrinsic_value(meme)
-    min_price, max_price = get_trading_band(meme)
-    ipo_active = is_ipo_active(meme)
-    
-    return {
-        "meme_id": meme_id,
-        "intrinsic_value": round(intrinsic, 2),
-        "min_allowed_price": round(min_price, 2),
-        "max_allowed_price": round(max_price, 2),
-        "current_price": round(float(meme.get("current_price", 0)), 2),
-        "ipo_active": ipo_active,
-        "upvotes": meme.get("upvotes", 0),
-        "comments_count": meme.get("comments_count", 0),
-    }
+    band = await band_cache.get_band(meme_id)
+    if band is None:
+        raise HTTPException(status_code=404, detail="Meme not found")
+    return band
 
 
 @router.get("/{meme_id}", response_model=MemeResponse)
@@ -110,7 +152,6 @@ async def get_meme(
     
     if user_id:
         from app.core.database import get_database
-        from bson import ObjectId
         db = get_database()
         user = await db.users.find_one({"_id": ObjectId(user_id)})
         if user:
@@ -119,25 +160,12 @@ async def get_meme(
             if holding:
                 user_owns = holding["quantity_owned"]
         
-        user_upvoted = user_id in meme.get("upvoted_by", [])
-        user_downvoted = user_id in meme.get("downvoted_by", [])
+        vote = (await user_votes(user_id, [meme_id])).get(meme_id)
+        user_upvoted = vote == UP
+        user_downvoted = vote == DOWN
     
     # Determine buyable supply for UI.
-    available_shares = int(meme.get("available_shares", 0))
-    if meme.get("ipo_end_at") is not None and meme.get("ipo_shares_remaining") is not None and meme.get("ipo_price") is not None:
-        if is_ipo_active(meme):
-            available_shares = int(meme.get("ipo_shares_remaining", 0))
-        else:
-            from app.core.database import get_database
-            db = get_database()
-            try:
-                row = await db.orders.aggregate([
-                    {"$match": {"type": "sell", "status": "open", "meme_id": meme_id}},
-                    {"$group": {"_id": "$meme_id", "total": {"$sum": "$quantity_remaining"}}},
-                ]).to_list(length=1)
-                available_shares = int(row[0]["total"]) if row else 0
-            except Exception:
-                available_shares = 0
+    available_shares = get_available_shares(meme)
 
     return MemeResponse(
         id=meme["id"],
@@ -151,6 +179,8 @@ async def get_meme(
         previous_price=meme["previous_price"],
         price_change_24h=meme["price_change_24h"],
         price_change_percent_24h=meme["price_change_percent_24h"],
+        high_24h=meme.get("high_24h"),
+        low_24h=meme.get("low_24h"),
         total_shares=meme["total_shares"],
         available_shares=available_shares,
         market_cap=meme["market_cap"],
@@ -178,21 +208,7 @@ async def get_meme_by_ticker_route(ticker: str):
     if not meme:
         raise HTTPException(status_code=404, detail="Meme not found")
     
-    available_shares = int(meme.get("available_shares", 0))
-    if meme.get("ipo_end_at") is not None and meme.get("ipo_shares_remaining") is not None and meme.get("ipo_price") is not None:
-        if is_ipo_active(meme):
-            available_shares = int(meme.get("ipo_shares_remaining", 0))
-        else:
-            from app.core.database import get_database
-            db = get_database()
-            try:
-                row = await db.orders.aggregate([
-                    {"$match": {"type": "sell", "status": "open", "meme_id": meme["id"]}},
-                    {"$group": {"_id": "$meme_id", "total": {"$sum": "$quantity_remaining"}}},
-                ]).to_list(length=1)
-                available_shares = int(row[0]["total"]) if row else 0
-            except Exception:
-                available_shares = 0
+    available_shares = get_available_shares(meme)
 
     return MemeResponse(
         id=meme["id"],
@@ -206,6 +222,8 @@ async def get_meme_by_ticker_route(ticker: str):
         previous_price=meme["previous_price"],
         price_change_24h=meme["price_change_24h"],
         price_change_percent_24h=meme["price_change_percent_24h"],
+        high_24h=meme.get("high_24h"),
+        low_24h=meme.get("low_24h"),
         total_shares=meme["total_shares"],
         available_shares=available_shares,
         market_cap=meme["market_cap"],
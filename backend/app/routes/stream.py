@@ -0,0 +1,75 @@
+import asyncio
+import json
+from typing import Optional
+from bson import ObjectId
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.core.config import settings
+from app.core.database import get_database
+from app.services.price_bus import price_bus
+
+router = APIRouter(prefix="/stream", tags=["Stream"])
+
+# Fields sent in the initial snapshot of a per-meme subscription.
+_SNAPSHOT_PROJECTION = {
+    "current_price": 1, "volume_24h": 1, "price_change_24h": 1,
+    "price_change_percent_24h": 1, "high_24h": 1, "low_24h": 1,
+}
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.get("/prices")
+async def stream_prices(
+    request: Request,
+    memes: Optional[str] = Query(None, description="Comma-separated meme ids; every meme if omitted"),
+):
+    """
+    Live price ticks as Server-Sent Events.
+
+    Events:
+    - `snapshot`: current prices of the requested memes (only with `memes`)
+    - `ticks`: list of the latest tick per meme since the previous event,
+      sent at most every PRICE_STREAM_MIN_INTERVAL seconds
+    """
+    meme_ids = None
+    if memes:
+        meme_ids = sorted({m.strip() for m in memes.split(",") if m.strip()})
+        if len(meme_ids) > settings.PRICE_STREAM_MAX_MEMES:
+            raise HTTPException(status_code=400, detail=f"At most {settings.PRICE_STREAM_MAX_MEMES} memes per stream")
+        if not all(ObjectId.is_valid(m) for m in meme_ids):
+            raise HTTPException(status_code=400, detail="Invalid meme id")
+
+    async def events():
+        # Subscribe before reading the snapshot so no tick falls in between.
+        subscription = price_bus.subscribe(meme_ids)
+        try:
+            if meme_ids:
+                db = get_database()
+                cursor = db.memes.find({"_id": {"$in": [ObjectId(m) for m in meme_ids]}}, _SNAPSHOT_PROJECTION)
+                snapshot = []
+                async for meme in cursor:
+                    meme["meme_id"] = str(meme.pop("_id"))
+                    meme["price"] = meme.pop("current_price", 0)
+                    snapshot.append(meme)
+                yield _sse("snapshot", snapshot)
+
+            while not await request.is_disconnected():
+                ticks = await subscription.next_batch(settings.PRICE_STREAM_KEEPALIVE_SECONDS)
+                if ticks:
+                    yield _sse("ticks", ticks)
+                    # Let further ticks conflate before the next event.
+                    await asyncio.sleep(settings.PRICE_STREAM_MIN_INTERVAL)
+                else:
+                    yield ": keepalive\n\n"
+        finally:
+            price_bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
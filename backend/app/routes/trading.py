@@ -1,12 +1,14 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import Optional
 
+from app.core.config import settings
 from app.core.security import get_current_user_id
-from app.models.transaction import TransactionCreate, TransactionResponse, TransactionType
+from app.models.transaction import TransactionCreate, TransactionResponse, TransactionType, TimeInForce, BatchOrderRequest
 from app.services.trading_service import (
-    execute_trade, get_user_transactions, get_user_portfolio_value,
-    get_user_open_orders, cancel_order
+    get_user_transactions, get_user_portfolio_value,
+    get_user_open_orders
 )
+from app.services.matching_actor import submit_trade, submit_batch, submit_cancel
 from app.services.user_service import get_user_by_id
 
 router = APIRouter(prefix="/trading", tags=["Trading"])
@@ -17,28 +19,30 @@ async def buy_shares(
     meme_id: str,
     quantity: int = Query(..., ge=1),
     max_price: Optional[float] = Query(None, gt=0),
+    time_in_force: TimeInForce = TimeInForce.GTC,
     user_id: str = Depends(get_current_user_id)
 ):
     """Buy shares of a meme stock."""
-    user = await get_user_by_id(user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
     trade = TransactionCreate(
         meme_id=meme_id,
         transaction_type=TransactionType.BUY,
         quantity=quantity,
         limit_price=max_price,
+        time_in_force=time_in_force,
     )
     
     try:
-        transaction, new_balance = await execute_trade(user_id, user["username"], trade)
-        is_listing = getattr(transaction, "status", "") == "pending"
+        transaction, new_balance = await submit_trade(user_id, None, trade)
+        status = getattr(transaction, "status", "")
+        if status == "cancelled":
+            message = "No matching sell orders; order cancelled"
+        elif status == "pending":
+            message = f"Placed a buy order for {quantity} shares!"
+        else:
+            message = f"Successfully bought {transaction.quantity} shares!"
         return {
             "success": True,
-            "message": (
-                f"Placed a buy order for {quantity} shares!" if is_listing else f"Successfully bought {quantity} shares!"
-            ),
+            "message": message,
             "transaction": transaction,
             "new_balance": new_balance
         }
@@ -51,28 +55,30 @@ async def sell_shares(
     meme_id: str,
     quantity: int = Query(..., ge=1),
     min_price: Optional[float] = Query(None, gt=0),
+    time_in_force: TimeInForce = TimeInForce.GTC,
     user_id: str = Depends(get_current_user_id)
 ):
     """Sell shares of a meme stock."""
-    user = await get_user_by_id(user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
     trade = TransactionCreate(
         meme_id=meme_id,
         transaction_type=TransactionType.SELL,
         quantity=quantity,
         limit_price=min_price,
+        time_in_force=time_in_force,
     )
     
     try:
-        transaction, new_balance = await execute_trade(user_id, user["username"], trade)
-        is_listing = getattr(transaction, "status", "") == "pending"
+        transaction, new_balance = await submit_trade(user_id, None, trade)
+        status = getattr(transaction, "status", "")
+        if status == "cancelled":
+            message = "No matching buy orders; order cancelled"
+        elif status == "pending":
+            message = f"Listed {quantity} shares for sale!"
+        else:
+            message = f"Successfully sold {transaction.quantity} shares!"
         return {
             "success": True,
-            "message": (
-                f"Listed {quantity} shares for sale!" if is_listing else f"Successfully sold {quantity} shares!"
-            ),
+            "message": message,
             "transaction": transaction,
             "new_balance": new_balance
         }
@@ -80,24 +86,56 @@ async def sell_shares(
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/orders/batch", response_model=dict)
+async def submit_order_batch(
+    batch: BatchOrderRequest,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Place several buy/sell orders, possibly across memes, in one request."""
+    if len(batch.orders) > settings.BATCH_MAX_ORDERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many orders in one batch (max {settings.BATCH_MAX_ORDERS})"
+        )
+
+    try:
+        results, new_balance = await submit_batch(user_id, batch.orders)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    succeeded = sum(1 for r in results if r.success)
+    return {
+        "success": succeeded == len(results),
+        "message": f"{succeeded} of {len(results)} orders placed",
+        "results": results,
+        "new_balance": new_balance
+    }
+
+
 @router.get("/history", response_model=dict)
 async def get_history(
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
     transaction_type: Optional[str] = None,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
     user_id: str = Depends(get_current_user_id)
 ):
-    """Get user's transaction history."""
-    transactions, total = await get_user_transactions(
-        user_id, page, per_page, transaction_type
-    )
+    """Get user's transaction history (cursor pagination as in GET /memes)."""
+    try:
+        transactions, total, next_cursor = await get_user_transactions(
+            user_id, page, per_page, transaction_type, cursor=cursor, include_total=include_total
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return {
         "transactions": transactions,
         "total": total,
         "page": page,
         "per_page": per_page,
-        "total_pages": (total + per_page - 1) // per_page
+        "total_pages": (total + per_page - 1) // per_page if total is not None else None,
+        "next_cursor": next_cursor,
     }
 
 
@@ -122,7 +160,7 @@ async def cancel_user_order(
 ):
     """Cancel an open order."""
     try:
-        success = await cancel_order(user_id, order_id)
+        success = await submit_cancel(user_id, order_id)
         return {"success": success, "message": "Order cancelled successfully"}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,158 @@
+"""
+Per-meme trading band cache.
+
+The band depends only on (upvotes, comments_count, total_trades) and the
+INTRINSIC_* / TRADING_BAND_* settings, so each entry is stored under that
+tuple. Order paths pass the meme document they already hold: a matching
+tuple is a hit, anything else recomputes and replaces the entry. A miss
+first tries the band stored on the meme by valuation.recompute_all_bands,
+which is used as long as its `band_key` still matches the meme's inputs.
+
+The /memes/{id}/trading-band route answers from the entry without loading
+the meme. For that, entries filled by the route also keep the few fields
+the response shows (current price, IPO state, counters). Trades and
+engagement invalidate the entry whenever any of those change; a per-meme
+generation counter keeps a route fill that raced with an invalidation from
+publishing stale data.
+"""
+
+from datetime import datetime
+from typing import Optional, Dict, Tuple
+
+from app.core.config import settings
+
+
+# Meme fields kept with route-filled entries (everything the trading-band response needs).
+VIEW_FIELDS = ("current_price", "upvotes", "comments_count", "ipo_end_at", "ipo_shares_remaining")
+# Band stored on the meme by valuation.recompute_all_bands, plus the inputs it was computed from.
+STORED_BAND_FIELDS = ("intrinsic_value", "min_allowed_price", "max_allowed_price", "band_key")
+# What a route fill reads: the view, the remaining band input and the stored band.
+_FILL_PROJECTION = {field: 1 for field in VIEW_FIELDS + ("total_trades",) + STORED_BAND_FIELDS}
+
+
+def settings_version() -> Tuple[float, ...]:
+    """The band settings; part of every cache key so a config change misses everything."""
+    return (
+        float(settings.INTRINSIC_BASE_PRICE),
+        float(settings.INTRINSIC_UPVOTE_WEIGHT),
+        float(settings.INTRINSIC_COMMENT_WEIGHT),
+        float(settings.TRADING_BAND_MIN_MULTIPLIER),
+        float(settings.TRADING_BAND_BASE_MAX_MULTIPLIER),
+        float(settings.TRADING_BAND_HYPE_FACTOR),
+    )
+
+
+def band_key(meme: dict) -> tuple:
+    return (
+        int(meme.get("upvotes", 0) or 0),
+        int(meme.get("comments_count", 0) or 0),
+        int(meme.get("total_trades", 0) or 0),
+        settings_version(),
+    )
+
+
+def stored_band_key(key: tuple) -> list:
+    """band_key() as stored on the meme (BSON has no tuples)."""
+    return [key[0], key[1], key[2], list(key[3])]
+
+
+class BandEntry:
+    """Cached band for one meme."""
+
+    __slots__ = ("key", "intrinsic", "min_price", "max_price", "view")
+
+    def __init__(self, key: tuple, intrinsic: float, min_price: float, max_price: float, view: Optional[dict] = None):
+        self.key = key
+        self.intrinsic = intrinsic
+        self.min_price = min_price
+        self.max_price = max_price
+        self.view = view
+
+
+class BandCache:
+    """Band entries per meme id, with hit/miss counters."""
+
+    def __init__(self):
+        self._entries: Dict[str, BandEntry] = {}
+        self._generation: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _compute(meme: dict, key: tuple, view: Optional[dict] = None) -> BandEntry:
+        from app.services.meme_service import calculate_intrinsic_value, get_trading_band
+
+        if meme.get("band_key") == stored_band_key(key) and meme.get("max_allowed_price") is not None:
+            return BandEntry(
+                key,
+                float(meme["intrinsic_value"]),
+                float(meme["min_allowed_price"]),
+                float(meme["max_allowed_price"]),
+                view,
+            )
+        min_price, max_price = get_trading_band(meme)
+        return BandEntry(key, calculate_intrinsic_value(meme), min_price, max_price, view)
+
+    def band_for(self, meme: dict) -> Tuple[float, float, float]:
+        """(intrinsic, min_price, max_price) for a meme document the caller already has."""
+        meme_id = str(meme["_id"])
+        key = band_key(meme)
+        entry = self._entries.get(meme_id)
+        if entry is not None and entry.key == key:
+            self.hits += 1
+        else:
+            self.misses += 1
+            entry = self._compute(meme, key)
+            self._entries[meme_id] = entry
+        return entry.intrinsic, entry.min_price, entry.max_price
+
+    def invalidate(self, meme_id: str) -> None:
+        """Drop the entry; call after any write to the band inputs or the viewed fields."""
+        self._entries.pop(meme_id, None)
+        self._generation[meme_id] = self._generation.get(meme_id, 0) + 1
+
+    def clear(self) -> None:
+        for meme_id in list(self._entries):
+            self.invalidate(meme_id)
+
+    async def get_band(self, meme_id: str) -> Optional[dict]:
+        """Trading-band response for a meme, loading the meme only on a miss. None if it doesn't exist."""
+        from app.services.meme_service import get_meme_by_id, is_ipo_active
+
+        entry = self._entries.get(meme_id)
+        if entry is not None and entry.view is not None and entry.key[-1] == settings_version():
+            self.hits += 1
+        else:
+            self.misses += 1
+            generation = self._generation.get(meme_id, 0)
+            meme = await get_meme_by_id(meme_id, _FILL_PROJECTION)
+            if not meme:
+                return None
+            entry = self._compute(meme, band_key(meme), {field: meme.get(field) for field in VIEW_FIELDS})
+            # Only publish if nothing invalidated this meme while we were loading it.
+            if self._generation.get(meme_id, 0) == generation:
+                self._entries[meme_id] = entry
+
+        view = entry.view
+        return {
+            "meme_id": meme_id,
+            "intrinsic_value": round(entry.intrinsic, 2),
+            "min_allowed_price": round(entry.min_price, 2),
+            "max_allowed_price": round(entry.max_price, 2),
+            "current_price": round(float(view.get("current_price") or 0), 2),
+            "ipo_active": is_ipo_active(view, datetime.utcnow()),
+            "upvotes": view.get("upvotes") or 0,
+            "comments_count": view.get("comments_count") or 0,
+        }
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+band_cache = BandCache()
@@ -0,0 +1,154 @@
+"""
+OHLCV candles per meme.
+
+Every price change is recorded as a tick that updates the current 1m, 5m,
+1h and 1d bars in the `candles` collection (one small upsert per bar, sent
+as a single bulk_write). This replaces the price_history array that used to
+be rewritten on the meme document for every trade and vote.
+
+A regular collection is used rather than a time-series one because bars are
+updated in place ($min/$max/$set/$inc upserts), which time-series
+collections don't support.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List
+from pymongo import UpdateOne, ASCENDING
+
+from app.core.database import get_database
+from app.models.meme import Candle, CandleResolution
+from app.services.rolling_stats import rolling_stats
+from app.services.price_bus import price_bus
+
+
+RESOLUTION_SECONDS = {
+    CandleResolution.ONE_MINUTE: 60,
+    CandleResolution.FIVE_MINUTES: 5 * 60,
+    CandleResolution.ONE_HOUR: 60 * 60,
+    CandleResolution.ONE_DAY: 24 * 60 * 60,
+}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _naive_utc(at: datetime) -> datetime:
+    """Timestamps are stored as naive UTC, like the rest of the app (datetime.utcnow())."""
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc).replace(tzinfo=None)
+    return at
+
+
+def bucket_start(at: datetime, resolution: CandleResolution) -> datetime:
+    """Start of the bar containing `at`."""
+    seconds = RESOLUTION_SECONDS[resolution]
+    offset = int((_naive_utc(at) - _EPOCH).total_seconds()) // seconds * seconds
+    return _EPOCH + timedelta(seconds=offset)
+
+
+def _tick_ops(meme_id: str, price: float, volume: int, at: datetime) -> List[UpdateOne]:
+    ops = []
+    for resolution in RESOLUTION_SECONDS:
+        t = bucket_start(at, resolution)
+        ops.append(UpdateOne(
+            {"meme_id": meme_id, "res": resolution.value, "t": t},
+            {
+                "$setOnInsert": {"open": price},
+                "$max": {"high": price},
+                "$min": {"low": price},
+                "$set": {"close": price, "updated_at": _naive_utc(at)},
+                "$inc": {"volume": int(volume), "ticks": 1},
+            },
+            upsert=True,
+        ))
+    return ops
+
+
+async def record_tick(
+    meme_id: str,
+    price: float,
+    volume: int = 0,
+    at: Optional[datetime] = None,
+    previous_price: Optional[float] = None,
+) -> None:
+    """
+    Fold one price change (and traded volume, if any) into the meme's current
+    bars and 24h stats, and publish it to live price stream subscribers.
+    `previous_price` is the price before the change (seeds the 24h change after a quiet period).
+    """
+    db = get_database()
+    at = _naive_utc(at or datetime.utcnow())
+    rolling_stats.observe(meme_id, float(price), int(volume), at, previous_price)
+    if price_bus.has_subscribers(meme_id):
+        price_bus.publish({
+            "meme_id": meme_id,
+            "price": float(price),
+            "volume": int(volume),
+            "t": at.isoformat(),
+            **(rolling_stats.get(meme_id) or {}),
+        })
+    await db.candles.bulk_write(_tick_ops(meme_id, float(price), volume, at), ordered=False)
+
+
+async def get_candles(
+    meme_id: str,
+    resolution: CandleResolution,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 500,
+) -> List[Candle]:
+    """Bars for a meme, oldest first. Without `start`, returns the most recent `limit` bars."""
+    db = get_database()
+    query = {"meme_id": meme_id, "res": resolution.value}
+    if start or end:
+        query["t"] = {}
+        if start:
+            query["t"]["$gte"] = bucket_start(start, resolution)
+        if end:
+            query["t"]["$lte"] = _naive_utc(end)
+
+    if start:
+        docs = await db.candles.find(query).sort("t", 1).limit(limit).to_list(length=limit)
+    else:
+        docs = await db.candles.find(query).sort("t", -1).limit(limit).to_list(length=limit)
+        docs.reverse()
+
+    return [Candle(
+        t=d["t"],
+        open=d["open"],
+        high=d["high"],
+        low=d["low"],
+        close=d["close"],
+        volume=int(d.get("volume", 0)),
+    ) for d in docs]
+
+
+async def ensure_candle_indexes() -> None:
+    db = get_database()
+    await db.candles.create_index(
+        [("meme_id", ASCENDING), ("res", ASCENDING), ("t", ASCENDING)],
+        unique=True,
+    )
+
+
+async def migrate_price_history_to_candles() -> int:
+    """
+    Fold the legacy embedded price_history arrays into candles and drop them
+    from the meme documents. Returns the number of memes migrated.
+    """
+    db = get_database()
+    migrated = 0
+    async for meme in db.memes.find({"price_history": {"$exists": True}}, {"price_history": 1}):
+        meme_id = str(meme["_id"])
+        ops = []
+        for point in meme.get("price_history") or []:
+            try:
+                at = datetime.fromisoformat(str(point["timestamp"]))
+                price = float(point["price"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            ops.extend(_tick_ops(meme_id, price, 0, at))
+        if ops:
+            await db.candles.bulk_write(ops, ordered=True)
+        await db.memes.update_one({"_id": meme["_id"]}, {"$unset": {"price_history": ""}})
+        migrated += 1
+    return migrated
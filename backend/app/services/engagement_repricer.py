@@ -0,0 +1,70 @@
+"""
+Debounced engagement repricing.
+
+Votes, comments and reports only bump counters on the meme and mark it
+dirty here. A background loop reprices each dirty meme at most once every
+ENGAGEMENT_REPRICE_SECONDS via update_meme_price_from_engagement, so a burst
+of clicks on a viral meme costs one price rewrite per tick instead of one
+per click. The engagement endpoints answer with the projected price computed
+from the counters they just incremented.
+"""
+
+import asyncio
+from typing import Optional, Set
+
+from app.core.config import settings
+
+
+class EngagementRepricer:
+    """Set of memes whose engagement changed since the last tick."""
+
+    def __init__(self):
+        self._dirty: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def mark_dirty(self, meme_id: str) -> None:
+        self._dirty.add(meme_id)
+
+    def is_dirty(self, meme_id: str) -> bool:
+        return meme_id in self._dirty
+
+    async def flush(self) -> int:
+        """Reprice every dirty meme once. Returns the number repriced."""
+        from app.services.meme_service import update_meme_price_from_engagement
+
+        # Swap the set out first so clicks arriving meanwhile land in the next tick.
+        dirty, self._dirty = self._dirty, set()
+        repriced = 0
+        for meme_id in dirty:
+            try:
+                await update_meme_price_from_engagement(meme_id)
+                repriced += 1
+            except ValueError:
+                # Meme was deleted in the meantime; nothing to reprice.
+                pass
+            except Exception as e:
+                print(f"❌ Engagement repricing failed for {meme_id}: {e}")
+                self._dirty.add(meme_id)
+        return repriced
+
+    async def _run(self) -> None:
+        interval = max(0.05, float(settings.ENGAGEMENT_REPRICE_SECONDS))
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    def start(self) -> None:
+        """Start the repricing loop (startup)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the loop and apply whatever is still pending (shutdown)."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+
+engagement_repricer = EngagementRepricer()
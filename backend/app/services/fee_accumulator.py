@@ -0,0 +1,109 @@
+"""
+Buffered treasury fee accounting.
+
+Every seller fee used to be upserted into the single treasury document
+(settings.TREASURY_DOC_ID) as part of the fill, which made that document a
+global write hotspot. Fees are now summed in process and written with one
+$inc when either FEE_FLUSH_INTERVAL_SECONDS passes, FEE_FLUSH_MAX_FILLS
+fills have accumulated, or the app shuts down.
+
+The per-fill breakdown is still durable: seller transactions carry
+fee_paid / fee_burned / fee_to_creator / fee_to_treasury, so treasury totals
+can always be re-derived from the transactions collection.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Optional, Dict
+
+from app.core.config import settings
+from app.core.database import get_database
+
+
+FEE_FIELDS = ("total_fees", "burned_fees", "creator_fees", "treasury_fees")
+
+
+class FeeAccumulator:
+    """In-process running totals for the treasury document."""
+
+    def __init__(self):
+        self._pending: Dict[str, float] = dict.fromkeys(FEE_FIELDS, 0.0)
+        self._fills = 0
+        self._task: Optional[asyncio.Task] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> Dict[str, float]:
+        """Fees recorded but not yet written to the treasury."""
+        return dict(self._pending)
+
+    def add(self, fees: Dict[str, float], fills: int = 1) -> None:
+        """Record fees from `fills` fills. Triggers a flush once FEE_FLUSH_MAX_FILLS is reached."""
+        for field in FEE_FIELDS:
+            self._pending[field] += float(fees.get(field, 0.0))
+        self._fills += fills
+
+        max_fills = int(settings.FEE_FLUSH_MAX_FILLS)
+        if max_fills > 0 and self._fills >= max_fills:
+            if self._flush_task is None or self._flush_task.done():
+                self._flush_task = asyncio.create_task(self._flush_logged())
+
+    async def flush(self) -> None:
+        """Write pending totals to the treasury document with one upsert."""
+        if self._pending["total_fees"] <= 0:
+            self._fills = 0
+            return
+
+        # Swap the buffer out before awaiting so fees recorded meanwhile go to the next flush.
+        pending, fills = self._pending, self._fills
+        self._pending, self._fills = dict.fromkeys(FEE_FIELDS, 0.0), 0
+
+        db = get_database()
+        now = datetime.utcnow()
+        try:
+            await db.treasury.update_one(
+                {"_id": settings.TREASURY_DOC_ID},
+                {
+                    "$inc": pending,
+                    "$set": {"updated_at": now},
+                    "$setOnInsert": {"created_at": now},
+                },
+                upsert=True,
+            )
+        except Exception:
+            # Put the fees back so they go out with the next flush.
+            for field in FEE_FIELDS:
+                self._pending[field] += pending[field]
+            self._fills += fills
+            raise
+
+    async def _flush_logged(self) -> None:
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"❌ Treasury fee flush failed: {e}")
+
+    async def _run(self) -> None:
+        interval = max(0.1, float(settings.FEE_FLUSH_INTERVAL_SECONDS))
+        while True:
+            await asyncio.sleep(interval)
+            await self._flush_logged()
+
+    def start(self) -> None:
+        """Start the periodic flush loop (startup)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the loop and write whatever is pending (shutdown)."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
+
+
+fee_accumulator = FeeAccumulator()
@@ -0,0 +1,202 @@
+"""
+MemeStreet market index.
+
+A cap-weighted index over every meme ("index") plus one sub-index per
+MemeCategory ("index:<category>"). Each index is sum(market_cap) / divisor.
+The market caps are loaded once on startup; after that every price change
+(_set_meme_trade_price, engagement repricing) applies its market cap delta
+in O(1), so the index never needs a scan over memes.
+
+A new listing adds its market cap and rescales the divisor so the index
+level doesn't jump. Divisors are stored in the `market_index` collection,
+which keeps the series continuous across restarts. Every
+MARKET_INDEX_TICK_SECONDS the changed index levels are recorded as ticks, so
+they get candles and rolling 24h stats like any meme (keyed by the index name
+in the candles collection).
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Optional, Dict, List
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.core.database import get_database
+from app.models.meme import MemeCategory
+from app.services.candle_service import record_tick
+from app.services.rolling_stats import rolling_stats
+
+
+INDEX_KEY = "index"
+
+
+def category_key(category: str) -> str:
+    return f"{INDEX_KEY}:{category}"
+
+
+class IndexSeries:
+    """Running total and divisor of one index."""
+
+    __slots__ = ("key", "market_cap", "divisor", "members", "changed", "divisor_changed", "last_recorded")
+
+    def __init__(self, key: str, divisor: Optional[float] = None):
+        self.key = key
+        self.market_cap = 0.0
+        self.divisor = divisor
+        self.members = 0
+        self.changed = False
+        self.divisor_changed = False
+        self.last_recorded: Optional[float] = None  # level of the last recorded tick
+
+    @property
+    def value(self) -> float:
+        if not self.divisor:
+            return float(settings.MARKET_INDEX_BASE)
+        return round(self.market_cap / self.divisor, 4)
+
+    def add_member(self, market_cap: float) -> None:
+        """Add a constituent without moving the index level."""
+        level = self.value
+        self.market_cap += market_cap
+        self.members += 1
+        if self.market_cap > 0 and level > 0:
+            self.divisor = self.market_cap / level
+            self.divisor_changed = True
+        self.changed = True
+
+    def apply_delta(self, delta: float) -> None:
+        if delta:
+            self.market_cap += delta
+            self.changed = True
+
+
+class MarketIndex:
+    """Market-wide and per-category indexes, kept in step with meme prices."""
+
+    def __init__(self):
+        self._memes: Dict[str, list] = {}  # meme_id -> [category, total_shares, market_cap]
+        self._series: Dict[str, IndexSeries] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _series_for(self, key: str) -> IndexSeries:
+        series = self._series.get(key)
+        if series is None:
+            series = IndexSeries(key)
+            self._series[key] = series
+        return series
+
+    async def load(self) -> int:
+        """Sum market caps from the active memes and restore divisors (startup). Returns memes loaded."""
+        db = get_database()
+        self._memes.clear()
+        self._series = {key: IndexSeries(key) for key in [INDEX_KEY] + [category_key(c.value) for c in MemeCategory]}
+        async for doc in db.market_index.find({}):
+            self._series_for(doc["_id"]).divisor = float(doc["divisor"]) or None
+
+        # Same population as the listings; delisted memes don't move the index.
+        async for meme in db.memes.find({"is_active": True}, {"category": 1, "total_shares": 1, "current_price": 1}):
+            category = meme.get("category") or MemeCategory.OTHER.value
+            total_shares = int(meme.get("total_shares", 0) or 0)
+            market_cap = float(meme.get("current_price", 0) or 0) * total_shares
+            self._memes[str(meme["_id"])] = [category, total_shares, market_cap]
+            for series in (self._series[INDEX_KEY], self._series_for(category_key(category))):
+                series.market_cap += market_cap
+                series.members += 1
+
+        for series in self._series.values():
+            if not series.divisor and series.market_cap > 0:
+                # First run: start the index at MARKET_INDEX_BASE.
+                series.divisor = series.market_cap / float(settings.MARKET_INDEX_BASE)
+                series.divisor_changed = True
+            series.changed = True
+        return len(self._memes)
+
+    def add_meme(self, meme_id: str, category: str, total_shares: int, price: float) -> None:
+        """New listing: join the market and category indexes at the current level."""
+        if meme_id in self._memes:
+            return
+        market_cap = float(price) * int(total_shares)
+        self._memes[meme_id] = [category, int(total_shares), market_cap]
+        self._series_for(INDEX_KEY).add_member(market_cap)
+        self._series_for(category_key(category)).add_member(market_cap)
+
+    def on_price(self, meme_id: str, price: float) -> None:
+        """Apply a meme's price change to its indexes in O(1)."""
+        entry = self._memes.get(meme_id)
+        if entry is None:
+            return
+        category, total_shares, old_cap = entry
+        new_cap = float(price) * total_shares
+        entry[2] = new_cap
+        delta = new_cap - old_cap
+        self._series_for(INDEX_KEY).apply_delta(delta)
+        self._series_for(category_key(category)).apply_delta(delta)
+
+    def snapshot(self) -> dict:
+        """Current levels for GET /api/market/index."""
+        def describe(series: IndexSeries) -> dict:
+            return {
+                "value": series.value,
+                "market_cap": round(series.market_cap, 2),
+                "memes": series.members,
+                **(rolling_stats.get(series.key) or {}),
+            }
+
+        market = self._series_for(INDEX_KEY)
+        return {
+            **describe(market),
+            "base": float(settings.MARKET_INDEX_BASE),
+            "categories": {
+                c.value: describe(self._series_for(category_key(c.value))) for c in MemeCategory
+            },
+        }
+
+    async def flush(self) -> int:
+        """Record a tick for every index that moved and persist changed divisors. Returns ticks written."""
+        now = datetime.utcnow()
+        changed: List[IndexSeries] = [s for s in self._series.values() if s.changed]
+        divisors = [s for s in self._series.values() if s.divisor_changed and s.divisor]
+        for series in changed:
+            series.changed = False
+        for series in divisors:
+            series.divisor_changed = False
+
+        if divisors:
+            await get_database().market_index.bulk_write([
+                UpdateOne({"_id": s.key}, {"$set": {"divisor": s.divisor, "updated_at": now}}, upsert=True)
+                for s in divisors
+            ], ordered=False)
+        for series in changed:
+            if series.divisor:
+                value = series.value
+                await record_tick(series.key, value, at=now, previous_price=series.last_recorded)
+                series.last_recorded = value
+        return len(changed)
+
+    async def _flush_logged(self) -> None:
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"❌ Market index flush failed: {e}")
+
+    async def _run(self) -> None:
+        interval = max(0.5, float(settings.MARKET_INDEX_TICK_SECONDS))
+        while True:
+            await asyncio.sleep(interval)
+            await self._flush_logged()
+
+    def start(self) -> None:
+        """Start the periodic tick loop (startup)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the loop and record the final levels (shutdown)."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._flush_logged()
+
+
+market_index = MarketIndex()
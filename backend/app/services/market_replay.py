@@ -0,0 +1,346 @@
+"""
+Offline market replay.
+
+Re-runs recorded secondary-market order flow through the same matching and
+pricing rules the API uses (OrderBook.match, the trading band, the post-IPO
+price adjustment and the seller fee split) under alternative settings, so
+POST_IPO_*, MAKER_FEE_BPS and band settings can be compared on real history
+instead of guessed. Nothing is written to the database.
+
+History comes from the `orders` journal: every GTC order with its price,
+quantity and timestamp, plus the cancellations, and from `transactions`
+for IPO fills (they bump the hype score but never touch the book). With a
+`since`, the journal before the window is replayed first as a warm-up
+(same settings, no stats) so the window opens on the book and hype score
+that history leaves behind; each meme's price is then reset to its
+recorded price at `since` (last 1m close). Stats cover the window only, and
+drift is measured against the recorded price at `until` (close of the last
+1m bar that ended by then; the current price when there is no `until`).
+
+This is a model of the market, not a reproduction of it; expect replayed
+prices and trade counts to differ from the recorded ones even under the
+current settings. Known gaps:
+- IOC/FOK orders never rest and are not journaled, so they are not replayed
+  (neither their fills nor their hype score bump).
+- Orders rejected at the time (e.g. outside the band) were never journaled.
+- Legacy-market memes (system counterparty, no order book) are not replayed.
+- Wallet balances and holdings are not checked; recorded orders are assumed affordable.
+- Engagement counters are taken as they are now, for the whole history.
+
+load_history() streams the journal once; replay() is a pure function of
+that history and a dict of settings overrides, meant to run in a worker
+process (see app/replay.py, which fans a parameter grid out over a
+ProcessPoolExecutor).
+"""
+
+import math
+import time
+from datetime import datetime
+from heapq import merge
+from typing import Optional, List, Dict, Tuple
+from bson import ObjectId
+
+from app.core.config import settings
+from app.core.database import get_database
+from app.models.meme import CandleResolution
+from app.services.candle_service import bucket_start
+from app.services.orderbook import OrderBook, RestingOrder
+from app.services.meme_service import get_trading_band
+from app.services.trading_service import (
+    price_pressure_adjustment, adjusted_trade_price, engagement_sentiment, split_fee,
+)
+
+
+# Settings a replay configuration may override.
+REPLAY_SETTINGS = (
+    "POST_IPO_DEMAND_FACTOR",
+    "POST_IPO_SUPPLY_FACTOR",
+    "POST_IPO_ENGAGEMENT_FACTOR",
+    "POST_IPO_COMMENTS_WEIGHT",
+    "MAKER_FEE_BPS",
+    "BURN_SHARE_BPS",
+    "CREATOR_FEE_SHARE_BPS",
+    "INTRINSIC_BASE_PRICE",
+    "INTRINSIC_UPVOTE_WEIGHT",
+    "INTRINSIC_COMMENT_WEIGHT",
+    "TRADING_BAND_MIN_MULTIPLIER",
+    "TRADING_BAND_BASE_MAX_MULTIPLIER",
+    "TRADING_BAND_HYPE_FACTOR",
+)
+
+# Event tuples keep pickling to worker processes cheap:
+# (timestamp, kind, meme_id, order_id, side, price, quantity). kind is "order", "cancel",
+# "ipo" (an IPO fill) or "open" (start of the window; price is the recorded opening price).
+Event = Tuple[float, str, str, str, str, float, int]
+
+# Order of events at the same timestamp: the window opens first, a placement precedes its cancel.
+_KIND_RANK = {"open": 0, "ipo": 1, "order": 1, "cancel": 2}
+
+_EPOCH = datetime(1970, 1, 1)
+_baseline = {name: getattr(settings, name) for name in REPLAY_SETTINGS}
+
+
+def _ts(at: datetime) -> float:
+    return (at - _EPOCH).total_seconds()
+
+
+def apply_overrides(overrides: Dict[str, float]) -> None:
+    """Reset the replay settings to their configured values, then apply `overrides` (this process only)."""
+    unknown = set(overrides) - set(REPLAY_SETTINGS)
+    if unknown:
+        raise ValueError(f"Settings not supported by the replay: {', '.join(sorted(unknown))}")
+    for name, value in _baseline.items():
+        setattr(settings, name, value)
+    for name, value in overrides.items():
+        setattr(settings, name, type(_baseline[name])(value))
+
+
+async def _price_before(db, meme: dict, at: datetime) -> Optional[float]:
+    """Recorded market price just before `at`: the last 1m close, if the meme traded before then."""
+    bar = await db.candles.find_one(
+        {"meme_id": str(meme["_id"]), "res": "1m", "t": {"$lt": at}},
+        {"close": 1},
+        sort=[("t", -1)],
+    )
+    return float(bar["close"]) if bar else None
+
+
+async def _opening_price(db, meme: dict, since: Optional[datetime]) -> float:
+    """Price at the start of the window: last 1m close before it, else the IPO price."""
+    if since is not None:
+        price = await _price_before(db, meme, since)
+        if price is not None:
+            return price
+    return float(meme.get("ipo_price") or meme.get("current_price") or 0.01)
+
+
+async def _recorded_price(db, meme: dict, until: Optional[datetime]) -> float:
+    """
+    Price the replay is compared with at the end of the window. With `until`,
+    only bars that ended by then count: the bar `until` falls in may already
+    hold later ticks.
+    """
+    if until is not None:
+        price = await _price_before(db, meme, bucket_start(until, CandleResolution.ONE_MINUTE))
+        if price is not None:
+            return price
+        return float(meme.get("ipo_price") or meme.get("current_price") or 0.01)
+    return float(meme.get("current_price") or 0.01)
+
+
+async def load_history(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    meme_ids: Optional[List[str]] = None,
+) -> Tuple[Dict[str, dict], List[Event]]:
+    """
+    Load the order flow up to `until` (oldest first) for the memes with orders between
+    `since` and `until`, plus an "open" event per meme at `since`.
+    Returns (memes, events); memes maps meme_id to its counters and opening/recorded prices.
+    """
+    db = get_database()
+    window = {}
+    if since is not None:
+        window["$gte"] = since
+    if until is not None:
+        window["$lt"] = until
+
+    placed_query = {"created_at": window} if window else {}
+    cancelled_query = {"status": "cancelled", **({"updated_at": window} if window else {})}
+    if meme_ids:
+        placed_query["meme_id"] = {"$in": meme_ids}
+        cancelled_query["meme_id"] = {"$in": meme_ids}
+    touched = set(await db.orders.distinct("meme_id", placed_query))
+    touched.update(await db.orders.distinct("meme_id", cancelled_query))
+    touched = sorted(m for m in touched if ObjectId.is_valid(m))
+
+    memes: Dict[str, dict] = {}
+    fields = {"upvotes": 1, "downvotes": 1, "comments_count": 1, "current_price": 1, "ipo_price": 1, "ipo_end_at": 1}
+    ipo_windows = {}
+    async for meme in db.memes.find({"_id": {"$in": [ObjectId(m) for m in touched]}}, fields):
+        meme_id = str(meme["_id"])
+        memes[meme_id] = {
+            "upvotes": int(meme.get("upvotes", 0) or 0),
+            "downvotes": int(meme.get("downvotes", 0) or 0),
+            "comments_count": int(meme.get("comments_count", 0) or 0),
+            "opening_price": await _opening_price(db, meme, since),
+            "recorded_price": await _recorded_price(db, meme, until),
+        }
+        if meme.get("ipo_end_at") is not None:
+            ipo_windows[meme_id] = meme["ipo_end_at"]
+
+    # Everything up to `until`: what precedes the window is the warm-up.
+    history = {"$lt": until} if until is not None else None
+    scope = {"meme_id": {"$in": list(memes)}}
+    projection = {"type": 1, "meme_id": 1, "price": 1, "quantity_total": 1, "created_at": 1, "updated_at": 1}
+
+    placed_events = [
+        (_ts(o["created_at"]), "order", o["meme_id"], str(o["_id"]), o["type"],
+         float(o.get("price", 0)), int(o.get("quantity_total", 0)))
+        async for o in db.orders.find(
+            {**scope, **({"created_at": history} if history else {})}, projection,
+        ).sort("created_at", 1)
+    ]
+    cancel_events = [
+        (_ts(o["updated_at"]), "cancel", o["meme_id"], str(o["_id"]), o["type"], 0.0, 0)
+        async for o in db.orders.find(
+            {**scope, "status": "cancelled", **({"updated_at": history} if history else {})}, projection,
+        ).sort("updated_at", 1)
+    ]
+    # IPO fills are the only buys recorded while a meme's IPO window is open.
+    ipo_events = []
+    for meme_id, ipo_end_at in ipo_windows.items():
+        # Stored timestamps are truncated to milliseconds, so a fill can carry the window's end time.
+        ipo_until = {"$lte": ipo_end_at}
+        if until is not None and until <= ipo_end_at:
+            ipo_until = {"$lt": until}
+        ipo_events.extend([
+            (_ts(t["created_at"]), "ipo", meme_id, "", "buy", float(t.get("price_per_share", 0)), int(t.get("quantity", 0)))
+            async for t in db.transactions.find(
+                {"meme_id": meme_id, "transaction_type": "buy", "status": "completed", "created_at": ipo_until},
+                {"created_at": 1, "price_per_share": 1, "quantity": 1},
+            ).sort("created_at", 1)
+        ])
+    ipo_events.sort()
+    open_events = []
+    if since is not None:
+        open_events = [(_ts(since), "open", m, "", "", meme["opening_price"], 0) for m, meme in sorted(memes.items())]
+
+    events = list(merge(
+        open_events, ipo_events, placed_events, cancel_events,
+        key=lambda e: (e[0], _KIND_RANK[e[1]]),
+    ))
+    return memes, events
+
+
+class _MemeState:
+    """Replayed market for one meme."""
+
+    __slots__ = ("book", "counters", "price", "total_trades", "returns", "sentiment", "live")
+
+    def __init__(self, meme_id: str, meme: dict, live: bool):
+        self.book = OrderBook(meme_id)
+        self.counters = {"upvotes": meme["upvotes"], "comments_count": meme["comments_count"], "total_trades": 0}
+        self.price = meme["opening_price"]
+        self.total_trades = 0
+        self.returns: List[float] = []
+        # False during the warm-up before the window; stats and returns only count once live.
+        self.live = live
+        # Counters are fixed for the replay, so the sentiment is too.
+        self.sentiment = engagement_sentiment(meme["upvotes"], meme["downvotes"], meme["comments_count"])
+
+    def set_price(self, new_price: float) -> None:
+        if self.live and self.price > 0 and new_price > 0:
+            self.returns.append(math.log(new_price / self.price))
+        self.price = new_price
+
+
+def replay(memes: Dict[str, dict], events: List[Event], overrides: Dict[str, float]) -> dict:
+    """Replay `events` under `overrides` and return summary stats for the configuration."""
+    started = time.perf_counter()
+    apply_overrides(overrides)
+    # Without an "open" event there is no warm-up: every meme is live from the first event.
+    warm_up = any(e[1] == "open" for e in events)
+    states = {meme_id: _MemeState(meme_id, meme, not warm_up) for meme_id, meme in memes.items()}
+
+    window_stats = {
+        "orders": 0, "rejected": 0, "cancelled": 0, "trades": 0, "fills": 0, "ipo_fills": 0,
+        "volume": 0, "notional": 0.0, "fees": 0.0, "fees_burned": 0.0,
+        "fees_to_creators": 0.0, "fees_to_treasury": 0.0,
+    }
+    warm_up_stats = dict(window_stats)
+
+    for (_, kind, meme_id, order_id, side, price, quantity) in events:
+        state = states[meme_id]
+        book = state.book
+        stats = window_stats if state.live else warm_up_stats
+
+        if kind == "open":
+            state.live = True
+            state.price = price
+            continue
+
+        if kind == "ipo":
+            state.total_trades += 1
+            stats["ipo_fills"] += 1
+            continue
+
+        if kind == "cancel":
+            if book.remove(order_id) is not None:
+                stats["cancelled"] += 1
+            continue
+
+        stats["orders"] += 1
+        state.counters["total_trades"] = state.total_trades
+        min_price, max_price = get_trading_band(state.counters)
+        if price < min_price or price > max_price or quantity <= 0:
+            stats["rejected"] += 1
+            continue
+
+        supply_before = book.open_quantity("sell")
+        fills = book.match(side, price, quantity)
+        filled_qty = sum(take for (_, take) in fills)
+        for (resting, take) in fills:
+            gross = resting.price * take
+            fee_total, fee_burn, fee_creator, fee_treasury, _ = split_fee(gross)
+            stats["notional"] += gross
+            stats["fees"] += fee_total
+            stats["fees_burned"] += fee_burn
+            stats["fees_to_creators"] += fee_creator
+            stats["fees_to_treasury"] += fee_treasury
+        stats["fills"] += len(fills)
+        stats["volume"] += filled_qty
+
+        price_before = state.price
+        if filled_qty > 0:
+            last_trade_price = max(0.01, fills[-1][0].price)
+            pressure = price_pressure_adjustment(
+                filled_qty, supply_before=supply_before if side == "buy" else None,
+            )
+            state.set_price(adjusted_trade_price(last_trade_price, pressure, state.sentiment))
+            state.total_trades += 1
+            stats["trades"] += 1
+
+        remaining = quantity - filled_qty
+        if remaining > 0:
+            book.add(RestingOrder(order_id, side, meme_id, "", "", price, remaining))
+            if side == "sell":
+                # Supply pressure from the newly listed remainder, applied to the pre-trade price.
+                pressure = price_pressure_adjustment(0, supply_before=supply_before, supply_added=remaining)
+                state.set_price(adjusted_trade_price(max(0.01, price_before), pressure, state.sentiment))
+
+    stats = window_stats
+    returns = [r for s in states.values() for r in s.returns]
+    drift = [
+        abs(s.price - memes[m]["recorded_price"]) / memes[m]["recorded_price"] * 100
+        for m, s in states.items() if memes[m]["recorded_price"] > 0
+    ]
+    mean_return = sum(returns) / len(returns) if returns else 0.0
+    volatility = math.sqrt(sum((r - mean_return) ** 2 for r in returns) / len(returns)) if returns else 0.0
+
+    for key in ("notional", "fees", "fees_burned", "fees_to_creators", "fees_to_treasury"):
+        stats[key] = round(stats[key], 4)
+    stats.update({
+        "overrides": dict(overrides),
+        "memes": len(states),
+        "resting_at_end": sum(s.book.open_quantity("buy") + s.book.open_quantity("sell") for s in states.values()),
+        "tick_volatility_pct": round(volatility * 100, 4),
+        "mean_abs_drift_vs_recorded_pct": round(sum(drift) / len(drift), 4) if drift else 0.0,
+        "seconds": round(time.perf_counter() - started, 3),
+    })
+    return stats
+
+
+# ============ Worker process entry points ============
+_worker_history: Tuple[Dict[str, dict], List[Event]] = ({}, [])
+
+
+def init_worker(memes: Dict[str, dict], events: List[Event]) -> None:
+    """ProcessPoolExecutor initializer: receive the history once per worker, not once per config."""
+    global _worker_history
+    _worker_history = (memes, events)
+
+
+def replay_in_worker(overrides: Dict[str, float]) -> dict:
+    memes, events = _worker_history
+    return replay(memes, events, overrides)
@@ -0,0 +1,236 @@
+"""
+Single-writer matching actors.
+
+Every trade and cancel on a meme is funnelled through that meme's actor: a
+queue plus one worker task that runs queued orders one at a time. Because
+only the actor touches a meme's book, balances and price, orders on the same
+meme can no longer interleave across awaits, and no global lock is needed.
+Different memes still trade concurrently.
+
+The worker drains whatever is queued when it wakes up (up to
+MATCHING_MAX_BATCH orders) and runs it as one tick through
+trading_service.execute_batch: the orders match one after another against a
+shared Settlement that is flushed once for the whole tick. An order that
+fails is rolled back on its own; results are handed out after the flush.
+"""
+
+import asyncio
+import logging
+from functools import partial
+from typing import Optional, Dict, List, Tuple, Callable, Awaitable
+from bson import ObjectId
+
+from app.core.config import settings
+from app.core.database import get_database
+from app.models.transaction import TransactionCreate, TransactionResponse, TransactionType, BatchOrderResult
+from app.services.settlement import Settlement
+from app.services.trading_service import execute_trade, execute_batch, find_cancellable_order, cancel_open_order
+
+logger = logging.getLogger(__name__)
+
+
+class _Job:
+    __slots__ = ("user_id", "run", "future")
+
+    def __init__(self, user_id: str, run: Callable[[Settlement], Awaitable], future: asyncio.Future):
+        self.user_id = user_id
+        self.run = run
+        self.future = future
+
+
+class MemeActor:
+    """Owns all matching for one meme."""
+
+    def __init__(self, meme_id: str):
+        self.meme_id = meme_id
+        # Each item is a group of jobs that must run in the same tick (usually one job).
+        self.queue: "asyncio.Queue[List[_Job]]" = asyncio.Queue()
+        self.task = asyncio.create_task(self._run(), name=f"matching-actor-{meme_id}")
+
+    def submit_job(self, user_id: str, run: Callable[[Settlement], Awaitable]) -> asyncio.Future:
+        """Queue an order; `run` gets the tick's Settlement and records its writes on it."""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait([_Job(user_id, run, future)])
+        return future
+
+    def submit(self, user_id: str, username: Optional[str], trade: TransactionCreate) -> asyncio.Future:
+        return self.submit_job(user_id, partial(execute_trade, user_id, username, trade))
+
+    def submit_group(self, user_id: str, username: Optional[str], trades: List[TransactionCreate]) -> List[asyncio.Future]:
+        """
+        Queue several orders as one item: they are matched in request order in
+        the same tick and settled by its single flush, whatever MATCHING_MAX_BATCH is.
+        """
+        loop = asyncio.get_running_loop()
+        group = [_Job(user_id, partial(execute_trade, user_id, username, trade), loop.create_future()) for trade in trades]
+        self.queue.put_nowait(group)
+        return [job.future for job in group]
+
+    def _drain(self, first: List[_Job]) -> Tuple[List[_Job], int]:
+        """Jobs for one tick and the number of queue items they came from."""
+        batch = list(first)
+        items = 1
+        max_batch = max(1, int(settings.MATCHING_MAX_BATCH))
+        while len(batch) < max_batch:
+            try:
+                batch.extend(self.queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+            items += 1
+        return batch, items
+
+    async def _process(self, batch: List[_Job]) -> None:
+        try:
+            outcomes = await execute_batch(self.meme_id, [(job.user_id, job.run) for job in batch])
+        except Exception as e:
+            outcomes = [e] * len(batch)
+        for job, outcome in zip(batch, outcomes):
+            if job.future.done():
+                continue
+            if isinstance(outcome, Exception):
+                job.future.set_exception(outcome)
+            else:
+                job.future.set_result(outcome)
+
+    async def _run(self) -> None:
+        idle_seconds = float(settings.MATCHING_ACTOR_IDLE_SECONDS)
+        while True:
+            try:
+                first = await asyncio.wait_for(self.queue.get(), timeout=idle_seconds)
+            except asyncio.TimeoutError:
+                # Retire idle actors so the registry doesn't grow with every meme ever traded.
+                if self.queue.empty():
+                    if _actors.get(self.meme_id) is self:
+                        del _actors[self.meme_id]
+                    return
+                continue
+            batch, items = self._drain(first)
+            try:
+                await self._process(batch)
+            finally:
+                for _ in range(items):
+                    self.queue.task_done()
+
+
+# ============ Actor Registry ============
+_actors: Dict[str, MemeActor] = {}
+
+
+def get_actor(meme_id: str) -> MemeActor:
+    """Get (or start) the actor for a meme."""
+    actor = _actors.get(meme_id)
+    if actor is None or actor.task.done():
+        actor = MemeActor(meme_id)
+        _actors[meme_id] = actor
+    return actor
+
+
+async def submit_trade(
+    user_id: str,
+    username: Optional[str],
+    trade: TransactionCreate
+) -> Tuple[TransactionResponse, float]:
+    """
+    Queue a trade on its meme's actor and wait for the result.
+    Same contract as execute_trade: returns (transaction, new_balance) or raises ValueError.
+    """
+    if not ObjectId.is_valid(trade.meme_id):
+        raise ValueError("Meme not found")
+    return await get_actor(trade.meme_id).submit(user_id, username, trade)
+
+
+async def submit_cancel(user_id: str, order_id: str) -> bool:
+    """Cancel an open order on its meme's actor, so it can't interleave with a match."""
+    order = await find_cancellable_order(user_id, order_id)
+    return await get_actor(order["meme_id"]).submit_job(user_id, partial(cancel_open_order, user_id, order))
+
+
+def _precheck_batch(user: dict, trades: List[TransactionCreate]) -> List[Optional[str]]:
+    """
+    Cheap checks of a whole batch against one user snapshot. Returns an error
+    message per order (None = send it to matching). Limit buys reserve
+    against the snapshot balance and sells against snapshot holdings, in
+    request order; the guarded debits in execute_trade remain authoritative.
+    """
+    balance = float(user.get("wallet_balance", 0))
+    holdings = {h.get("meme_id"): int(h.get("quantity_owned", 0)) for h in user.get("portfolio", [])}
+    errors: List[Optional[str]] = []
+    for trade in trades:
+        if not ObjectId.is_valid(trade.meme_id):
+            errors.append("Meme not found")
+        elif trade.transaction_type == TransactionType.SELL:
+            owned = holdings.get(trade.meme_id, 0)
+            if owned < trade.quantity:
+                errors.append(f"Not enough shares to sell. You own {owned} shares.")
+            else:
+                holdings[trade.meme_id] = owned - trade.quantity
+                errors.append(None)
+        elif trade.limit_price is not None and trade.limit_price * trade.quantity > balance:
+            errors.append(f"Insufficient balance. Need ${trade.limit_price * trade.quantity:.2f}, have ${balance:.2f}")
+        else:
+            if trade.limit_price is not None:
+                balance -= trade.limit_price * trade.quantity
+            errors.append(None)
+    return errors
+
+
+async def submit_batch(user_id: str, trades: List[TransactionCreate]) -> Tuple[List[BatchOrderResult], float]:
+    """
+    Run many orders for one user. The user is read once for the prechecks,
+    orders are grouped by meme and each group goes to its actor as a single
+    item, so the group is matched in one tick against one Settlement and
+    flushed once. Groups on different memes run concurrently. Returns per-order results (request order) and the final
+    wallet balance.
+    """
+    db = get_database()
+    if not ObjectId.is_valid(user_id):
+        raise ValueError("User not found")
+    user = await db.users.find_one(
+        {"_id": ObjectId(user_id)},
+        {"username": 1, "wallet_balance": 1, "portfolio": 1},
+    )
+    if not user:
+        raise ValueError("User not found")
+
+    errors = _precheck_batch(user, trades)
+    groups: Dict[str, List[int]] = {}
+    for index, error in enumerate(errors):
+        if error is None:
+            groups.setdefault(trades[index].meme_id, []).append(index)
+
+    futures: Dict[int, asyncio.Future] = {}
+    for meme_id, indexes in groups.items():
+        group_futures = get_actor(meme_id).submit_group(
+            user_id, user.get("username"), [trades[i] for i in indexes]
+        )
+        futures.update(zip(indexes, group_futures))
+
+    outcomes = dict(zip(futures, await asyncio.gather(*futures.values(), return_exceptions=True)))
+
+    results: List[BatchOrderResult] = []
+    for index, trade in enumerate(trades):
+        result = BatchOrderResult(index=index, meme_id=trade.meme_id, success=False, error=errors[index])
+        outcome = outcomes.get(index)
+        if isinstance(outcome, ValueError):
+            result.error = str(outcome)
+        elif isinstance(outcome, Exception):
+            logger.error("Batch order %d on %s failed", index, trade.meme_id, exc_info=outcome)
+            result.error = "Order failed"
+        elif outcome is not None:
+            result.success = True
+            result.transaction, result.new_balance = outcome
+        results.append(result)
+
+    fresh = await db.users.find_one({"_id": ObjectId(user_id)}, {"wallet_balance": 1})
+    return results, float((fresh or user).get("wallet_balance", 0))
+
+
+async def stop_matching_actors() -> None:
+    """Let every actor finish its queue, then stop the workers (shutdown)."""
+    actors = list(_actors.values())
+    _actors.clear()
+    for actor in actors:
+        if not actor.task.done():
+            await actor.queue.join()
+            actor.task.cancel()
+    await asyncio.gather(*(a.task for a in actors), return_exceptions=True)
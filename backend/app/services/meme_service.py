@@ -1,11 +1,20 @@
 from datetime import datetime, timedelta
 from typing import Optional, List, Tuple
 from bson import ObjectId
+from pymongo import ASCENDING, UpdateOne, ReturnDocument
 import random
 import uuid
 
 from app.core.database import get_database
 from app.core.config import settings
+from app.services.candle_service import record_tick
+from app.services.engagement_repricer import engagement_repricer
+from app.services.band_cache import band_cache
+from app.services.market_index import market_index
+from app.services.pagination import fetch_page, count_cache
+from app.services.search_service import search_memes
+from app.services.response_cache import response_cache
+from app.services.vote_service import UP, DOWN, cast_vote, vote_counter_deltas, user_votes, add_report
 from app.models.meme import (
     MemeCreate, MemeInDB, MemeResponse, MemeCategory, TrendStatus, Comment
 )
@@ -39,6 +48,25 @@ def is_ipo_window(meme: dict, now: Optional[datetime] = None) -> bool:
     return now < ipo_end_at
 
 
+# ============ Read Projections ============
+# Reads ask for the fields they use, never the whole document (the embedded
+# comments array alone can be most of a popular meme's bytes).
+
+# A MemeResponse card: lists, search pages, trending, featured.
+CARD_FIELDS = (
+    "name", "ticker", "description", "image_url", "category", "creator_username",
+    "current_price", "previous_price", "price_change_24h", "price_change_percent_24h",
+    "high_24h", "low_24h", "total_shares", "market_cap", "volume_24h",
+    "upvotes", "downvotes", "comments_count", "trend_status", "is_featured", "created_at",
+    "ipo_price", "ipo_shares_remaining", "ipo_end_at", "ipo_shares_total",
+    "available_shares", "open_sell_qty",  # get_available_shares
+)
+CARD_PROJECTION = {field: 1 for field in CARD_FIELDS}
+
+# GET /memes/{id} and /memes/ticker/{ticker}: the card plus the band and ownership inputs.
+DETAIL_PROJECTION = {**CARD_PROJECTION, "total_trades": 1, "creator_id": 1, "ipo_start_at": 1, "is_active": 1}
+
+
 # ============ Intrinsic Value Calculation ============
 def calculate_intrinsic_value(meme: dict) -> float:
     """
@@ -78,6 +106,56 @@ def get_trading_band(meme: dict) -> Tuple[float, float]:
     return (min_price, max_price)
 
 
+# ============ Server-side Price Updates ============
+# Reprices run as update pipelines: the new price is computed from the
+# document's own fields inside one find_one_and_update, so there is no read
+# beforehand and concurrent reprices can't overwrite each other's inputs.
+
+def intrinsic_value_expr() -> dict:
+    """calculate_intrinsic_value as an aggregation expression."""
+    return {"$max": [0.01, {"$round": [{"$add": [
+        float(settings.INTRINSIC_BASE_PRICE),
+        {"$multiply": [{"$ifNull": ["$upvotes", 0]}, float(settings.INTRINSIC_UPVOTE_WEIGHT)]},
+        {"$multiply": [{"$ifNull": ["$comments_count", 0]}, float(settings.INTRINSIC_COMMENT_WEIGHT)]},
+    ]}, 4]}]}
+
+
+def price_bookkeeping_stage(now: datetime) -> dict:
+    """
+    Pipeline stage run after current_price was set: ATH/ATL, market cap and
+    updated_at, derived from the new current_price.
+    """
+    return {"$set": {
+        "all_time_high": {"$max": [{"$ifNull": ["$all_time_high", "$current_price"]}, "$current_price"]},
+        "all_time_low": {"$min": [{"$ifNull": ["$all_time_low", "$current_price"]}, "$current_price"]},
+        "market_cap": {"$multiply": ["$current_price", {"$ifNull": ["$total_shares", 0]}]},
+        "updated_at": now,
+    }}
+
+
+def engagement_price_pipeline(now: datetime) -> List[dict]:
+    """Update pipeline that reprices a meme to its intrinsic value."""
+    return [
+        {"$set": {
+            "previous_price": {"$ifNull": ["$current_price", 0.01]},
+            "current_price": intrinsic_value_expr(),
+        }},
+        price_bookkeeping_stage(now),
+    ]
+
+
+def get_available_shares(meme: dict) -> int:
+    """
+    Buyable supply shown in the UI: the IPO pool during the IPO, open sell
+    orders afterwards (open_sell_qty counter), or the legacy available_shares.
+    """
+    if meme.get("ipo_end_at") is None or meme.get("ipo_shares_remaining") is None or meme.get("ipo_price") is None:
+        return int(meme.get("available_shares", 0))
+    if is_ipo_active(meme):
+        return int(meme.get("ipo_shares_remaining", 0))
+    return max(0, int(meme.get("open_sell_qty", 0) or 0))
+
+
 def get_market_status(meme: dict) -> str:
     """
     Get market status: 'IPO' or 'OPEN_MARKET'
@@ -93,7 +171,7 @@ async def create_meme(meme_data: MemeCreate, user_id: str, username: str) -> Mem
     db = get_database()
     
     # Check if ticker already exists
-    existing = await db.memes.find_one({"ticker": meme_data.ticker.upper()})
+    existing = await db.memes.find_one({"ticker": meme_data.ticker.upper()}, {"_id": 1})
     if existing:
         raise ValueError(f"Ticker ${meme_data.ticker.upper()} already exists")
     
@@ -145,6 +223,9 @@ async def create_meme(meme_data: MemeCreate, user_id: str, username: str) -> Mem
         "ipo_shares_remaining": ipo_shares_total,
         "ipo_start_at": now,
         "ipo_end_at": ipo_end_at,
+        # Resting order quantity on the secondary market, kept in step with `orders` via $inc
+        "open_sell_qty": 0,
+        "open_buy_qty": 0,
         "market_cap": meme_data.initial_price * meme_data.total_shares,
         "volume_24h": 0,
         
@@ -155,9 +236,6 @@ async def create_meme(meme_data: MemeCreate, user_id: str, username: str) -> Mem
         "reports_count": 0,
         "shares_count": 0,
         
-        "upvoted_by": [],
-        "downvoted_by": [],
-        "reported_by": [],
 
         # IPO anti-spam: apply vote price moves in batches
         "ipo_upvote_steps_applied": 0,
@@ -172,13 +250,16 @@ async def create_meme(meme_data: MemeCreate, user_id: str, username: str) -> Mem
         "created_at": now,
         "updated_at": now,
         
-        # Comments & History
+        # Comments (price history lives in the candles collection)
         "comments": [],
-        "price_history": [{"timestamp": now.isoformat(), "price": meme_data.initial_price}],
     }
     
     result = await db.memes.insert_one(meme_dict)
     meme_dict["id"] = str(result.inserted_id)
+    await record_tick(meme_dict["id"], meme_data.initial_price, at=now)
+    market_index.add_meme(meme_dict["id"], meme_dict["category"], meme_data.total_shares, meme_data.initial_price)
+    count_cache.invalidate("memes")
+    response_cache.clear()
 
     # Allocate remaining supply to creator so post-IPO trading is buyer<->seller.
     if creator_shares > 0 and creator_exists:
@@ -199,24 +280,71 @@ async def create_meme(meme_data: MemeCreate, user_id: str, username: str) -> Mem
     return MemeInDB(**meme_dict)
 
 
-async def get_meme_by_id(meme_id: str) -> Optional[dict]:
-    """Get a meme by its ID."""
+async def get_meme_by_id(meme_id: str, projection: Optional[dict] = DETAIL_PROJECTION) -> Optional[dict]:
+    """Get a meme by its ID, with the fields in `projection` (the detail view by default)."""
     db = get_database()
-    meme = await db.memes.find_one({"_id": ObjectId(meme_id)})
+    meme = await db.memes.find_one({"_id": ObjectId(meme_id)}, projection)
     if meme:
         meme["id"] = str(meme["_id"])
     return meme
 
 
-async def get_meme_by_ticker(ticker: str) -> Optional[dict]:
+async def get_meme_by_ticker(ticker: str, projection: Optional[dict] = DETAIL_PROJECTION) -> Optional[dict]:
     """Get a meme by its ticker symbol."""
     db = get_database()
-    meme = await db.memes.find_one({"ticker": ticker.upper()})
+    meme = await db.memes.find_one({"ticker": ticker.upper()}, projection)
     if meme:
         meme["id"] = str(meme["_id"])
     return meme
 
 
+# Meme list sort options -> meme field (sort_by of GET /memes)
+LIST_SORT_FIELDS = {
+    "market_cap": "market_cap",
+    "price": "current_price",
+    "volume": "volume_24h",
+    "change": "price_change_percent_24h",
+    "upvotes": "upvotes",
+    "newest": "created_at",
+}
+
+
+async def ensure_meme_indexes() -> None:
+    """
+    Compound indexes behind the keyset-paginated meme list: (is_active, field, _id)
+    per sort option. With a category filter only the default list sort and the
+    feed's "newest" get their own index; every extra index on price fields is
+    one more write per trade.
+    """
+    db = get_database()
+    for field in LIST_SORT_FIELDS.values():
+        await db.memes.create_index([("is_active", ASCENDING), (field, ASCENDING), ("_id", ASCENDING)])
+    for field in ("market_cap", "created_at"):
+        await db.memes.create_index(
+            [("is_active", ASCENDING), ("category", ASCENDING), (field, ASCENDING), ("_id", ASCENDING)]
+        )
+
+
+def _list_cache_key(
+    page: int,
+    per_page: int,
+    category: Optional[str],
+    sort_by: str,
+    sort_order: str,
+    search: Optional[str],
+    cursor: Optional[str],
+    include_total: bool,
+) -> tuple:
+    """Normalized response cache key for a get_all_memes query."""
+    if search:
+        # Relevance-ranked; sort options don't apply and both indexes are case-insensitive here.
+        order = ("search", search.lower())
+    else:
+        order = (LIST_SORT_FIELDS.get(sort_by, "market_cap"), -1 if sort_order == "desc" else 1)
+    position = ("cursor", cursor) if cursor else ("page", page)
+    return ("list", category or None, order, position, per_page, bool(include_total))
+
+
 async def get_all_memes(
     page: int = 1,
     per_page: int = 20,
@@ -224,9 +352,44 @@ async def get_all_memes(
     sort_by: str = "market_cap",
     sort_order: str = "desc",
     search: Optional[str] = None,
-    user_id: Optional[str] = None
-) -> Tuple[List[MemeResponse], int]:
-    """Get all memes with pagination and filters."""
+    user_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+) -> Tuple[List[MemeResponse], Optional[int], Optional[str]]:
+    """
+    Get all memes with pagination and filters.
+    Returns (memes, total, next_cursor). Pass next_cursor back as `cursor` for the
+    following page (keyset pagination; `page` is only used without a cursor).
+    total is None unless include_total, and may be up to LIST_COUNT_CACHE_SECONDS old.
+    Pages are served from the response cache; the user's fields are overlaid per call.
+    """
+    search = search.strip() if search else None
+    key = _list_cache_key(page, per_page, category, sort_by, sort_order, search, cursor, include_total)
+    cached = response_cache.get(key)
+    if cached is None:
+        started = response_cache.begin()
+        memes, total, next_cursor = await _load_meme_page(
+            page, per_page, category, sort_by, sort_order, search, cursor, include_total,
+        )
+        cached = response_cache.put(key, memes, total, next_cursor, started)
+
+    memes = list(cached.memes)
+    if user_id:
+        memes = await _overlay_user_fields(memes, user_id)
+    return memes, cached.total, cached.next_cursor
+
+
+async def _load_meme_page(
+    page: int,
+    per_page: int,
+    category: Optional[str],
+    sort_by: str,
+    sort_order: str,
+    search: Optional[str],
+    cursor: Optional[str],
+    include_total: bool,
+) -> Tuple[List[MemeResponse], Optional[int], Optional[str]]:
+    """One page of the meme list from the database, without user-specific fields."""
     db = get_database()
     
     # Build query
@@ -236,67 +399,31 @@ async def get_all_memes(
         query["category"] = category
     
     if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"ticker": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}},
-        ]
-    
-    # Sort direction
-    sort_dir = -1 if sort_order == "desc" else 1
-    
-    # Sort field mapping
-    sort_fields = {
-        "market_cap": "market_cap",
-        "price": "current_price",
-        "volume": "volume_24h",
-        "change": "price_change_percent_24h",
-        "upvotes": "upvotes",
-        "newest": "created_at",
-    }
-    sort_field = sort_fields.get(sort_by, "market_cap")
-    
-    # Get total count
-    total = await db.memes.count_documents(query)
-    
-    # Get memes
-    cursor = db.memes.find(query).sort(sort_field, sort_dir).skip((page - 1) * per_page).limit(per_page)
-    memes = await cursor.to_list(length=per_page)
-
-    # For post-IPO memes, available shares come from open sell orders (secondary market).
-    meme_ids = [str(m["_id"]) for m in memes]
-    order_supply: dict[str, int] = {}
-    if meme_ids:
-        try:
-            pipeline = [
-                {"$match": {"type": "sell", "status": "open", "meme_id": {"$in": meme_ids}}},
-                {"$group": {"_id": "$meme_id", "total": {"$sum": "$quantity_remaining"}}},
-            ]
-            async for row in db.orders.aggregate(pipeline):
-                order_supply[str(row.get("_id"))] = int(row.get("total", 0))
-        except Exception:
-            order_supply = {}
-    
-    # Get user's portfolio if user_id provided
-    user_holdings = {}
-    if user_id:
-        user = await db.users.find_one({"_id": ObjectId(user_id)})
-        if user and "portfolio" in user:
-            for item in user.get("portfolio", []):
-                user_holdings[item["meme_id"]] = item["quantity_owned"]
+        # Indexed search, ranked by relevance (sort_by/sort_order don't apply)
+        memes, total, next_cursor = await search_memes(
+            search, query, per_page, cursor=cursor, page=page, include_total=include_total,
+            projection=CARD_PROJECTION,
+        )
+    else:
+        # Sort direction
+        sort_dir = -1 if sort_order == "desc" else 1
+        
+        sort_field = LIST_SORT_FIELDS.get(sort_by, "market_cap")
+        
+        # Get total count
+        total = await count_cache.count(db.memes, query) if include_total else None
+        
+        # Get memes
+        memes, next_cursor = await fetch_page(
+            db.memes, query, sort_field, sort_dir, per_page, cursor=cursor, page=page,
+            projection=CARD_PROJECTION,
+        )
     
     # Convert to response
     meme_responses = []
     for meme in memes:
         meme_id = str(meme["_id"])
-
-        # Determine buyable supply for UI.
-        if meme.get("ipo_end_at") is None or meme.get("ipo_shares_remaining") is None or meme.get("ipo_price") is None:
-            available_shares = int(meme.get("available_shares", 0))
-        elif is_ipo_active(meme):
-            available_shares = int(meme.get("ipo_shares_remaining", 0))
-        else:
-            available_shares = int(order_supply.get(meme_id, 0))
+        available_shares = get_available_shares(meme)
 
         meme_responses.append(MemeResponse(
             id=meme_id,
@@ -310,6 +437,8 @@ async def get_all_memes(
             previous_price=meme["previous_price"],
             price_change_24h=meme["price_change_24h"],
             price_change_percent_24h=meme["price_change_percent_24h"],
+            high_24h=meme.get("high_24h"),
+            low_24h=meme.get("low_24h"),
             total_shares=meme["total_shares"],
             available_shares=available_shares,
             market_cap=meme["market_cap"],
@@ -324,64 +453,64 @@ async def get_all_memes(
             ipo_shares_remaining=meme.get("ipo_shares_remaining"),
             ipo_end_at=meme.get("ipo_end_at"),
             ipo_shares_total=meme.get("ipo_shares_total"),
-            user_has_upvoted=user_id in meme.get("upvoted_by", []) if user_id else False,
-            user_has_downvoted=user_id in meme.get("downvoted_by", []) if user_id else False,
-            user_owns_shares=user_holdings.get(meme_id, 0)
         ))
     
-    return meme_responses, total
+    return meme_responses, total, next_cursor
+
+
+async def _overlay_user_fields(memes: List[MemeResponse], user_id: str) -> List[MemeResponse]:
+    """Copies of cached (anonymous) responses with the user's votes and holdings filled in."""
+    if not memes:
+        return memes
+    db = get_database()
+
+    # Get user's portfolio
+    user_holdings = {}
+    user = await db.users.find_one({"_id": ObjectId(user_id)}, {"portfolio": 1})
+    if user and "portfolio" in user:
+        for item in user.get("portfolio", []):
+            user_holdings[item["meme_id"]] = item["quantity_owned"]
+
+    votes = await user_votes(user_id, [m.id for m in memes])
+
+    overlaid = []
+    for meme in memes:
+        fields = {
+            "user_has_upvoted": votes.get(meme.id) == UP,
+            "user_has_downvoted": votes.get(meme.id) == DOWN,
+            "user_owns_shares": user_holdings.get(meme.id, 0),
+        }
+        overlaid.append(meme.model_copy(update=fields) if any(fields.values()) else meme)
+    return overlaid
 
 
-async def update_meme_price_from_engagement(meme_id: str) -> Tuple[float, float, float]:
+async def update_meme_price_from_engagement(meme_id: str, volume: int = 0) -> Tuple[float, float, float]:
     """
     Update meme price based on engagement (intrinsic value formula).
     Price = BASE + (Upvotes * 0.5) + (Comments * 0.3)
+    `volume` is the number of shares traded with this price change (IPO/legacy trades).
+    Applied server-side in one find_one_and_update (engagement_price_pipeline).
     Returns: (new_price, price_change, price_change_percent)
     """
     db = get_database()
-    meme = await get_meme_by_id(meme_id)
-    
+    meme = await db.memes.find_one_and_update(
+        {"_id": ObjectId(meme_id)},
+        engagement_price_pipeline(datetime.utcnow()),
+        projection={"current_price": 1, "previous_price": 1},
+        return_document=ReturnDocument.AFTER,
+    )
     if not meme:
         raise ValueError("Meme not found")
-    
-    old_price = float(meme.get("current_price", 0.01))
-    
-    # Calculate new price from intrinsic value
-    new_price = calculate_intrinsic_value(meme)
-    
+
+    old_price = float(meme["previous_price"])
+    new_price = float(meme["current_price"])
     price_change = new_price - old_price
     price_change_percent = (price_change / old_price * 100) if old_price > 0 else 0
-    
-    # Update ATH/ATL
-    all_time_high = max(float(meme.get("all_time_high", new_price)), new_price)
-    all_time_low = min(float(meme.get("all_time_low", new_price)), new_price)
-    
-    # Add to price history
-    price_history = meme.get("price_history", [])
-    price_history.append({"timestamp": datetime.utcnow().isoformat(), "price": new_price})
-    price_history = price_history[-100:]
-    
-    # Update trend status
-    trend_status = calculate_trend_status(old_price, new_price, float(meme.get("price_change_24h", 0)))
-    
-    # Update in DB
-    await db.memes.update_one(
-        {"_id": ObjectId(meme_id)},
-        {
-            "$set": {
-                "current_price": new_price,
-                "previous_price": old_price,
-                "price_change_24h": float(meme.get("price_change_24h", 0)) + price_change,
-                "price_change_percent_24h": price_change_percent,
-                "all_time_high": all_time_high,
-                "all_time_low": all_time_low,
-                "market_cap": new_price * int(meme.get("total_shares", 0)),
-                "trend_status": trend_status,
-                "price_history": price_history,
-                "updated_at": datetime.utcnow(),
-            }
-        }
-    )
+
+    band_cache.invalidate(meme_id)
+    response_cache.invalidate_meme(meme_id)
+    market_index.on_price(meme_id, new_price)
+    await record_tick(meme_id, new_price, volume, previous_price=old_price)
     
     return new_price, price_change, price_change_percent
 
@@ -392,123 +521,108 @@ async def update_meme_price(meme_id: str, change_type: str, quantity: int = 1) -
     Update meme price based on action type.
     Now redirects to engagement-based pricing.
     """
-    return await update_meme_price_from_engagement(meme_id)
-
-
-def calculate_trend_status(old_price: float, new_price: float, change_24h: float) -> str:
-    """Calculate the trend status based on price changes."""
-    percent_change = ((new_price - old_price) / old_price) * 100 if old_price > 0 else 0
-    
-    if abs(percent_change) > 10:
-        if percent_change > 0:
-            return TrendStatus.HOT.value
-        else:
-            return TrendStatus.COLD.value
-    elif abs(percent_change) > 5:
-        return TrendStatus.VOLATILE.value
-    else:
-        return TrendStatus.STABLE.value
+    volume = int(quantity) if change_type in ("buy", "sell") else 0
+    return await update_meme_price_from_engagement(meme_id, volume)
 
 
 # Note: _apply_vote_price_batches is deprecated - now using update_meme_price_from_engagement
 # for engagement-based pricing (Price = BASE + upvotes * UPVOTE_WEIGHT + comments * COMMENT_WEIGHT)
 
+# Fields needed to project the engagement price after a counter update.
+_ENGAGEMENT_PROJECTION = {"upvotes": 1, "comments_count": 1, "current_price": 1}
 
-async def upvote_meme(meme_id: str, user_id: str) -> Tuple[bool, float, float, float]:
+
+async def _bump_engagement(meme_id: str, update: dict) -> dict:
     """
-    Upvote a meme. Price updates based on engagement formula.
-    Returns (success, new_price, price_change, price_change_percent)
+    Apply an engagement counter update and schedule a debounced reprice.
+    Returns the counters as they are after the update.
     """
     db = get_database()
-    meme = await get_meme_by_id(meme_id)
-    
+    meme = await db.memes.find_one_and_update(
+        {"_id": ObjectId(meme_id)},
+        update,
+        projection=_ENGAGEMENT_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+    )
     if not meme:
         raise ValueError("Meme not found")
-    
-    upvoted_by = meme.get("upvoted_by", [])
-    downvoted_by = meme.get("downvoted_by", [])
-
-    # Toggle off if already upvoted
-    if user_id in upvoted_by:
-        await db.memes.update_one(
-            {"_id": ObjectId(meme_id)},
-            {"$pull": {"upvoted_by": user_id}, "$inc": {"upvotes": -1}}
-        )
-        new_price, change, percent = await update_meme_price_from_engagement(meme_id)
-        return False, new_price, change, percent
+    band_cache.invalidate(meme_id)
+    response_cache.invalidate_meme(meme_id)
+    engagement_repricer.mark_dirty(meme_id)
+    return meme
 
-    # Switch from downvote -> upvote
-    if user_id in downvoted_by:
-        await db.memes.update_one(
-            {"_id": ObjectId(meme_id)},
-            {
-                "$pull": {"downvoted_by": user_id},
-                "$addToSet": {"upvoted_by": user_id},
-                "$inc": {"downvotes": -1, "upvotes": 1},
-            }
-        )
-        new_price, change, percent = await update_meme_price_from_engagement(meme_id)
-        return True, new_price, change, percent
 
-    # Add upvote
-    await db.memes.update_one(
-        {"_id": ObjectId(meme_id)},
-        {"$addToSet": {"upvoted_by": user_id}, "$inc": {"upvotes": 1}}
-    )
-    new_price, change, percent = await update_meme_price_from_engagement(meme_id)
-    return True, new_price, change, percent
+def _projected_price(meme: dict) -> Tuple[float, float, float]:
+    """
+    Price the engagement formula gives for these counters, relative to the
+    current price. This is what the next repricing tick will apply.
+    Returns (new_price, price_change, price_change_percent).
+    """
+    old_price = float(meme.get("current_price", 0.01))
+    new_price = calculate_intrinsic_value(meme)
+    price_change = new_price - old_price
+    price_change_percent = (price_change / old_price * 100) if old_price > 0 else 0
+    return new_price, price_change, price_change_percent
 
 
-async def downvote_meme(meme_id: str, user_id: str) -> Tuple[bool, float, float, float]:
+async def _apply_vote(meme_id: str, user_id: str, direction: str) -> Tuple[bool, float, float, float]:
     """
-    Downvote a meme. Note: Downvotes don't affect intrinsic value in current formula.
-    Returns (success, new_price, price_change, price_change_percent)
+    Toggle a vote and move the meme's counters by exactly the change.
+    Only upvotes move the price; a downvote-only change returns the current price.
+    Returns (vote_is_now_cast, projected_price, price_change, price_change_percent)
     """
     db = get_database()
-    meme = await get_meme_by_id(meme_id)
-    
-    if not meme:
+    if not ObjectId.is_valid(meme_id):
         raise ValueError("Meme not found")
-    
-    upvoted_by = meme.get("upvoted_by", [])
-    downvoted_by = meme.get("downvoted_by", [])
 
-    # Toggle off if already downvoted
-    if user_id in downvoted_by:
-        await db.memes.update_one(
-            {"_id": ObjectId(meme_id)},
-            {"$pull": {"downvoted_by": user_id}, "$inc": {"downvotes": -1}}
-        )
-        # Price doesn't change from downvotes, but we still return current price
-        updated = await get_meme_by_id(meme_id)
-        return False, float(updated.get("current_price", 0)), 0.0, 0.0
+    previous, current = await cast_vote(meme_id, user_id, direction)
+    deltas = vote_counter_deltas(previous, current)
+    cast = current == direction
 
-    # Switch from upvote -> downvote (removes upvote which does affect price)
-    if user_id in upvoted_by:
-        await db.memes.update_one(
-            {"_id": ObjectId(meme_id)},
-            {
-                "$pull": {"upvoted_by": user_id},
-                "$addToSet": {"downvoted_by": user_id},
-                "$inc": {"upvotes": -1, "downvotes": 1},
-            }
-        )
-        new_price, change, percent = await update_meme_price_from_engagement(meme_id)
-        return True, new_price, change, percent
+    # The counter update doubles as the existence check.
+    if "upvotes" in deltas:
+        try:
+            updated = await _bump_engagement(meme_id, {"$inc": deltas})
+        except ValueError:
+            await db.votes.delete_many({"meme_id": meme_id})
+            raise
+        return (cast, *_projected_price(updated))
 
-    # Add downvote (doesn't affect price in current formula)
-    await db.memes.update_one(
+    meme = await db.memes.find_one_and_update(
         {"_id": ObjectId(meme_id)},
-        {"$addToSet": {"downvoted_by": user_id}, "$inc": {"downvotes": 1}}
+        {"$inc": deltas},
+        projection={"current_price": 1},
+        return_document=ReturnDocument.AFTER,
     )
-    updated = await get_meme_by_id(meme_id)
-    return True, float(updated.get("current_price", 0)), 0.0, 0.0
+    if not meme:
+        # No such meme, so any vote on it (including the one just cast) is garbage.
+        await db.votes.delete_many({"meme_id": meme_id})
+        raise ValueError("Meme not found")
+    response_cache.invalidate_meme(meme_id)
+    # Price doesn't change from downvotes, but we still return current price
+    return cast, float(meme.get("current_price", 0)), 0.0, 0.0
+
+
+async def upvote_meme(meme_id: str, user_id: str) -> Tuple[bool, float, float, float]:
+    """
+    Upvote a meme (again to remove the upvote; replaces a downvote).
+    Price updates based on engagement formula (debounced).
+    Returns (success, projected_price, price_change, price_change_percent)
+    """
+    return await _apply_vote(meme_id, user_id, UP)
+
+
+async def downvote_meme(meme_id: str, user_id: str) -> Tuple[bool, float, float, float]:
+    """
+    Downvote a meme (again to remove the downvote; replaces an upvote).
+    Note: Downvotes don't affect intrinsic value in current formula.
+    Returns (success, projected_price, price_change, price_change_percent)
+    """
+    return await _apply_vote(meme_id, user_id, DOWN)
 
 
 async def add_comment(meme_id: str, user_id: str, username: str, content: str) -> Tuple[Comment, float, float, float]:
-    """Add a comment to a meme. Price updates based on engagement formula."""
-    db = get_database()
-    
+    """Add a comment to a meme. Price updates based on engagement formula (debounced)."""
     comment = {
         "id": str(uuid.uuid4()),
         "user_id": user_id,
@@ -518,57 +632,57 @@ async def add_comment(meme_id: str, user_id: str, username: str, content: str) -
         "likes": 0
     }
     
-    await db.memes.update_one(
-        {"_id": ObjectId(meme_id)},
+    updated = await _bump_engagement(
+        meme_id,
         {
             "$push": {"comments": comment},
             "$inc": {"comments_count": 1}
         }
     )
     
-    # Use engagement-based pricing
-    new_price, change, percent = await update_meme_price_from_engagement(meme_id)
-    
-    return Comment(**comment), new_price, change, percent
+    return (Comment(**comment), *_projected_price(updated))
 
 
 async def report_meme(meme_id: str, user_id: str) -> Tuple[bool, float, float, float]:
     """Report a meme."""
     db = get_database()
-    meme = await get_meme_by_id(meme_id)
-    
-    if not meme:
+    if not ObjectId.is_valid(meme_id):
         raise ValueError("Meme not found")
-    
+
     # Check if already reported
-    if user_id in meme.get("reported_by", []):
+    if not await add_report(meme_id, user_id):
+        meme = await db.memes.find_one({"_id": ObjectId(meme_id)}, {"current_price": 1})
+        if not meme:
+            raise ValueError("Meme not found")
         return False, meme["current_price"], 0, 0
-    
-    await db.memes.update_one(
-        {"_id": ObjectId(meme_id)},
-        {
-            "$push": {"reported_by": user_id},
-            "$inc": {"reports_count": 1}
-        }
-    )
-    
-    new_price, change, percent = await update_meme_price(meme_id, "report")
-    return True, new_price, change, percent
+
+    # The counter update doubles as the existence check.
+    try:
+        updated = await _bump_engagement(
+            meme_id,
+            {"$inc": {"reports_count": 1}}
+        )
+    except ValueError:
+        await db.reports.delete_many({"meme_id": meme_id})
+        raise
+    return (True, *_projected_price(updated))
 
 
 async def get_meme_comments(meme_id: str, page: int = 1, per_page: int = 20) -> Tuple[List[Comment], int]:
     """Get comments for a meme with pagination."""
-    db = get_database()
-    meme = await get_meme_by_id(meme_id)
+    # Comments are appended in time order, so the newest page * per_page are the array's tail.
+    meme = await get_meme_by_id(
+        meme_id, {"comments_count": 1, "comments": {"$slice": -(page * per_page)}},
+    )
     
     if not meme:
         raise ValueError("Meme not found")
     
     comments = meme.get("comments", [])
-    total = len(comments)
+    total = int(meme.get("comments_count", len(comments)) or 0)
     
-    # Sort by newest first and paginate
-    comments = sorted(comments, key=lambda x: x.get("created_at", datetime.min), reverse=True)
+    # Newest first (array order, which also keeps same-timestamp comments stable across pages) and paginate
+    comments = comments[::-1]
     start = (page - 1) * per_page
     end = start + per_page
     
@@ -577,19 +691,29 @@ async def get_meme_comments(meme_id: str, page: int = 1, per_page: int = 20) ->
 
 async def get_trending_memes(limit: int = 10) -> List[MemeResponse]:
     """Get trending memes (highest 24h volume and price change)."""
-    memes, _ = await get_all_memes(
+    memes, _, _ = await get_all_memes(
         page=1,
         per_page=limit,
         sort_by="volume",
-        sort_order="desc"
+        sort_order="desc",
+        include_total=False,
     )
     return memes
 
 
 async def get_featured_memes(limit: int = 5) -> List[MemeResponse]:
-    """Get featured memes."""
+    """Get featured memes (served from the response cache)."""
+    key = ("featured", limit)
+    cached = response_cache.get(key)
+    if cached is None:
+        started = response_cache.begin()
+        cached = response_cache.put(key, await _load_featured_memes(limit), None, None, started)
+    return list(cached.memes)
+
+
+async def _load_featured_memes(limit: int) -> List[MemeResponse]:
     db = get_database()
-    cursor = db.memes.find({"is_featured": True, "is_active": True}).limit(limit)
+    cursor = db.memes.find({"is_featured": True, "is_active": True}, CARD_PROJECTION).limit(limit)
     memes = await cursor.to_list(length=limit)
     
     return [MemeResponse(
@@ -604,8 +728,10 @@ async def get_featured_memes(limit: int = 5) -> List[MemeResponse]:
         previous_price=m["previous_price"],
         price_change_24h=m["price_change_24h"],
         price_change_percent_24h=m["price_change_percent_24h"],
+        high_24h=m.get("high_24h"),
+        low_24h=m.get("low_24h"),
         total_shares=m["total_shares"],
-        available_shares=m["available_shares"],
+        available_shares=get_available_shares(m),
         market_cap=m["market_cap"],
         volume_24h=m["volume_24h"],
         upvotes=m["upvotes"],
@@ -614,6 +740,10 @@ async def get_featured_memes(limit: int = 5) -> List[MemeResponse]:
         trend_status=m["trend_status"],
         is_featured=m["is_featured"],
         created_at=m["created_at"],
+        ipo_price=m.get("ipo_price"),
+        ipo_shares_remaining=m.get("ipo_shares_remaining"),
+        ipo_end_at=m.get("ipo_end_at"),
+        ipo_shares_total=m.get("ipo_shares_total"),
     ) for m in memes]
 
 
@@ -722,7 +852,7 @@ async def migrate_legacy_memes():
             {"ipo_price": {"$exists": False}},
             {"ipo_price": None},
         ]
-    }).to_list(length=1000)
+    }, {"current_price": 1, "total_shares": 1}).to_list(length=1000)
     
     if not legacy_memes:
         return
@@ -755,3 +885,37 @@ async def migrate_legacy_memes():
     
     if migrated > 0:
         print(f"Migrated {migrated} legacy memes to orderbook system!")
+
+
+async def reconcile_open_order_counters() -> int:
+    """
+    Recompute open_sell_qty / open_buy_qty on every meme from the open orders
+    in `orders`, repairing any drift in the $inc-maintained counters.
+    Returns the number of memes whose counters were corrected.
+    """
+    db = get_database()
+
+    totals: dict[str, dict[str, int]] = {}
+    pipeline = [
+        {"$match": {"status": "open"}},
+        {"$group": {"_id": {"meme_id": "$meme_id", "type": "$type"}, "total": {"$sum": "$quantity_remaining"}}},
+    ]
+    async for row in db.orders.aggregate(pipeline):
+        key = row["_id"]
+        field = "open_sell_qty" if key.get("type") == "sell" else "open_buy_qty"
+        totals.setdefault(str(key.get("meme_id")), {})[field] = int(row.get("total", 0))
+
+    ops = []
+    async for meme in db.memes.find({}, {"open_sell_qty": 1, "open_buy_qty": 1}):
+        expected = totals.get(str(meme["_id"]), {})
+        fixed = {
+            field: int(expected.get(field, 0))
+            for field in ("open_sell_qty", "open_buy_qty")
+            if meme.get(field) != int(expected.get(field, 0))
+        }
+        if fixed:
+            ops.append(UpdateOne({"_id": meme["_id"]}, {"$set": fixed}))
+
+    if ops:
+        await db.memes.bulk_write(ops, ordered=False)
+    return len(ops)
@@ -0,0 +1,316 @@
+"""
+In-memory order books for the post-IPO secondary market.
+
+Each meme gets one OrderBook holding its resting bids and asks as sorted
+price levels. Inside a level, orders keep arrival order (price-time priority).
+Matching happens entirely in memory; the `orders` collection is the journal
+that trading_service writes behind every change, and books are rebuilt from
+the open orders in it on startup.
+
+Books live in process memory, so the API must run as a single worker.
+"""
+
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, List, Tuple, Dict
+
+from app.core.database import get_database
+
+
+class RestingOrder:
+    """An open order sitting in the book."""
+
+    __slots__ = (
+        "order_id", "side", "meme_id", "owner_id", "owner_username",
+        "price", "quantity_remaining", "created_at",
+    )
+
+    def __init__(
+        self,
+        order_id: str,
+        side: str,
+        meme_id: str,
+        owner_id: str,
+        owner_username: str,
+        price: float,
+        quantity_remaining: int,
+        created_at: Optional[datetime] = None,
+    ):
+        self.order_id = order_id
+        self.side = side
+        self.meme_id = meme_id
+        self.owner_id = owner_id
+        self.owner_username = owner_username
+        self.price = float(price)
+        self.quantity_remaining = int(quantity_remaining)
+        self.created_at = created_at or datetime.utcnow()
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "RestingOrder":
+        """Build a resting order from an `orders` document."""
+        side = doc["type"]
+        owner_key = "buyer" if side == "buy" else "seller"
+        return cls(
+            order_id=str(doc["_id"]),
+            side=side,
+            meme_id=doc["meme_id"],
+            owner_id=str(doc.get(f"{owner_key}_id") or ""),
+            owner_username=doc.get(f"{owner_key}_username", ""),
+            price=float(doc.get("price", 0)),
+            quantity_remaining=int(doc.get("quantity_remaining", 0)),
+            created_at=doc.get("created_at"),
+        )
+
+
+class PriceLevel:
+    """All resting orders at one price, oldest first."""
+
+    __slots__ = ("price", "orders", "total_quantity")
+
+    def __init__(self, price: float):
+        self.price = price
+        self.orders: "OrderedDict[str, RestingOrder]" = OrderedDict()
+        self.total_quantity = 0
+
+
+class OrderBook:
+    """Bids and asks for a single meme."""
+
+    def __init__(self, meme_id: str):
+        self.meme_id = meme_id
+        self._levels: Dict[str, Dict[float, PriceLevel]] = {"buy": {}, "sell": {}}
+        # Both price lists are ascending; best bid is the last, best ask the first.
+        self._prices: Dict[str, List[float]] = {"buy": [], "sell": []}
+        self._orders: Dict[str, RestingOrder] = {}
+        self._open_quantity: Dict[str, int] = {"buy": 0, "sell": 0}
+        # Changes since checkpoint(), for rollback(); None when not recording.
+        self._journal: Optional[list] = None
+
+    def __contains__(self, order_id: str) -> bool:
+        return order_id in self._orders
+
+    def get(self, order_id: str) -> Optional[RestingOrder]:
+        return self._orders.get(order_id)
+
+    def open_quantity(self, side: str) -> int:
+        """Total resting quantity on one side of the book."""
+        return self._open_quantity[side]
+
+    def add(self, order: RestingOrder) -> None:
+        """Rest an order at the back of its price level."""
+        if order.quantity_remaining <= 0 or order.order_id in self._orders:
+            return
+        levels = self._levels[order.side]
+        level = levels.get(order.price)
+        if level is None:
+            level = PriceLevel(order.price)
+            levels[order.price] = level
+            insort(self._prices[order.side], order.price)
+        level.orders[order.order_id] = order
+        level.total_quantity += order.quantity_remaining
+        self._orders[order.order_id] = order
+        self._open_quantity[order.side] += order.quantity_remaining
+        if self._journal is not None:
+            self._journal.append(("add", order.order_id))
+
+    def remove(self, order_id: str) -> Optional[RestingOrder]:
+        """Take an order out of the book (cancel). Returns None if it is not resting."""
+        order = self._orders.pop(order_id, None)
+        if order is None:
+            return None
+        level = self._levels[order.side][order.price]
+        del level.orders[order_id]
+        level.total_quantity -= order.quantity_remaining
+        self._open_quantity[order.side] -= order.quantity_remaining
+        if not level.orders:
+            self._drop_level(order.side, order.price)
+        if self._journal is not None:
+            self._journal.append(("remove", order_id))
+        return order
+
+    def _drop_level(self, side: str, price: float) -> None:
+        del self._levels[side][price]
+        prices = self._prices[side]
+        del prices[bisect_left(prices, price)]
+
+    def best_price(self, side: str) -> Optional[float]:
+        """Best bid (highest) or best ask (lowest), if any."""
+        prices = self._prices[side]
+        if not prices:
+            return None
+        return prices[-1] if side == "buy" else prices[0]
+
+    def fillable(self, side: str, limit_price: float, quantity: int) -> int:
+        """
+        How much of an incoming order could fill right now (capped at `quantity`),
+        without touching the book. Same crossing rules as match().
+        """
+        opposite = "sell" if side == "buy" else "buy"
+        prices = self._prices[opposite]
+        crossing = prices if side == "buy" else reversed(prices)
+        available = 0
+        for price in crossing:
+            if (side == "buy" and price > limit_price) or (side == "sell" and price < limit_price):
+                break
+            available += self._levels[opposite][price].total_quantity
+            if available >= quantity:
+                return int(quantity)
+        return available
+
+    def depth(self, levels: int) -> Dict[str, List[dict]]:
+        """
+        Top `levels` aggregated price levels per side, best first.
+        Level totals are maintained on every add/fill/remove, so this is O(levels).
+        """
+        def side_levels(side: str, prices) -> List[dict]:
+            out = []
+            for price in prices:
+                level = self._levels[side][price]
+                out.append({"price": price, "quantity": level.total_quantity, "orders": len(level.orders)})
+            return out
+
+        bids = self._prices["buy"]
+        asks = self._prices["sell"]
+        return {
+            "bids": side_levels("buy", bids[:-levels - 1:-1] if levels > 0 else []),
+            "asks": side_levels("sell", asks[:levels] if levels > 0 else []),
+        }
+
+    def match(self, side: str, limit_price: float, quantity: int) -> List[Tuple[RestingOrder, int]]:
+        """
+        Match an incoming order against the opposite side of the book.
+
+        `side` is the incoming order's side. A buy crosses asks priced at or
+        below `limit_price`; a sell crosses bids at or above it. Fills are
+        applied to the book immediately and returned as (resting_order, qty)
+        in execution order. Filled orders are dropped from the book.
+        """
+        opposite = "sell" if side == "buy" else "buy"
+        fills: List[Tuple[RestingOrder, int]] = []
+        qty_left = int(quantity)
+
+        while qty_left > 0:
+            price = self.best_price(opposite)
+            if price is None:
+                break
+            if side == "buy" and price > limit_price:
+                break
+            if side == "sell" and price < limit_price:
+                break
+
+            level = self._levels[opposite][price]
+            while qty_left > 0 and level.orders:
+                resting = next(iter(level.orders.values()))
+                take = min(resting.quantity_remaining, qty_left)
+                resting.quantity_remaining -= take
+                level.total_quantity -= take
+                self._open_quantity[opposite] -= take
+                qty_left -= take
+                fills.append((resting, take))
+                if self._journal is not None:
+                    self._journal.append(("fill", resting, take))
+                if resting.quantity_remaining <= 0:
+                    del level.orders[resting.order_id]
+                    del self._orders[resting.order_id]
+
+            if not level.orders:
+                self._drop_level(opposite, price)
+
+        return fills
+
+    # ---- rollback ----
+    def checkpoint(self) -> None:
+        """Start recording adds and fills so rollback() can undo them. Drops any earlier checkpoint."""
+        self._journal = []
+
+    def commit(self) -> None:
+        """Keep everything since checkpoint() and stop recording."""
+        self._journal = None
+
+    def rollback(self) -> List[str]:
+        """
+        Undo the adds and fills since checkpoint(): added orders are removed,
+        filled quantity goes back to its order, and fully filled orders return
+        to the front of their level. Orders cancelled in the meantime stay out;
+        their ids are returned.
+        """
+        journal, self._journal = self._journal or [], None
+        cancelled = {entry[1] for entry in journal if entry[0] == "remove"}
+        for entry in reversed(journal):
+            if entry[0] == "add":
+                if entry[1] not in cancelled:
+                    self.remove(entry[1])
+            elif entry[0] == "fill":
+                order, take = entry[1], entry[2]
+                if order.order_id not in cancelled:
+                    self._unfill(order, take)
+        return sorted(cancelled)
+
+    def _unfill(self, order: RestingOrder, quantity: int) -> None:
+        if order.order_id in self._orders:
+            level = self._levels[order.side][order.price]
+            order.quantity_remaining += quantity
+            level.total_quantity += quantity
+            self._open_quantity[order.side] += quantity
+            return
+        # Fully filled: matching always takes from the front, so that's where it goes back.
+        order.quantity_remaining += quantity
+        self.add(order)
+        self._levels[order.side][order.price].orders.move_to_end(order.order_id, last=False)
+
+
+# ============ Book Registry ============
+_books: Dict[str, OrderBook] = {}
+
+
+def get_order_book(meme_id: str) -> OrderBook:
+    """Get (or lazily create) the book for a meme."""
+    book = _books.get(meme_id)
+    if book is None:
+        book = OrderBook(meme_id)
+        _books[meme_id] = book
+    return book
+
+
+def get_depth(meme_id: str, levels: int) -> dict:
+    """Depth snapshot for a meme without creating a book for memes that never traded."""
+    book = _books.get(meme_id)
+    snapshot = book.depth(levels) if book is not None else {"bids": [], "asks": []}
+    best_bid = snapshot["bids"][0]["price"] if snapshot["bids"] else None
+    best_ask = snapshot["asks"][0]["price"] if snapshot["asks"] else None
+    snapshot.update({
+        "meme_id": meme_id,
+        "best_bid": best_bid,
+        "best_ask": best_ask,
+        "spread": (best_ask - best_bid) if best_bid is not None and best_ask is not None else None,
+    })
+    return snapshot
+
+
+async def reload_order_book(meme_id: str) -> int:
+    """Rebuild one meme's book from its open orders in Mongo. Returns the number of orders loaded."""
+    db = get_database()
+    book = OrderBook(meme_id)
+    loaded = 0
+    cursor = db.orders.find({"meme_id": meme_id, "status": "open"}).sort("created_at", 1)
+    async for doc in cursor:
+        if int(doc.get("quantity_remaining", 0)) > 0:
+            book.add(RestingOrder.from_doc(doc))
+            loaded += 1
+    _books[meme_id] = book
+    return loaded
+
+
+async def load_order_books() -> int:
+    """Rebuild every book from open orders in Mongo. Returns the number of orders loaded."""
+    db = get_database()
+    _books.clear()
+    loaded = 0
+    cursor = db.orders.find({"status": "open"}).sort("created_at", 1)
+    async for doc in cursor:
+        if int(doc.get("quantity_remaining", 0)) <= 0:
+            continue
+        get_order_book(doc["meme_id"]).add(RestingOrder.from_doc(doc))
+        loaded += 1
+    return loaded
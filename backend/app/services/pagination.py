@@ -0,0 +1,132 @@
+"""
+Keyset (cursor) pagination.
+
+`.skip(n)` makes MongoDB walk and discard n documents, so page 500 of the
+feed costs 500 pages of work. Instead each page ends with an opaque cursor
+holding the sort value and _id of its last document; the next page asks
+for documents strictly after that (sort_field, _id) pair, which a compound
+index on (..., sort_field, _id) answers by seeking straight to it.
+_id breaks ties, so documents with equal sort values are neither skipped
+nor repeated.
+
+Exact totals are a full count_documents per request; they are optional
+(include_total) and, when asked for, served from a short TTL cache.
+"""
+
+import base64
+import json
+import time
+from typing import Any, Optional, List, Dict, Tuple
+from bson import json_util
+
+from app.core.config import settings
+
+
+def encode_cursor(sort_field: str, value: Any, doc_id: Any) -> str:
+    """Opaque token for the position just after a document."""
+    raw = json_util.dumps([sort_field, value, doc_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, sort_field: str) -> Tuple[Any, Any]:
+    """(sort value, _id) from a cursor. Raises ValueError for a bad token or another sort's cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        field, value, doc_id = json_util.loads(raw.decode())
+    except (ValueError, TypeError, json.JSONDecodeError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    if field != sort_field:
+        raise ValueError("Cursor belongs to a different sort order")
+    return value, doc_id
+
+
+def keyset_sort(sort_field: str, sort_dir: int) -> List[tuple]:
+    return [(sort_field, sort_dir), ("_id", sort_dir)]
+
+
+def keyset_query(query: dict, sort_field: str, sort_dir: int, value: Any, doc_id: Any) -> dict:
+    """`query` narrowed to the documents after (value, doc_id) in keyset_sort order."""
+    after = "$lt" if sort_dir < 0 else "$gt"
+    # Missing/null sorts lowest, but $lt/$gt never match it (or it them).
+    if value is None:
+        clauses = [{sort_field: None, "_id": {after: doc_id}}]
+        if sort_dir > 0:
+            clauses.append({sort_field: {"$ne": None}})
+    else:
+        clauses = [
+            {sort_field: {after: value}},
+            {sort_field: value, "_id": {after: doc_id}},
+        ]
+        if sort_dir < 0:
+            clauses.append({sort_field: None})
+    narrowed = dict(query)
+    narrowed["$and"] = list(query.get("$and", [])) + [{"$or": clauses}]
+    return narrowed
+
+
+async def fetch_page(
+    collection,
+    query: dict,
+    sort_field: str,
+    sort_dir: int,
+    per_page: int,
+    cursor: Optional[str] = None,
+    page: int = 1,
+    projection: Optional[dict] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    One page of `query` in (sort_field, _id) order, plus the cursor of the next page (None on the last).
+    With a cursor, `page` is ignored; without one, `page` falls back to skip() for old clients.
+    """
+    if cursor:
+        value, doc_id = decode_cursor(cursor, sort_field)
+        query = keyset_query(query, sort_field, sort_dir, value, doc_id)
+        skip = 0
+    else:
+        skip = (page - 1) * per_page
+
+    find = collection.find(query, projection).sort(keyset_sort(sort_field, sort_dir))
+    if skip:
+        find = find.skip(skip)
+    # One extra document tells us whether there is a next page without counting.
+    docs = await find.limit(per_page + 1).to_list(length=per_page + 1)
+
+    next_cursor = None
+    if len(docs) > per_page:
+        docs = docs[:per_page]
+        last = docs[-1]
+        next_cursor = encode_cursor(sort_field, last.get(sort_field), last["_id"])
+    return docs, next_cursor
+
+
+class CountCache:
+    """count_documents results per (collection, query), kept for LIST_COUNT_CACHE_SECONDS."""
+
+    def __init__(self):
+        self._counts: Dict[Tuple[str, str], Tuple[float, int]] = {}
+
+    async def count(self, collection, query: dict) -> int:
+        key = (collection.name, json_util.dumps(query, sort_keys=True))
+        now = time.monotonic()
+        cached = self._counts.get(key)
+        if cached is not None and now - cached[0] < settings.LIST_COUNT_CACHE_SECONDS:
+            return cached[1]
+
+        total = await collection.count_documents(query)
+        if len(self._counts) >= settings.LIST_COUNT_CACHE_MAX_ENTRIES:
+            # Drop expired entries; if that isn't enough, start over.
+            self._counts = {
+                k: v for k, v in self._counts.items()
+                if now - v[0] < settings.LIST_COUNT_CACHE_SECONDS
+            }
+            if len(self._counts) >= settings.LIST_COUNT_CACHE_MAX_ENTRIES:
+                self._counts.clear()
+        self._counts[key] = (now, total)
+        return total
+
+    def invalidate(self, collection_name: str) -> None:
+        for key in [k for k in self._counts if k[0] == collection_name]:
+            del self._counts[key]
+
+
+count_cache = CountCache()
@@ -0,0 +1,85 @@
+"""
+In-process pub/sub for live price ticks.
+
+candle_service.record_tick publishes every price change here (the same
+stream that feeds the candles and the rolling 24h stats), which covers
+trade repricing and engagement repricing alike. GET /api/stream/prices
+relays it to clients over SSE.
+
+Each subscription holds at most one pending tick per meme: a newer tick for
+the same meme replaces the one still waiting, so a slow client only ever
+has the latest prices queued. Publishing never awaits and never grows a
+queue, whatever the consumers do.
+"""
+
+import asyncio
+from typing import Optional, Dict, Iterable, List, Set
+
+
+class PriceSubscription:
+    """One client's conflated view of the tick stream."""
+
+    __slots__ = ("meme_ids", "_pending", "_ready")
+
+    def __init__(self, meme_ids: Optional[Set[str]] = None):
+        self.meme_ids = meme_ids  # None = every meme
+        self._pending: Dict[str, dict] = {}
+        self._ready = asyncio.Event()
+
+    def offer(self, tick: dict) -> None:
+        self._pending[tick["meme_id"]] = tick
+        self._ready.set()
+
+    async def next_batch(self, timeout: float) -> List[dict]:
+        """Latest tick per meme since the previous batch; empty if nothing arrived within `timeout`."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._ready.clear()
+        pending, self._pending = self._pending, {}
+        return list(pending.values())
+
+
+class PriceBus:
+    """Fan-out of price ticks to subscriptions, indexed by meme."""
+
+    def __init__(self):
+        self._all: Set[PriceSubscription] = set()
+        self._by_meme: Dict[str, Set[PriceSubscription]] = {}
+
+    def subscribe(self, meme_ids: Optional[Iterable[str]] = None) -> PriceSubscription:
+        subscription = PriceSubscription(set(meme_ids) if meme_ids else None)
+        if subscription.meme_ids is None:
+            self._all.add(subscription)
+        else:
+            for meme_id in subscription.meme_ids:
+                self._by_meme.setdefault(meme_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: PriceSubscription) -> None:
+        if subscription.meme_ids is None:
+            self._all.discard(subscription)
+            return
+        for meme_id in subscription.meme_ids:
+            subscribers = self._by_meme.get(meme_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._by_meme[meme_id]
+
+    def has_subscribers(self, meme_id: str) -> bool:
+        return bool(self._all) or meme_id in self._by_meme
+
+    def publish(self, tick: dict) -> None:
+        for subscription in self._all:
+            subscription.offer(tick)
+        for subscription in self._by_meme.get(tick["meme_id"], ()):
+            subscription.offer(tick)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._all) + len({s for subs in self._by_meme.values() for s in subs})
+
+
+price_bus = PriceBus()
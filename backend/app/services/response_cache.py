@@ -0,0 +1,125 @@
+"""
+Response cache for the meme list, trending and featured endpoints.
+
+Entries hold the anonymous MemeResponse page for a normalized query
+(category, sort, search, page/cursor, per_page), so every caller of the
+same query shares one entry; the user-specific fields (votes, holdings)
+are overlaid per request by the caller.
+
+Bounded three ways:
+- size: an LRU of RESPONSE_CACHE_MAX_ENTRIES;
+- time: entries expire after RESPONSE_CACHE_TTL_SECONDS, which also bounds
+  how stale fields that don't invalidate (open sell quantity) can be;
+- events: a price or engagement change on a meme drops every entry that
+  contains it, and a new listing drops everything.
+
+A page that was being loaded while one of its memes was invalidated is not
+stored (same idea as the band cache's generation check), so an
+invalidation can't be undone by a slow fill.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, List, Set
+
+from app.core.config import settings
+
+
+class CachedPage:
+    """One cached response: the anonymous memes plus the list metadata."""
+
+    __slots__ = ("memes", "total", "next_cursor", "meme_ids", "expires_at")
+
+    def __init__(self, memes: list, total: Optional[int], next_cursor: Optional[str], expires_at: float):
+        self.memes = tuple(memes)
+        self.total = total
+        self.next_cursor = next_cursor
+        self.meme_ids = frozenset(m.id for m in memes)
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """LRU of CachedPage by query key, indexed by meme id for invalidation."""
+
+    def __init__(self):
+        self._entries: "OrderedDict[tuple, CachedPage]" = OrderedDict()
+        self._by_meme: Dict[str, Set[tuple]] = {}
+        self._seq = 0
+        self._invalidated_at: Dict[str, int] = {}
+        self._cleared_at = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[CachedPage]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+        if entry is not None:
+            self._drop(key)
+        self.misses += 1
+        return None
+
+    def begin(self) -> int:
+        """Token to pass to put() for a page about to be loaded."""
+        return self._seq
+
+    def put(
+        self,
+        key: tuple,
+        memes: List,
+        total: Optional[int],
+        next_cursor: Optional[str],
+        started: int,
+    ) -> CachedPage:
+        """Store a freshly loaded page, unless something it contains was invalidated since `started`."""
+        entry = CachedPage(memes, total, next_cursor, time.monotonic() + settings.RESPONSE_CACHE_TTL_SECONDS)
+        if self._cleared_at > started or any(self._invalidated_at.get(m, -1) > started for m in entry.meme_ids):
+            return entry
+
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = entry
+        for meme_id in entry.meme_ids:
+            self._by_meme.setdefault(meme_id, set()).add(key)
+        while len(self._entries) > settings.RESPONSE_CACHE_MAX_ENTRIES:
+            self._drop(next(iter(self._entries)))
+        return entry
+
+    def _drop(self, key: tuple) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for meme_id in entry.meme_ids:
+            keys = self._by_meme.get(meme_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_meme[meme_id]
+
+    def invalidate_meme(self, meme_id: str) -> None:
+        """Drop every entry containing the meme; call after a price or engagement change."""
+        self._seq += 1
+        self._invalidated_at[meme_id] = self._seq
+        for key in list(self._by_meme.get(meme_id, ())):
+            self._drop(key)
+
+    def clear(self) -> None:
+        """Drop everything (e.g. a new listing can enter any list)."""
+        self._seq += 1
+        self._cleared_at = self._seq
+        self._entries.clear()
+        self._by_meme.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache()
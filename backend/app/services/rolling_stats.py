@@ -0,0 +1,283 @@
+"""
+Rolling 24h market statistics.
+
+Each meme that ticked in the last 24 hours has a MemeWindow: a ring buffer
+of 1440 one-minute buckets plus running totals, so volume, change, high and
+low over the trailing 24h are maintained incrementally (O(1) amortized per
+tick, and per minute of elapsed time) instead of being accumulated forever.
+
+Each window also keeps streaming trend estimators over tick returns: an
+EWMA of the log return and an EWMA variance (the rolling stddev), updated in
+O(1) per tick. trend_status is derived from them together with the 24h
+change, so one noisy tick no longer flips a meme between HOT and COLD.
+
+Ticks arrive through candle_service.record_tick, i.e. the same price
+stream that feeds the candles. Results are written to the meme documents
+(volume_24h, price_change_24h, price_change_percent_24h, high_24h, low_24h,
+trend_status) every ROLLING_STATS_PERSIST_SECONDS with one bulk_write, which
+is what the list and trending endpoints sort on. Only fields that changed
+since the last persist are $set.
+"""
+
+import asyncio
+import math
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Deque, Tuple
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.core.database import get_database
+from app.models.meme import TrendStatus
+from app.services.response_cache import response_cache
+
+
+WINDOW_MINUTES = 24 * 60
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _minute_of(at: datetime) -> int:
+    return int((at - _EPOCH).total_seconds()) // 60
+
+
+class MemeWindow:
+    """Trailing 24h of one-minute buckets for a single meme."""
+
+    def __init__(self, base_price: float):
+        # Per-slot bucket data; slot = minute % WINDOW_MINUTES, stamp says which minute it holds.
+        self._stamp = [-1] * WINDOW_MINUTES
+        self._volume = [0] * WINDOW_MINUTES
+        self._close = [0.0] * WINDOW_MINUTES
+        self._minute: Optional[int] = None  # latest minute the window has advanced to
+        self._latest_expired = -1
+        self.volume = 0
+        self.base_price = float(base_price)  # last price from before the window (the "24h ago" price)
+        self.last_price = float(base_price)
+        # Monotonic deques of (minute, price) for the window max / min.
+        self._highs: Deque[Tuple[int, float]] = deque()
+        self._lows: Deque[Tuple[int, float]] = deque()
+        # Trend estimators over per-tick log returns.
+        self._trend_price = float(base_price)
+        self.ewma_return = 0.0
+        self.ewma_variance = 0.0
+
+    def advance(self, minute: int) -> None:
+        """Move the window forward to `minute`, expiring buckets that fall out of it."""
+        if self._minute is None:
+            self._minute = minute
+            return
+        if minute <= self._minute:
+            return
+        first = max(self._minute + 1, minute - WINDOW_MINUTES + 1)
+        for m in range(first, minute + 1):
+            slot = m % WINDOW_MINUTES
+            expired = self._stamp[slot]
+            if expired != -1:
+                self.volume -= self._volume[slot]
+                if expired > self._latest_expired:
+                    self._latest_expired = expired
+                    self.base_price = self._close[slot]
+                self._stamp[slot] = -1
+                self._volume[slot] = 0
+        self._minute = minute
+
+        cutoff = minute - WINDOW_MINUTES
+        while self._highs and self._highs[0][0] <= cutoff:
+            self._highs.popleft()
+        while self._lows and self._lows[0][0] <= cutoff:
+            self._lows.popleft()
+
+    def add(self, minute: int, price: float, volume: int = 0, trend: bool = True) -> None:
+        """
+        Record a tick at `minute` (ticks older than the window head are folded into the head).
+        `trend=False` leaves the trend estimators alone (used for candle extremes on reload).
+        """
+        self.advance(minute)
+        minute = max(minute, self._minute)
+        slot = minute % WINDOW_MINUTES
+        if self._stamp[slot] != minute:
+            self._stamp[slot] = minute
+            self._volume[slot] = 0
+        self._volume[slot] += int(volume)
+        self._close[slot] = float(price)
+        self.volume += int(volume)
+        self.last_price = float(price)
+        if trend:
+            self._observe_return(float(price))
+
+        while self._highs and self._highs[-1][1] <= price:
+            self._highs.pop()
+        self._highs.append((minute, float(price)))
+        while self._lows and self._lows[-1][1] >= price:
+            self._lows.pop()
+        self._lows.append((minute, float(price)))
+
+    def _observe_return(self, price: float) -> None:
+        if self._trend_price > 0 and price > 0:
+            r = math.log(price / self._trend_price)
+            alpha = float(settings.TREND_EWMA_ALPHA)
+            diff = r - self.ewma_return
+            increment = alpha * diff
+            self.ewma_return += increment
+            self.ewma_variance = (1.0 - alpha) * (self.ewma_variance + diff * increment)
+        self._trend_price = price
+
+    def is_empty(self) -> bool:
+        return not self._highs
+
+    def trend_status(self, change_percent: float) -> str:
+        """
+        HOT / COLD: the 24h move is at least TREND_MOVE_PCT and the EWMA return agrees.
+        VOLATILE: otherwise, if the rolling stddev of tick returns is at least TREND_VOLATILE_PCT.
+        """
+        if self.is_empty():
+            return TrendStatus.STABLE.value
+        move = float(settings.TREND_MOVE_PCT)
+        if change_percent >= move and self.ewma_return >= 0:
+            return TrendStatus.HOT.value
+        if change_percent <= -move and self.ewma_return <= 0:
+            return TrendStatus.COLD.value
+        if math.sqrt(self.ewma_variance) * 100 >= float(settings.TREND_VOLATILE_PCT):
+            return TrendStatus.VOLATILE.value
+        return TrendStatus.STABLE.value
+
+    def snapshot(self) -> dict:
+        change = self.last_price - self.base_price
+        change_percent = round(change / self.base_price * 100, 4) if self.base_price > 0 else 0.0
+        return {
+            "volume_24h": int(self.volume),
+            "price_change_24h": round(change, 4),
+            "price_change_percent_24h": change_percent,
+            "high_24h": self._highs[0][1] if self._highs else self.last_price,
+            "low_24h": self._lows[0][1] if self._lows else self.last_price,
+            "trend_status": self.trend_status(change_percent),
+        }
+
+
+class RollingStats:
+    """Registry of MemeWindows plus the periodic persist loop."""
+
+    def __init__(self):
+        self._windows: Dict[str, MemeWindow] = {}
+        self._persisted: Dict[str, dict] = {}  # last snapshot written per meme
+        self._task: Optional[asyncio.Task] = None
+
+    def observe(
+        self,
+        meme_id: str,
+        price: float,
+        volume: int = 0,
+        at: Optional[datetime] = None,
+        previous_price: Optional[float] = None,
+    ) -> None:
+        """
+        Feed one tick (called for every recorded price change). `previous_price` is the
+        price before this tick; it seeds a new window, so the first move after a quiet
+        day shows up as change (and trend) instead of starting from zero.
+        """
+        minute = _minute_of(at or datetime.utcnow())
+        window = self._windows.get(meme_id)
+        if window is None:
+            seed = previous_price if previous_price and previous_price > 0 else price
+            window = MemeWindow(base_price=seed)
+            self._windows[meme_id] = window
+            # The meme sat at `seed` until now, so it counts toward the 24h high/low.
+            window.add(minute, seed, trend=False)
+        window.add(minute, price, volume)
+
+    def get(self, meme_id: str) -> Optional[dict]:
+        """Current 24h stats for a meme, or None if it hasn't ticked in the last 24h."""
+        window = self._windows.get(meme_id)
+        if window is None:
+            return None
+        window.advance(_minute_of(datetime.utcnow()))
+        return window.snapshot()
+
+    async def load_from_candles(self) -> int:
+        """Rebuild the windows from the last 24h of 1m candles (startup). Returns memes loaded."""
+        db = get_database()
+        self._windows.clear()
+        self._persisted.clear()
+        since = datetime.utcnow() - timedelta(minutes=WINDOW_MINUTES)
+        cursor = db.candles.find({"res": "1m", "t": {"$gte": since}}).sort("t", 1)
+        async for bar in cursor:
+            meme_id = bar["meme_id"]
+            window = self._windows.get(meme_id)
+            if window is None:
+                window = MemeWindow(base_price=float(bar["open"]))
+                self._windows[meme_id] = window
+            minute = _minute_of(bar["t"])
+            # Fold the bar in as ticks: extremes first so high/low are kept, close last.
+            # Only closes feed the trend estimators.
+            window.add(minute, float(bar["high"]), int(bar.get("volume", 0)), trend=False)
+            window.add(minute, float(bar["low"]), trend=False)
+            window.add(minute, float(bar["close"]))
+        return len(self._windows)
+
+    async def persist(self) -> int:
+        """Write stats that changed since the last persist in one bulk_write. Returns memes written."""
+        now_minute = _minute_of(datetime.utcnow())
+        ops, written = [], []
+        for meme_id, window in list(self._windows.items()):
+            window.advance(now_minute)
+            snapshot = window.snapshot()
+            previous = self._persisted.get(meme_id, {})
+            changed = {k: v for k, v in snapshot.items() if previous.get(k) != v}
+            if window.is_empty():
+                # Nothing for 24h: this snapshot is final, stop tracking the meme.
+                del self._windows[meme_id]
+                self._persisted.pop(meme_id, None)
+            else:
+                self._persisted[meme_id] = snapshot
+            if changed and ObjectId.is_valid(meme_id):
+                ops.append(UpdateOne({"_id": ObjectId(meme_id)}, {"$set": changed}))
+                written.append(meme_id)
+        if ops:
+            await get_database().memes.bulk_write(ops, ordered=False)
+            for meme_id in written:
+                response_cache.invalidate_meme(meme_id)
+        return len(ops)
+
+    async def reset_untracked(self) -> None:
+        """Zero the 24h fields on memes with no ticks in the window (startup); high/low become the current price."""
+        tracked = [ObjectId(m) for m in self._windows if ObjectId.is_valid(m)]
+        await get_database().memes.update_many(
+            {"_id": {"$nin": tracked}},
+            [{"$set": {
+                "volume_24h": 0,
+                "price_change_24h": 0.0,
+                "price_change_percent_24h": 0.0,
+                "high_24h": "$current_price",
+                "low_24h": "$current_price",
+                "trend_status": TrendStatus.STABLE.value,
+            }}],
+        )
+
+    async def _persist_logged(self) -> None:
+        try:
+            await self.persist()
+        except Exception as e:
+            print(f"❌ Rolling stats persist failed: {e}")
+
+    async def _run(self) -> None:
+        interval = max(1.0, float(settings.ROLLING_STATS_PERSIST_SECONDS))
+        while True:
+            await asyncio.sleep(interval)
+            await self._persist_logged()
+
+    def start(self) -> None:
+        """Start the periodic persist loop (startup)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the loop and persist once more (shutdown)."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._persist_logged()
+
+
+rolling_stats = RollingStats()
@@ -0,0 +1,119 @@
+"""
+Indexed meme search.
+
+Two index-backed lookups replace the unanchored $regex scans over name,
+ticker and description:
+- ticker prefix: tickers are stored upper-case, so "dog" / "$dog" becomes
+  the anchored, case-sensitive {"ticker": {"$regex": "^DOG"}}, a range scan
+  on the ticker index;
+- full text: a $text index over name and description (name weighted
+  higher), ranked by textScore. Text search matches whole words (stemmed),
+  not arbitrary substrings.
+
+Results rank an exact ticker match first, then ticker prefix matches
+(shortest first), then text matches by score. Ranking only reads _id,
+ticker and score, and is capped at SEARCH_MAX_RESULTS. Full documents are
+loaded for the requested page only. Paging uses the same opaque cursor as
+the list, holding an offset into the ranking (bounded by the cap).
+"""
+
+import re
+from typing import Optional, List, Tuple
+from pymongo import ASCENDING, TEXT
+
+from app.core.config import settings
+from app.core.database import get_database
+from app.services.pagination import encode_cursor, decode_cursor
+
+
+TEXT_INDEX_NAME = "meme_text_search"
+NAME_WEIGHT = 5  # Relative to description; changing it means dropping the text index first
+_SEARCH_CURSOR_KEY = "search"
+_TICKER_CHARS = re.compile(r"^[A-Z0-9_]+$")
+
+
+async def ensure_search_indexes() -> None:
+    db = get_database()
+    await db.memes.create_index([("ticker", ASCENDING)])
+    await db.memes.create_index(
+        [("name", TEXT), ("description", TEXT)],
+        weights={"name": NAME_WEIGHT, "description": 1},
+        name=TEXT_INDEX_NAME,
+        default_language="english",
+    )
+
+
+def ticker_prefix(search: str) -> Optional[str]:
+    """The ticker prefix a search can match ("$dog" -> "DOG"), or None if it can't be a ticker."""
+    candidate = search.strip().lstrip("$").upper()
+    if not candidate or len(candidate) > 10 or not _TICKER_CHARS.match(candidate):
+        return None
+    return candidate
+
+
+async def rank_matches(search: str, filters: dict, limit: int) -> List:
+    """_ids of up to `limit` memes matching `search` (plus `filters`), best match first."""
+    db = get_database()
+    ranked, seen = [], set()
+
+    prefix = ticker_prefix(search)
+    if prefix:
+        query = {**filters, "ticker": {"$regex": "^" + re.escape(prefix)}}
+        hits = await db.memes.find(query, {"ticker": 1}).sort("ticker", ASCENDING).limit(limit).to_list(length=limit)
+        hits.sort(key=lambda m: (m["ticker"] != prefix, len(m["ticker"]), m["ticker"]))
+        for meme in hits:
+            ranked.append(meme["_id"])
+            seen.add(meme["_id"])
+
+    if len(ranked) < limit:
+        # Text hits that were already ticker hits are skipped; `limit` of them is still enough.
+        query = {**filters, "$text": {"$search": search}}
+        score = {"score": {"$meta": "textScore"}}
+        cursor = db.memes.find(query, score).sort([("score", {"$meta": "textScore"})]).limit(limit)
+        async for meme in cursor:
+            if meme["_id"] not in seen:
+                ranked.append(meme["_id"])
+                seen.add(meme["_id"])
+                if len(ranked) >= limit:
+                    break
+    return ranked[:limit]
+
+
+async def search_memes(
+    search: str,
+    filters: dict,
+    per_page: int = 20,
+    cursor: Optional[str] = None,
+    page: int = 1,
+    include_total: bool = False,
+    projection: Optional[dict] = None,
+) -> Tuple[List[dict], Optional[int], Optional[str]]:
+    """
+    One page of search results as meme documents (with `projection`), plus the total
+    (capped at SEARCH_MAX_RESULTS; None unless include_total) and the next page's cursor.
+    """
+    if cursor:
+        offset, _ = decode_cursor(cursor, _SEARCH_CURSOR_KEY)
+        if not isinstance(offset, int) or offset < 0:
+            raise ValueError("Invalid cursor")
+    else:
+        offset = (page - 1) * per_page
+
+    cap = int(settings.SEARCH_MAX_RESULTS)
+    if offset >= cap:
+        total = len(await rank_matches(search, filters, cap)) if include_total else None
+        return [], total, None
+
+    # One extra id tells us whether there is a next page.
+    limit = cap if include_total else min(cap, offset + per_page + 1)
+    ranked = await rank_matches(search, filters, limit)
+    page_ids = ranked[offset:offset + per_page]
+
+    db = get_database()
+    docs = {m["_id"]: m async for m in db.memes.find({"_id": {"$in": page_ids}}, projection)}
+    memes = [docs[i] for i in page_ids if i in docs]
+
+    next_offset = offset + per_page
+    next_cursor = encode_cursor(_SEARCH_CURSOR_KEY, next_offset, None) if len(ranked) > next_offset else None
+    return memes, (len(ranked) if include_total else None), next_cursor
+
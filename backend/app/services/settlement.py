@@ -0,0 +1,320 @@
+"""
+Settlement stage for matched trades.
+
+Instead of writing every effect of every fill as it happens, execute_trade
+records them on a Settlement and flushes once. Each collection gets a
+single ordered bulk_write, so a sweep across many price levels costs a
+handful of round trips instead of several per fill. Repeated effects on the
+same document (e.g. one seller filled at several levels) are merged into one
+operation. Treasury fee totals are passed on to the fee accumulator.
+
+Guarded debits and escrows happen before the settlement (they are the
+checks), so they register a compensating write with the settlement.
+rollback() applies those instead of flushing when a trade fails part way.
+One settlement can carry several trades: checkpoint() before each one lets
+rollback() undo just that trade and keep the others.
+"""
+
+from copy import deepcopy
+from datetime import datetime
+from typing import Optional, List, Dict, Tuple
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne
+
+from app.core.database import get_database
+from app.services.fee_accumulator import fee_accumulator
+
+
+def portfolio_buy_pipeline(meme_id: str, quantity: int, cost: float) -> List[dict]:
+    """
+    Update pipeline that adds `quantity` shares bought for `cost` in total to a
+    user's portfolio: creates the holding if missing, otherwise bumps quantity
+    and re-averages the buy price. One server-side round trip, no read.
+    """
+    new_holding = {
+        "meme_id": meme_id,
+        "quantity_owned": quantity,
+        "average_buy_price": cost / quantity,
+        "total_investment_value": cost,
+    }
+    prev_investment = {"$multiply": ["$$h.average_buy_price", "$$h.quantity_owned"]}
+    new_qty = {"$add": ["$$h.quantity_owned", quantity]}
+    merged = {
+        "meme_id": "$$h.meme_id",
+        "quantity_owned": new_qty,
+        "average_buy_price": {"$divide": [{"$add": [prev_investment, cost]}, new_qty]},
+        "total_investment_value": {"$add": [prev_investment, cost]},
+    }
+    portfolio = {"$ifNull": ["$portfolio", []]}
+    return [{
+        "$set": {
+            "portfolio": {
+                "$cond": [
+                    {"$in": [meme_id, {"$ifNull": ["$portfolio.meme_id", []]}]},
+                    {"$map": {
+                        "input": portfolio,
+                        "as": "h",
+                        "in": {"$cond": [{"$eq": ["$$h.meme_id", meme_id]}, merged, "$$h"]},
+                    }},
+                    {"$concatArrays": [portfolio, [new_holding]]},
+                ]
+            }
+        }
+    }]
+
+
+def portfolio_sell_pipeline(meme_id: str, quantity: int) -> List[dict]:
+    """
+    Update pipeline that removes `quantity` shares from a user's holding,
+    keeping the average buy price and dropping the holding once it is empty.
+    Callers must guard the filter so the holding has at least `quantity`.
+    """
+    new_qty = {"$subtract": ["$$h.quantity_owned", quantity]}
+    reduced = {
+        "meme_id": "$$h.meme_id",
+        "quantity_owned": new_qty,
+        "average_buy_price": "$$h.average_buy_price",
+        "total_investment_value": {"$multiply": ["$$h.average_buy_price", new_qty]},
+    }
+    return [{
+        "$set": {
+            "portfolio": {
+                "$filter": {
+                    "input": {"$map": {
+                        "input": "$portfolio",
+                        "as": "h",
+                        "in": {"$cond": [{"$eq": ["$$h.meme_id", meme_id]}, reduced, "$$h"]},
+                    }},
+                    "as": "h",
+                    "cond": {"$gt": ["$$h.quantity_owned", 0]},
+                }
+            }
+        }
+    }]
+
+
+def portfolio_return_pipeline(meme_id: str, quantity: int, fallback_price: float) -> List[dict]:
+    """
+    Update pipeline that puts `quantity` escrowed shares back into a user's
+    holding without changing its average buy price. If the holding was
+    dropped in the meantime it is recreated at `fallback_price`.
+    """
+    new_holding = {
+        "meme_id": meme_id,
+        "quantity_owned": quantity,
+        "average_buy_price": fallback_price,
+        "total_investment_value": fallback_price * quantity,
+    }
+    new_qty = {"$add": ["$$h.quantity_owned", quantity]}
+    restored = {
+        "meme_id": "$$h.meme_id",
+        "quantity_owned": new_qty,
+        "average_buy_price": "$$h.average_buy_price",
+        "total_investment_value": {"$multiply": ["$$h.average_buy_price", new_qty]},
+    }
+    portfolio = {"$ifNull": ["$portfolio", []]}
+    return [{
+        "$set": {
+            "portfolio": {
+                "$cond": [
+                    {"$in": [meme_id, {"$ifNull": ["$portfolio.meme_id", []]}]},
+                    {"$map": {
+                        "input": portfolio,
+                        "as": "h",
+                        "in": {"$cond": [{"$eq": ["$$h.meme_id", meme_id]}, restored, "$$h"]},
+                    }},
+                    {"$concatArrays": [portfolio, [new_holding]]},
+                ]
+            }
+        }
+    }]
+
+
+class Settlement:
+    """Collects the database effects of one or more matches until flush()."""
+
+    def __init__(self):
+        self._user_incs: Dict[str, Dict[str, float]] = {}
+        self._portfolio_buys: Dict[Tuple[str, str], List[float]] = {}  # (user_id, meme_id) -> [qty, cost]
+        self._portfolio_returns: Dict[Tuple[str, str], List[float]] = {}  # (user_id, meme_id) -> [qty, fallback_price]
+        self._orders: List = []
+        self._meme_incs: Dict[str, Dict[str, int]] = {}
+        self._transactions: List = []
+        self._fees: Dict[str, float] = {}
+        self._fee_fills = 0
+        self._undo: List[Tuple[str, UpdateOne]] = []  # (collection, compensating op) for rollback()
+        self.started_writing = False  # Set once flush() has sent its first write
+
+    # ---- users ----
+    def inc_user(self, user_id: Optional[str], field: str, amount: float) -> None:
+        """$inc a numeric user field. Ids that aren't real users (e.g. "system") are ignored."""
+        if not user_id or not amount or not ObjectId.is_valid(str(user_id)):
+            return
+        incs = self._user_incs.setdefault(str(user_id), {})
+        incs[field] = incs.get(field, 0) + amount
+
+    def credit(self, user_id: Optional[str], amount: float) -> None:
+        """Add to a user's wallet balance."""
+        self.inc_user(user_id, "wallet_balance", amount)
+
+    def pending_credit(self, user_id: str) -> float:
+        """Wallet change for this user that is recorded here but not flushed yet."""
+        return float(self._user_incs.get(str(user_id), {}).get("wallet_balance", 0.0))
+
+    def buy_shares(self, user_id: str, meme_id: str, quantity: int, price: float) -> None:
+        """Credit shares to a user's portfolio at `price` per share."""
+        if not user_id or quantity <= 0 or not ObjectId.is_valid(str(user_id)):
+            return
+        entry = self._portfolio_buys.setdefault((str(user_id), meme_id), [0, 0.0])
+        entry[0] += quantity
+        entry[1] += price * quantity
+
+    def return_shares(self, user_id: str, meme_id: str, quantity: int, fallback_price: float) -> None:
+        """Give escrowed shares back to their owner (average buy price unchanged)."""
+        if not user_id or quantity <= 0 or not ObjectId.is_valid(str(user_id)):
+            return
+        entry = self._portfolio_returns.setdefault((str(user_id), meme_id), [0, fallback_price])
+        entry[0] += quantity
+
+    # ---- orders ----
+    def insert_order(self, order_doc: dict) -> None:
+        self._orders.append(InsertOne(order_doc))
+
+    def cancel_order(self, order_id: str) -> None:
+        self._orders.append(UpdateOne(
+            {"_id": ObjectId(order_id)},
+            {"$set": {"status": "cancelled", "updated_at": datetime.utcnow()}},
+        ))
+
+    def fill_order(self, order_id: str, quantity: int, reserved: float = 0.0, filled: bool = False) -> None:
+        """Journal a fill against a resting order (and mark it filled if exhausted)."""
+        inc = {"quantity_remaining": -quantity}
+        if reserved:
+            inc["reserved_remaining"] = -reserved
+        fields = {"updated_at": datetime.utcnow()}
+        if filled:
+            fields["status"] = "filled"
+        self._orders.append(UpdateOne({"_id": ObjectId(order_id)}, {"$inc": inc, "$set": fields}))
+
+    # ---- memes ----
+    def inc_meme(self, meme_id: str, field: str, amount: int) -> None:
+        """$inc a meme counter (open_sell_qty / open_buy_qty)."""
+        if not amount:
+            return
+        incs = self._meme_incs.setdefault(meme_id, {})
+        incs[field] = incs.get(field, 0) + amount
+
+    # ---- transactions ----
+    def insert_transaction(self, tx_doc: dict) -> str:
+        """Queue a transaction record. Assigns and returns its id."""
+        tx_doc.setdefault("_id", ObjectId())
+        self._transactions.append(InsertOne(tx_doc))
+        return str(tx_doc["_id"])
+
+    # ---- treasury ----
+    def add_fees(self, total: float, burned: float, creator: float, treasury: float) -> None:
+        """Fees from one fill. Handed to the fee accumulator on flush, not written to the treasury here."""
+        self._fee_fills += 1
+        for field, amount in (
+            ("total_fees", total),
+            ("burned_fees", burned),
+            ("creator_fees", creator),
+            ("treasury_fees", treasury),
+        ):
+            self._fees[field] = self._fees.get(field, 0.0) + amount
+
+    # ---- rollback ----
+    def undo(self, collection: str, op: UpdateOne) -> None:
+        """Compensating write for a change already made outside the settlement; applied by rollback() only."""
+        self._undo.append((collection, op))
+
+    def refund_on_rollback(self, user_id: str, amount: float) -> None:
+        """A guarded wallet debit to give back if the trade is rolled back."""
+        if amount:
+            self.undo("users", UpdateOne({"_id": ObjectId(user_id)}, {"$inc": {"wallet_balance": amount}}))
+
+    def return_shares_on_rollback(self, user_id: str, meme_id: str, quantity: int, fallback_price: float) -> None:
+        """Escrowed shares to give back if the trade is rolled back."""
+        if quantity > 0:
+            self.undo("users", UpdateOne(
+                {"_id": ObjectId(user_id)},
+                portfolio_return_pipeline(meme_id, int(quantity), fallback_price),
+            ))
+
+    def checkpoint(self) -> tuple:
+        """Snapshot of what is recorded so far, for rollback(checkpoint)."""
+        return (
+            deepcopy(self._user_incs), deepcopy(self._portfolio_buys), deepcopy(self._portfolio_returns),
+            len(self._orders), deepcopy(self._meme_incs), len(self._transactions),
+            dict(self._fees), self._fee_fills, len(self._undo),
+        )
+
+    async def rollback(self, checkpoint: Optional[tuple] = None) -> None:
+        """
+        Drop what was recorded (since `checkpoint`, or everything) and apply
+        the matching compensating writes, newest first.
+        """
+        if checkpoint is None:
+            checkpoint = ({}, {}, {}, 0, {}, 0, {}, 0, 0)
+        user_incs, portfolio_buys, portfolio_returns, orders, meme_incs, transactions, fees, fee_fills, undo_len = checkpoint
+        self._user_incs, self._portfolio_buys, self._portfolio_returns = user_incs, portfolio_buys, portfolio_returns
+        del self._orders[orders:]
+        self._meme_incs = meme_incs
+        del self._transactions[transactions:]
+        self._fees, self._fee_fills = fees, fee_fills
+        undo, self._undo = self._undo[undo_len:], self._undo[:undo_len]
+        db = get_database()
+        by_collection: Dict[str, List[UpdateOne]] = {}
+        for collection, op in reversed(undo):
+            by_collection.setdefault(collection, []).append(op)
+        for collection, ops in by_collection.items():
+            await db[collection].bulk_write(ops, ordered=True)
+
+    def is_empty(self) -> bool:
+        return not (
+            self._user_incs or self._portfolio_buys or self._portfolio_returns
+            or self._orders or self._meme_incs or self._transactions or self._fees
+        )
+
+    async def flush(self) -> None:
+        """Send everything recorded so far: one ordered bulk_write per collection."""
+        db = get_database()
+
+        orders, self._orders = self._orders, []
+        if orders:
+            self.started_writing = True
+            await db.orders.bulk_write(orders, ordered=True)
+
+        meme_incs, self._meme_incs = self._meme_incs, {}
+        meme_ops = [
+            UpdateOne({"_id": ObjectId(meme_id)}, {"$inc": incs})
+            for meme_id, incs in meme_incs.items() if any(incs.values())
+        ]
+        if meme_ops:
+            self.started_writing = True
+            await db.memes.bulk_write(meme_ops, ordered=True)
+
+        user_ops = []
+        for user_id, incs in self._user_incs.items():
+            user_ops.append(UpdateOne({"_id": ObjectId(user_id)}, {"$inc": incs}))
+        for (user_id, meme_id), (qty, cost) in self._portfolio_buys.items():
+            user_ops.append(UpdateOne({"_id": ObjectId(user_id)}, portfolio_buy_pipeline(meme_id, int(qty), cost)))
+        for (user_id, meme_id), (qty, fallback_price) in self._portfolio_returns.items():
+            user_ops.append(UpdateOne({"_id": ObjectId(user_id)}, portfolio_return_pipeline(meme_id, int(qty), fallback_price)))
+        self._user_incs, self._portfolio_buys, self._portfolio_returns = {}, {}, {}
+        if user_ops:
+            self.started_writing = True
+            await db.users.bulk_write(user_ops, ordered=True)
+
+        transactions, self._transactions = self._transactions, []
+        if transactions:
+            self.started_writing = True
+            await db.transactions.bulk_write(transactions, ordered=True)
+
+        # Fee lines are durable on the transactions above; treasury totals are buffered.
+        fees, fee_fills = self._fees, self._fee_fills
+        self._fees, self._fee_fills = {}, 0
+        if fees:
+            fee_accumulator.add(fees, fills=fee_fills)
+        # Everything is written; nothing left to compensate.
+        self._undo = []
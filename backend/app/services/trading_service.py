@@ -1,39 +1,46 @@
 from datetime import datetime
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Callable, Awaitable
 from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
 
 from app.core.config import settings
 from app.core.database import get_database
-from app.services.meme_service import get_meme_by_id, update_meme_price
-from app.services.meme_service import is_ipo_active, calculate_intrinsic_value, get_trading_band
+from app.services.meme_service import get_meme_by_id, update_meme_price, price_bookkeeping_stage
+from app.services.meme_service import engagement_price_pipeline
+from app.services.meme_service import is_ipo_active
+from app.services.band_cache import band_cache, STORED_BAND_FIELDS
+from app.services.response_cache import response_cache
+from app.services.market_index import market_index
+from app.services.orderbook import get_order_book, reload_order_book, RestingOrder
+from app.services.candle_service import record_tick
+from app.services.pagination import fetch_page, count_cache
+from app.services.settlement import Settlement, portfolio_sell_pipeline
 from app.models.transaction import (
     TransactionCreate, TransactionInDB, TransactionResponse,
-    TransactionType, TransactionStatus
+    TransactionType, TransactionStatus, TimeInForce
 )
 
 
+# Meme fields execute_trade and the helpers it hands the meme to use
+# (IPO state, trading band inputs and stored band, transaction docs, creator fee share).
+_TRADE_PROJECTION = {field: 1 for field in (
+    "name", "ticker", "creator_id", "current_price", "available_shares",
+    "ipo_price", "ipo_end_at", "ipo_shares_remaining",
+    "upvotes", "comments_count", "total_trades",
+) + STORED_BAND_FIELDS}
+
+
 def _is_legacy_market(meme: dict) -> bool:
     """Legacy market = system is always the counterparty (pre-IPO schema memes)."""
     return meme.get("ipo_end_at") is None or meme.get("ipo_shares_remaining") is None or meme.get("ipo_price") is None
 
 
-async def _set_meme_trade_price(
-    meme_id: str,
-    trade_price: float,
+def price_pressure_adjustment(
     quantity: int,
     supply_before: Optional[int] = None,
     supply_added: Optional[int] = None,
-) -> None:
-    """Set market price from last trade (secondary market) with demand/supply + engagement adjustments."""
-    db = get_database()
-    meme = await get_meme_by_id(meme_id)
-    if not meme:
-        raise ValueError("Meme not found")
-
-    old_price = float(meme.get("current_price", trade_price))
-
-    base_price = max(0.01, float(trade_price))
-
+) -> float:
+    """Demand/supply part of the post-IPO price adjustment; depends only on the trade."""
     # Demand vs supply: how much of the visible orderbook was consumed by this buy.
     demand_boost = 0.0
     if supply_before is not None and int(supply_before) > 0:
@@ -51,144 +58,221 @@ async def _set_meme_trade_price(
         else:
             supply_pressure = max(0.0, min(1.0, float(added) / float(before)))
 
-    # Engagement sentiment: likes/dislikes + small positive contribution from comments.
-    upvotes = float(meme.get("upvotes", 0) or 0)
-    downvotes = float(meme.get("downvotes", 0) or 0)
-    comments = float(meme.get("comments_count", 0) or 0)
-    denom = max(1.0, upvotes + downvotes + comments)
-    engagement_score = ((upvotes - downvotes) + (float(settings.POST_IPO_COMMENTS_WEIGHT) * comments)) / denom
-    engagement_score = max(-1.0, min(1.0, engagement_score))
-
-    adj = (
+    return (
         (float(settings.POST_IPO_DEMAND_FACTOR) * demand_boost)
         - (float(settings.POST_IPO_SUPPLY_FACTOR) * supply_pressure)
-        + (float(settings.POST_IPO_ENGAGEMENT_FACTOR) * engagement_score)
     )
-    new_price = max(0.01, round(base_price * (1.0 + adj), 4))
-    price_change = new_price - old_price
-    price_change_percent = (price_change / old_price * 100) if old_price > 0 else 0
 
-    price_history = meme.get("price_history", [])
-    price_history.append({"timestamp": datetime.utcnow().isoformat(), "price": new_price})
-    price_history = price_history[-100:]
 
-    await db.memes.update_one(
+def engagement_sentiment(upvotes: int, downvotes: int, comments: int) -> float:
+    """
+    Engagement sentiment in [-1, 1]: likes/dislikes + small positive contribution from comments.
+    Python twin of the expression in trade_price_pipeline (used by the offline replay).
+    """
+    denom = max(1.0, float(upvotes + downvotes + comments))
+    score = ((upvotes - downvotes) + (float(settings.POST_IPO_COMMENTS_WEIGHT) * comments)) / denom
+    return max(-1.0, min(1.0, score))
+
+
+def adjusted_trade_price(trade_price: float, pressure_adj: float, sentiment: float) -> float:
+    """Market price after a trade, as trade_price_pipeline computes it."""
+    adj = pressure_adj + float(settings.POST_IPO_ENGAGEMENT_FACTOR) * sentiment
+    return max(0.01, round(trade_price * (1.0 + adj), 4))
+
+
+def trade_price_pipeline(trade_price: float, pressure_adj: float, now: datetime, count_trade: bool = False) -> List[dict]:
+    """
+    Update pipeline that sets the market price from a trade price, adjusted by
+    `pressure_adj` (demand/supply, known to the caller) plus the meme's
+    engagement sentiment, which is read from its counters server-side.
+    With `count_trade`, the same write bumps total_trades (hype score).
+    """
+    upvotes = {"$ifNull": ["$upvotes", 0]}
+    downvotes = {"$ifNull": ["$downvotes", 0]}
+    comments = {"$ifNull": ["$comments_count", 0]}
+
+    # Engagement sentiment: likes/dislikes + small positive contribution from comments, clamped to [-1, 1].
+    engagement_score = {"$divide": [
+        {"$add": [{"$subtract": [upvotes, downvotes]}, {"$multiply": [float(settings.POST_IPO_COMMENTS_WEIGHT), comments]}]},
+        {"$max": [1.0, {"$add": [upvotes, downvotes, comments]}]},
+    ]}
+    engagement_score = {"$max": [-1.0, {"$min": [1.0, engagement_score]}]}
+
+    adj = {"$add": [pressure_adj, {"$multiply": [float(settings.POST_IPO_ENGAGEMENT_FACTOR), engagement_score]}]}
+    price_stage = {
+        "previous_price": {"$ifNull": ["$current_price", trade_price]},
+        "current_price": {"$max": [0.01, {"$round": [{"$multiply": [trade_price, {"$add": [1.0, adj]}]}, 4]}]},
+    }
+    if count_trade:
+        price_stage["total_trades"] = {"$add": [{"$ifNull": ["$total_trades", 0]}, 1]}
+    return [{"$set": price_stage}, price_bookkeeping_stage(now)]
+
+
+async def _set_meme_trade_price(
+    meme_id: str,
+    trade_price: float,
+    quantity: int,
+    settlement: Settlement,
+    supply_before: Optional[int] = None,
+    supply_added: Optional[int] = None,
+) -> None:
+    """
+    Set market price from last trade (secondary market) with demand/supply + engagement adjustments.
+    A trade that filled (`quantity` > 0) also counts towards total_trades in the same write.
+    One server-side round trip (trade_price_pipeline); `settlement` gets the undo for it.
+    """
+    db = get_database()
+    base_price = max(0.01, float(trade_price))
+    pressure_adj = price_pressure_adjustment(quantity, supply_before, supply_added)
+    count_trade = quantity > 0
+    meme = await db.memes.find_one_and_update(
         {"_id": ObjectId(meme_id)},
-        {
-            "$set": {
-                "previous_price": old_price,
-                "current_price": new_price,
-                "price_change_24h": float(meme.get("price_change_24h", 0.0)) + price_change,
-                "price_change_percent_24h": price_change_percent,
-                "all_time_high": max(float(meme.get("all_time_high", new_price)), new_price),
-                "all_time_low": min(float(meme.get("all_time_low", new_price)), new_price),
-                "market_cap": new_price * int(meme.get("total_shares", 0)),
-                "price_history": price_history,
-                "updated_at": datetime.utcnow(),
-            },
-            "$inc": {"volume_24h": int(quantity)},
-        }
+        trade_price_pipeline(base_price, pressure_adj, datetime.utcnow(), count_trade=count_trade),
+        projection={"current_price": 1, "previous_price": 1},
+        return_document=ReturnDocument.AFTER,
     )
+    if not meme:
+        raise ValueError("Meme not found")
+    undo = {"$set": {"current_price": float(meme.get("previous_price") or meme["current_price"])}}
+    if count_trade:
+        undo["$inc"] = {"total_trades": -1}
+    settlement.undo("memes", UpdateOne({"_id": ObjectId(meme_id)}, undo))
+    await _publish_price(meme_id, meme, quantity)
 
 
-async def _upsert_portfolio_buy(user_id: str, meme_id: str, buy_qty: int, price_per_share: float) -> None:
-    db = get_database()
-    user = await db.users.find_one({"_id": ObjectId(user_id)})
-    if not user:
-        raise ValueError("User not found")
+async def _publish_price(meme_id: str, meme: dict, quantity: int) -> None:
+    """After a price write: drop cached views, move the index and record the tick. `meme` holds the new prices."""
+    new_price = float(meme["current_price"])
+    old_price = float(meme.get("previous_price") or new_price)
 
-    portfolio = user.get("portfolio", [])
-    holding = next((p for p in portfolio if p["meme_id"] == meme_id), None)
-    total_cost = price_per_share * buy_qty
-
-    if holding:
-        new_qty = int(holding.get("quantity_owned", 0)) + buy_qty
-        prev_avg = float(holding.get("average_buy_price", 0))
-        prev_qty = int(holding.get("quantity_owned", 0))
-        new_avg = ((prev_avg * prev_qty) + (price_per_share * buy_qty)) / new_qty
-        new_investment = new_avg * new_qty
-        await db.users.update_one(
-            {"_id": ObjectId(user_id), "portfolio.meme_id": meme_id},
-            {
-                "$set": {
-                    "portfolio.$.quantity_owned": new_qty,
-                    "portfolio.$.average_buy_price": new_avg,
-                    "portfolio.$.total_investment_value": new_investment,
-                }
-            },
-        )
-    else:
-        await db.users.update_one(
-            {"_id": ObjectId(user_id)},
-            {
-                "$push": {
-                    "portfolio": {
-                        "meme_id": meme_id,
-                        "quantity_owned": buy_qty,
-                        "average_buy_price": price_per_share,
-                        "total_investment_value": total_cost,
-                    }
-                }
-            },
-        )
+    band_cache.invalidate(meme_id)
+    response_cache.invalidate_meme(meme_id)
+    market_index.on_price(meme_id, new_price)
+    await record_tick(meme_id, new_price, int(quantity), previous_price=old_price)
 
 
-async def _decrement_portfolio_for_sell(user_id: str, meme_id: str, sell_qty: int) -> None:
+async def _count_meme_trade(meme_id: str) -> None:
+    """Increment the meme's total trades (hype score for the dynamic band)."""
     db = get_database()
-    user = await db.users.find_one({"_id": ObjectId(user_id)})
-    if not user:
-        raise ValueError("User not found")
+    await db.memes.update_one(
+        {"_id": ObjectId(meme_id)},
+        {"$inc": {"total_trades": 1}}
+    )
+    band_cache.invalidate(meme_id)
 
-    portfolio = user.get("portfolio", [])
-    holding = next((p for p in portfolio if p["meme_id"] == meme_id), None)
-    if not holding or int(holding.get("quantity_owned", 0)) < sell_qty:
+
+async def _debit_wallet(user_id: str, amount: float) -> dict:
+    """
+    Take `amount` out of a user's wallet in one guarded round trip.
+    The filter only matches if wallet_balance >= amount, so the balance can never go negative.
+    Returns the user (wallet_balance, username) as it is after the debit.
+    """
+    db = get_database()
+    user = await db.users.find_one_and_update(
+        {"_id": ObjectId(user_id), "wallet_balance": {"$gte": amount}},
+        {"$inc": {"wallet_balance": -amount}},
+        projection={"wallet_balance": 1, "username": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if user is None:
+        # Failure path only: find out why the guard didn't match.
+        current = await db.users.find_one({"_id": ObjectId(user_id)}, {"wallet_balance": 1})
+        if not current:
+            raise ValueError("User not found")
+        have = float(current.get("wallet_balance", 0))
+        raise ValueError(f"Insufficient balance. Need ${amount:.2f}, have ${have:.2f}")
+    return user
+
+
+async def _decrement_portfolio_for_sell(user_id: str, meme_id: str, sell_qty: int, required: Optional[int] = None) -> dict:
+    """
+    Move `sell_qty` shares out of a user's holding in one guarded round trip
+    (the holding is dropped when it reaches zero). The guard checks that the
+    user owns at least `required` shares (default: `sell_qty`).
+    Returns the user (wallet_balance, username) as it is after the update.
+    """
+    db = get_database()
+    required = max(sell_qty, required or 0)
+    user = await db.users.find_one_and_update(
+        {
+            "_id": ObjectId(user_id),
+            "portfolio": {"$elemMatch": {"meme_id": meme_id, "quantity_owned": {"$gte": required}}},
+        },
+        portfolio_sell_pipeline(meme_id, sell_qty),
+        projection={"wallet_balance": 1, "username": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if user is None:
+        current = await db.users.find_one({"_id": ObjectId(user_id)}, {"portfolio": 1})
+        if not current:
+            raise ValueError("User not found")
+        holding = next((p for p in current.get("portfolio", []) if p["meme_id"] == meme_id), None)
         owned = int(holding.get("quantity_owned", 0)) if holding else 0
         raise ValueError(f"Not enough shares to sell. You own {owned} shares.")
+    return user
 
-    new_qty = int(holding.get("quantity_owned", 0)) - sell_qty
-    avg_buy = float(holding.get("average_buy_price", 0))
-    new_investment = avg_buy * new_qty
 
-    if new_qty == 0:
-        await db.users.update_one(
-            {"_id": ObjectId(user_id)},
-            {"$pull": {"portfolio": {"meme_id": meme_id}}},
-        )
-    else:
-        await db.users.update_one(
-            {"_id": ObjectId(user_id), "portfolio.meme_id": meme_id},
-            {
-                "$set": {
-                    "portfolio.$.quantity_owned": new_qty,
-                    "portfolio.$.total_investment_value": new_investment,
-                }
-            },
-        )
+def _cancelled_response(meme: dict, trade: TransactionCreate, price: float) -> TransactionResponse:
+    """Response for an IOC order that filled nothing. Not stored."""
+    tx_doc = _transaction_doc(
+        "", "", meme, trade.transaction_type,
+        int(trade.quantity), price, price * int(trade.quantity), TransactionStatus.CANCELLED,
+    )
+    return _transaction_response(tx_doc)
+
+
+async def _unfilled_order(user_id: str, meme: dict, trade: TransactionCreate, price: float) -> Tuple[TransactionResponse, float]:
+    """
+    IOC order that found nothing to match: nothing is escrowed or written.
+    One read to validate the user (and holding, for sells) and report the balance.
+    """
+    db = get_database()
+    user = await db.users.find_one({"_id": ObjectId(user_id)}, {"wallet_balance": 1, "portfolio": 1})
+    if not user:
+        raise ValueError("User not found")
+    if trade.transaction_type == TransactionType.SELL:
+        holding = next((p for p in user.get("portfolio", []) if p["meme_id"] == trade.meme_id), None)
+        owned = int(holding.get("quantity_owned", 0)) if holding else 0
+        if owned < trade.quantity:
+            raise ValueError(f"Not enough shares to sell. You own {owned} shares.")
+    return _cancelled_response(meme, trade, price), float(user.get("wallet_balance", 0))
 
 
 async def execute_trade(
     user_id: str,
-    username: str,
-    trade: TransactionCreate
+    username: Optional[str],
+    trade: TransactionCreate,
+    settlement: Optional[Settlement] = None,
 ) -> Tuple[TransactionResponse, float]:
     """
     Execute a buy or sell trade.
     Returns: (transaction, new_balance)
+
+    Not safe to run concurrently for the same meme; routes go through
+    matching_actor.submit_trade, which serializes calls per meme.
+
+    Post-IPO writes go through `settlement`. If one is passed in, the caller
+    owns it and must flush it (or roll it back, see execute_batch). Otherwise
+    the trade gets its own: flushed before returning, and rolled back (book
+    included) if anything but a rejection fails.
+
+    `username` may be None; it is then taken from the user document returned
+    by the first balance/holding update, so callers don't need to fetch the user.
     """
     db = get_database()
     
     # Get meme
-    meme = await get_meme_by_id(trade.meme_id)
+    meme = await get_meme_by_id(trade.meme_id, _TRADE_PROJECTION)
     if not meme:
         raise ValueError("Meme not found")
     
-    # Get user
-    user = await db.users.find_one({"_id": ObjectId(user_id)})
-    if not user:
-        raise ValueError("User not found")
-    
     # Legacy path keeps existing behavior for older memes in DB.
     if _is_legacy_market(meme):
+        user = await db.users.find_one({"_id": ObjectId(user_id)})
+        if not user:
+            raise ValueError("User not found")
+        username = username or user.get("username", "")
+
         current_price = meme["current_price"]
         total_cost = current_price * trade.quantity
 
@@ -252,10 +336,7 @@ async def execute_trade(
             await db.memes.update_one(
                 {"_id": ObjectId(trade.meme_id)},
                 {
-                    "$inc": {
-                        "available_shares": -trade.quantity,
-                        "volume_24h": trade.quantity
-                    }
+                    "$inc": {"available_shares": -trade.quantity}
                 }
             )
 
@@ -301,10 +382,7 @@ async def execute_trade(
             await db.memes.update_one(
                 {"_id": ObjectId(trade.meme_id)},
                 {
-                    "$inc": {
-                        "available_shares": trade.quantity,
-                        "volume_24h": trade.quantity
-                    }
+                    "$inc": {"available_shares": trade.quantity}
                 }
             )
 
@@ -336,10 +414,7 @@ async def execute_trade(
         )
         
         # Update meme's total trades count (for hype score / dynamic band)
-        await db.memes.update_one(
-            {"_id": ObjectId(trade.meme_id)},
-            {"$inc": {"total_trades": 1}}
-        )
+        await _count_meme_trade(trade.meme_id)
 
         return TransactionResponse(
             id=transaction["id"],
@@ -357,392 +432,438 @@ async def execute_trade(
     # New market:
     # - IPO window: buy from system at fixed IPO price (20% pool)
     # - Post-IPO: bid/ask orderbook (users list buy orders + sell orders)
+    if settlement is not None:
+        return await _execute_market_trade(user_id, username, meme, trade, settlement)
 
+    settlement = Settlement()
+    book = get_order_book(trade.meme_id)
+    book.checkpoint()
+    try:
+        try:
+            result = await _execute_market_trade(user_id, username, meme, trade, settlement)
+        except ValueError:
+            # Rejected: still flush, a rejected FOK records its refund here.
+            book.commit()
+            await settlement.flush()
+            raise
+        await settlement.flush()
+        book.commit()
+        return result
+    except ValueError:
+        raise
+    except Exception as e:
+        await _roll_back_trade(user_id, trade.meme_id, book, settlement, e)
+        raise
+
+
+async def _execute_market_trade(
+    user_id: str,
+    username: Optional[str],
+    meme: dict,
+    trade: TransactionCreate,
+    settlement: Settlement,
+) -> Tuple[TransactionResponse, float]:
     if trade.transaction_type == TransactionType.BUY:
         if is_ipo_active(meme):
-            ipo_price = float(meme["ipo_price"])
-            total_cost = ipo_price * trade.quantity
+            return await _execute_ipo_buy(user_id, username, meme, trade, settlement)
+        return await _execute_secondary_buy(user_id, username, meme, trade, settlement)
+    if is_ipo_active(meme):
+        raise ValueError("Selling is disabled during the initial offering window")
+    return await _execute_secondary_sell(user_id, username, meme, trade, settlement)
 
-            if user.get("wallet_balance", 0) < total_cost:
-                raise ValueError(f"Insufficient balance. Need ${total_cost:.2f}, have ${user.get('wallet_balance', 0):.2f}")
 
-            if int(meme.get("ipo_shares_remaining", 0)) < trade.quantity:
-                raise ValueError(f"Not enough IPO shares available. Only {int(meme.get('ipo_shares_remaining', 0))} left.")
+async def execute_batch(
+    meme_id: str,
+    steps: List[Tuple[str, Callable[[Settlement], Awaitable]]],
+) -> List[object]:
+    """
+    Run several orders on one meme against one Settlement and flush it once.
+    Each step is (user_id, order): the order (e.g. execute_trade or
+    cancel_open_order bound to its arguments) records its writes on the
+    settlement it is given.
+
+    Every step gets a checkpoint of the book and the settlement: a rejection
+    keeps what it recorded (a rejected FOK records its refund), any other
+    failure rolls back that step alone and the rest go on. Returns one
+    outcome per step, in order: its result or the exception it raised. If
+    the flush itself fails, every step that had succeeded gets that error.
+
+    Guarded debits and escrows are still checked against the database, so a
+    step does not see credits recorded by earlier steps until the flush.
+    Not safe to run concurrently for the same meme (see execute_trade).
+    """
+    settlement = Settlement()
+    book = get_order_book(meme_id)
+    outcomes: List[object] = []
+    for user_id, step in steps:
+        mark = settlement.checkpoint()
+        book.checkpoint()
+        try:
+            outcomes.append(await step(settlement))
+        except ValueError as e:
+            book.commit()
+            outcomes.append(e)
+        except Exception as e:
+            await _roll_back_trade(user_id, meme_id, book, settlement, e, mark)
+            outcomes.append(e)
+        else:
+            book.commit()
 
-            new_balance = float(user.get("wallet_balance", 0)) - total_cost
+    try:
+        await settlement.flush()
+    except Exception as e:
+        await _roll_back_flush(meme_id, settlement, e)
+        return [o if isinstance(o, Exception) else e for o in outcomes]
+    return outcomes
 
-            # Deduct buyer balance
-            await db.users.update_one(
-                {"_id": ObjectId(user_id)},
-                {"$set": {"wallet_balance": new_balance}},
-            )
 
-            # Credit creator with IPO proceeds (issuer revenue)
-            creator_id = meme.get("creator_id")
-            if creator_id:
-                try:
-                    await db.users.update_one(
-                        {"_id": ObjectId(str(creator_id))},
-                        {"$inc": {"wallet_balance": total_cost}},
-                    )
-                except Exception:
-                    pass
-
-            # Update buyer portfolio using IPO price
-            await _upsert_portfolio_buy(user_id, trade.meme_id, trade.quantity, ipo_price)
-
-            # Decrement IPO pool
-            await db.memes.update_one(
-                {"_id": ObjectId(trade.meme_id)},
-                {
-                    "$inc": {
-                        "ipo_shares_remaining": -trade.quantity,
-                        "available_shares": -trade.quantity,
-                        "volume_24h": trade.quantity,
-                        "total_trades": 1,  # Increment meme's trade count for hype score
-                    },
-                    "$set": {"updated_at": datetime.utcnow()},
-                },
-            )
+async def _roll_back_flush(meme_id: str, settlement: Settlement, error: Exception) -> None:
+    """
+    Undo a batch whose flush failed. The book already holds every step's
+    changes, so it is rebuilt from the `orders` journal either way.
+    """
+    if settlement.started_writing:
+        print(f"❌ Batch on {meme_id} failed part way through settlement, needs reconciling: {error}")
+    else:
+        try:
+            await settlement.rollback()
+        except Exception as e:
+            print(f"❌ Could not give back escrow for failed batch on {meme_id}: {e}")
+    await reload_order_book(meme_id)
 
-            # Apply rules to market price (even though fill price is fixed)
-            await update_meme_price(trade.meme_id, "buy", trade.quantity)
 
-            transaction_doc = {
-                "user_id": user_id,
-                "username": username,
-                "meme_id": trade.meme_id,
-                "meme_ticker": meme["ticker"],
-                "meme_name": meme["name"],
-                "transaction_type": TransactionType.BUY.value,
-                "quantity": trade.quantity,
-                "price_per_share": ipo_price,
-                "total_value": total_cost,
-                "status": TransactionStatus.COMPLETED.value,
-                "created_at": datetime.utcnow(),
-            }
-            result = await db.transactions.insert_one(transaction_doc)
-            transaction_id = str(result.inserted_id)
-
-            await db.users.update_one(
-                {"_id": ObjectId(user_id)},
-                {"$inc": {"total_trades": 1}},
-            )
+async def _roll_back_trade(
+    user_id: str,
+    meme_id: str,
+    book,
+    settlement: Settlement,
+    error: Exception,
+    checkpoint: Optional[tuple] = None,
+) -> None:
+    """
+    Undo a trade that failed for a reason other than a rejection. If nothing
+    was settled yet, the book goes back to its checkpoint and the guarded
+    debits/escrows are given back (those since `checkpoint`, if the
+    settlement is shared). If the flush had already written some of it, the
+    book is rebuilt from the `orders` journal and the failure is logged for
+    reconciliation.
+    """
+    if settlement.started_writing:
+        book.commit()
+        await reload_order_book(meme_id)
+        print(f"❌ Trade by {user_id} on {meme_id} failed part way through settlement, needs reconciling: {error}")
+        return
+    cancelled = book.rollback()
+    if cancelled:
+        print(f"⚠️ Orders cancelled during a rolled back trade on {meme_id} were not restored: {cancelled}")
+    try:
+        await settlement.rollback(checkpoint)
+    except Exception as e:
+        print(f"❌ Could not give back escrow for failed trade by {user_id} on {meme_id}: {e}")
 
-            return TransactionResponse(
-                id=transaction_id,
-                meme_ticker=transaction_doc["meme_ticker"],
-                meme_name=transaction_doc["meme_name"],
-                transaction_type=transaction_doc["transaction_type"],
-                quantity=transaction_doc["quantity"],
-                price_per_share=transaction_doc["price_per_share"],
-                total_value=transaction_doc["total_value"],
-                status=transaction_doc["status"],
-                created_at=transaction_doc["created_at"],
-            ), new_balance
-
-        # Secondary BUY: always create a buy order (bid) listing first, then match asks if available.
-        bid_price = float(trade.limit_price) if trade.limit_price is not None else float(meme.get("current_price", 0))
-        if bid_price <= 0:
-            raise ValueError("Max price must be greater than 0")
-
-        total_qty = int(trade.quantity)
-        if total_qty <= 0:
-            raise ValueError("Quantity must be positive")
-
-        # Trading band enforcement for Post-IPO buy orders
-        intrinsic = calculate_intrinsic_value(meme)
-        min_price, max_price = get_trading_band(meme)
-        hype_score = int(meme.get("total_trades", 0) or 0)
-        
-        if bid_price < min_price:
-            raise ValueError(f"Bid price ${bid_price:.2f} is below minimum ${min_price:.2f} (50% of intrinsic ${intrinsic:.2f})")
-        if bid_price > max_price:
-            raise ValueError(f"Bid price ${bid_price:.2f} exceeds max ${max_price:.2f} (intrinsic ${intrinsic:.2f} × {2.0 + hype_score * 0.05:.2f} hype multiplier)")
 
-        reserve_total = bid_price * total_qty
-        buyer_balance = float(user.get("wallet_balance", 0))
-        if buyer_balance < reserve_total:
-            raise ValueError(f"Insufficient balance. Need ${reserve_total:.2f}, have ${buyer_balance:.2f}")
+def split_fee(gross: float) -> Tuple[float, float, float, float, float]:
+    """Seller fee breakdown for a fill: (fee_total, fee_burn, fee_creator, fee_treasury, payout_net)."""
+    maker_fee_bps = int(getattr(settings, "MAKER_FEE_BPS", 0) or 0)
+    burn_share_bps = int(getattr(settings, "BURN_SHARE_BPS", 0) or 0)
+    creator_share_bps = int(getattr(settings, "CREATOR_FEE_SHARE_BPS", 0) or 0)
 
-        # Escrow full bid amount
-        await db.users.update_one(
-            {"_id": ObjectId(user_id)},
-            {"$set": {"wallet_balance": buyer_balance - reserve_total}},
-        )
+    fee_total = max(0.0, gross * maker_fee_bps / 10000.0)
+    fee_burn = max(0.0, fee_total * burn_share_bps / 10000.0)
+    fee_remaining = max(0.0, fee_total - fee_burn)
+    fee_creator = max(0.0, fee_remaining * creator_share_bps / 10000.0)
+    fee_treasury = max(0.0, fee_remaining - fee_creator)
+    payout_net = max(0.0, gross - fee_total)
+    return fee_total, fee_burn, fee_creator, fee_treasury, payout_net
 
-        # Create the buy order listing up-front (even if it ends up filling immediately)
-        buy_order_doc = {
-            "type": "buy",
-            "status": "open",
-            "meme_id": trade.meme_id,
-            "buyer_id": user_id,
-            "buyer_username": username,
-            "price": bid_price,
-            "quantity_total": total_qty,
-            "quantity_remaining": total_qty,
-            "reserved_total": reserve_total,
-            "reserved_remaining": reserve_total,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow(),
-        }
-        buy_order_res = await db.orders.insert_one(buy_order_doc)
-        buy_order_id = buy_order_res.inserted_id
-
-        # Orderbook supply snapshot (all asks)
-        orders_all = await db.orders.find(
-            {"meme_id": trade.meme_id, "type": "sell", "status": "open"}
-        ).sort([("price", 1), ("created_at", 1)]).to_list(length=500)
-        total_available = sum(int(o.get("quantity_remaining", 0)) for o in orders_all)
-
-        # Only match asks priced <= bid
-        orders = [o for o in orders_all if float(o.get("price", 0)) <= bid_price]
-
-        qty_needed = total_qty
-        fills = []  # (order, fill_qty)
-        running_cost = 0.0
-        last_trade_price = bid_price
-        for o in orders:
-            if qty_needed <= 0:
-                break
-            available = int(o.get("quantity_remaining", 0))
-            if available <= 0:
-                continue
-            take = min(available, qty_needed)
-            price = float(o.get("price", 0))
-            fills.append((o, take))
-            running_cost += price * take
-            last_trade_price = price
-            qty_needed -= take
-
-        filled_qty = total_qty - qty_needed
-
-        # Apply fills
-        if filled_qty > 0:
-            avg_fill_price = running_cost / filled_qty
-            await _upsert_portfolio_buy(user_id, trade.meme_id, filled_qty, avg_fill_price)
-
-            maker_fee_bps = int(getattr(settings, "MAKER_FEE_BPS", 0) or 0)
-            burn_share_bps = int(getattr(settings, "BURN_SHARE_BPS", 0) or 0)
-            creator_share_bps = int(getattr(settings, "CREATOR_FEE_SHARE_BPS", 0) or 0)
-
-            for (o, take) in fills:
-                seller_id = o.get("seller_id")
-                price = float(o.get("price", 0))
-                payout_gross = price * take
-
-                fee_total = max(0.0, payout_gross * maker_fee_bps / 10000.0)
-                fee_burn = max(0.0, fee_total * burn_share_bps / 10000.0)
-                fee_remaining = max(0.0, fee_total - fee_burn)
-                fee_creator = max(0.0, fee_remaining * creator_share_bps / 10000.0)
-                fee_treasury = max(0.0, fee_remaining - fee_creator)
-                payout_net = max(0.0, payout_gross - fee_total)
-
-                if seller_id:
-                    await db.users.update_one(
-                        {"_id": ObjectId(str(seller_id))},
-                        {"$inc": {"wallet_balance": payout_net}},
-                    )
-
-                if fee_total > 0:
-                    creator_id = meme.get("creator_id")
-                    if creator_id and fee_creator > 0:
-                        try:
-                            await db.users.update_one(
-                                {"_id": ObjectId(str(creator_id))},
-                                {"$inc": {"wallet_balance": fee_creator}},
-                            )
-                        except Exception:
-                            pass
-
-                    await db.treasury.update_one(
-                        {"_id": settings.TREASURY_DOC_ID},
-                        {
-                            "$inc": {
-                                "total_fees": fee_total,
-                                "burned_fees": fee_burn,
-                                "creator_fees": fee_creator,
-                                "treasury_fees": fee_treasury,
-                            },
-                            "$set": {"updated_at": datetime.utcnow()},
-                            "$setOnInsert": {"created_at": datetime.utcnow()},
-                        },
-                        upsert=True,
-                    )
-
-                await db.orders.update_one(
-                    {"_id": o["_id"]},
-                    {"$inc": {"quantity_remaining": -take}, "$set": {"updated_at": datetime.utcnow()}},
-                )
-                if int(o.get("quantity_remaining", 0)) - take <= 0:
-                    await db.orders.update_one(
-                        {"_id": o["_id"]},
-                        {"$set": {"status": "filled", "updated_at": datetime.utcnow()}},
-                    )
-
-                # Buyer refund: bid - execution
-                refund = max(0.0, (bid_price - price) * take)
-                if refund > 0:
-                    await db.users.update_one(
-                        {"_id": ObjectId(user_id)},
-                        {"$inc": {"wallet_balance": refund}},
-                    )
-
-                # Decrement our buy order remaining/reserved by the reserved amount for the filled shares
-                await db.orders.update_one(
-                    {"_id": buy_order_id},
-                    {
-                        "$inc": {
-                            "quantity_remaining": -take,
-                            "reserved_remaining": -(bid_price * take),
-                        },
-                        "$set": {"updated_at": datetime.utcnow()},
-                    },
-                )
 
-                # Record seller-side completed transaction
-                if seller_id:
-                    await db.transactions.insert_one(
-                        {
-                            "user_id": str(seller_id),
-                            "username": o.get("seller_username", ""),
-                            "meme_id": trade.meme_id,
-                            "meme_ticker": meme["ticker"],
-                            "meme_name": meme["name"],
-                            "transaction_type": TransactionType.SELL.value,
-                            "quantity": take,
-                            "price_per_share": price,
-                            "total_value": payout_net,
-                            "gross_value": payout_gross,
-                            "fee_paid": fee_total,
-                            "fee_burned": fee_burn,
-                            "fee_to_creator": fee_creator,
-                            "fee_to_treasury": fee_treasury,
-                            "status": TransactionStatus.COMPLETED.value,
-                            "created_at": datetime.utcnow(),
-                        }
-                    )
+def _transaction_doc(
+    user_id: str,
+    username: str,
+    meme: dict,
+    transaction_type: TransactionType,
+    quantity: int,
+    price_per_share: float,
+    total_value: float,
+    status: TransactionStatus,
+    **extra,
+) -> dict:
+    doc = {
+        "_id": ObjectId(),
+        "user_id": user_id,
+        "username": username,
+        "meme_id": meme["id"],
+        "meme_ticker": meme["ticker"],
+        "meme_name": meme["name"],
+        "transaction_type": transaction_type.value,
+        "quantity": quantity,
+        "price_per_share": price_per_share,
+        "total_value": total_value,
+        "status": status.value,
+        "created_at": datetime.utcnow(),
+    }
+    doc.update(extra)
+    return doc
 
-            await _set_meme_trade_price(trade.meme_id, last_trade_price, filled_qty, supply_before=total_available)
-            
-            # Increment meme's total trades for hype score
-            await db.memes.update_one(
-                {"_id": ObjectId(trade.meme_id)},
-                {"$inc": {"total_trades": 1}}
-            )
 
-            buyer_tx = {
-                "user_id": user_id,
-                "username": username,
-                "meme_id": trade.meme_id,
-                "meme_ticker": meme["ticker"],
-                "meme_name": meme["name"],
-                "transaction_type": TransactionType.BUY.value,
-                "quantity": filled_qty,
-                "price_per_share": avg_fill_price,
-                "total_value": running_cost,
-                "status": TransactionStatus.COMPLETED.value,
-                "created_at": datetime.utcnow(),
-            }
-            buyer_res = await db.transactions.insert_one(buyer_tx)
-            completed_tx_id = str(buyer_res.inserted_id)
-        else:
-            completed_tx_id = None
-
-        # Remaining qty stays open on the original buy order
-        remaining_qty = qty_needed
-        if remaining_qty > 0:
-            # Ensure reserved_remaining matches remaining quantity at the bid price
-            await db.orders.update_one(
-                {"_id": buy_order_id},
-                {
-                    "$set": {
-                        "quantity_remaining": remaining_qty,
-                        "reserved_remaining": bid_price * remaining_qty,
-                        "updated_at": datetime.utcnow(),
-                    }
-                },
-            )
+def _transaction_response(tx_doc: dict) -> TransactionResponse:
+    return TransactionResponse(
+        id=str(tx_doc["_id"]),
+        meme_ticker=tx_doc["meme_ticker"],
+        meme_name=tx_doc["meme_name"],
+        transaction_type=tx_doc["transaction_type"],
+        quantity=tx_doc["quantity"],
+        price_per_share=tx_doc["price_per_share"],
+        total_value=tx_doc["total_value"],
+        status=tx_doc["status"],
+        created_at=tx_doc["created_at"],
+    )
+
+
+def ipo_fill_pipeline(quantity: int, now: datetime) -> List[dict]:
+    """
+    Update pipeline for an IPO fill: take `quantity` from the pool, count the
+    trade (hype score) and reprice to the engagement formula, as
+    update_meme_price does for IPO buys (the fill price itself is fixed).
+    """
+    return [
+        {"$set": {
+            "ipo_shares_remaining": {"$subtract": ["$ipo_shares_remaining", quantity]},
+            "available_shares": {"$subtract": [{"$ifNull": ["$available_shares", 0]}, quantity]},
+            "total_trades": {"$add": [{"$ifNull": ["$total_trades", 0]}, 1]},
+        }},
+        *engagement_price_pipeline(now),
+    ]
 
-            tx_doc = {
-                "user_id": user_id,
-                "username": username,
-                "meme_id": trade.meme_id,
-                "meme_ticker": meme["ticker"],
-                "meme_name": meme["name"],
-                "transaction_type": TransactionType.BUY.value,
-                "quantity": remaining_qty,
-                "price_per_share": bid_price,
-                "total_value": bid_price * remaining_qty,
-                "status": TransactionStatus.PENDING.value,
-                "created_at": datetime.utcnow(),
-            }
-            tx_res = await db.transactions.insert_one(tx_doc)
-
-            new_user = await db.users.find_one({"_id": ObjectId(user_id)})
-            new_balance = float(new_user.get("wallet_balance", 0)) if new_user else 0.0
-
-            await db.users.update_one(
-                {"_id": ObjectId(user_id)},
-                {"$inc": {"total_trades": 1}},
-            )
 
-            return TransactionResponse(
-                id=str(tx_res.inserted_id),
-                meme_ticker=tx_doc["meme_ticker"],
-                meme_name=tx_doc["meme_name"],
-                transaction_type=tx_doc["transaction_type"],
-                quantity=tx_doc["quantity"],
-                price_per_share=tx_doc["price_per_share"],
-                total_value=tx_doc["total_value"],
-                status=tx_doc["status"],
-                created_at=tx_doc["created_at"],
-            ), new_balance
-
-        # Fully filled: mark buy order filled (so a listing record still exists)
-        await db.orders.update_one(
-            {"_id": buy_order_id},
-            {"$set": {"status": "filled", "quantity_remaining": 0, "reserved_remaining": 0.0, "updated_at": datetime.utcnow()}},
+async def _execute_ipo_buy(
+    user_id: str,
+    username: Optional[str],
+    meme: dict,
+    trade: TransactionCreate,
+    settlement: Settlement,
+) -> Tuple[TransactionResponse, float]:
+    """Buy from the system's IPO pool at the fixed IPO price."""
+    db = get_database()
+    ipo_price = float(meme["ipo_price"])
+    total_cost = ipo_price * trade.quantity
+
+    if int(meme.get("ipo_shares_remaining", 0)) < trade.quantity:
+        raise ValueError(f"Not enough IPO shares available. Only {int(meme.get('ipo_shares_remaining', 0))} left.")
+
+    # Deduct buyer balance
+    buyer = await _debit_wallet(user_id, total_cost)
+    settlement.refund_on_rollback(user_id, total_cost)
+    username = username or buyer.get("username", "")
+
+    # Take the shares from the IPO pool and reprice in one guarded round trip
+    # (immediately: the next order on this meme reads the pool).
+    now = datetime.utcnow()
+    repriced = await db.memes.find_one_and_update(
+        {"_id": ObjectId(trade.meme_id), "ipo_end_at": {"$gt": now}, "ipo_shares_remaining": {"$gte": trade.quantity}},
+        ipo_fill_pipeline(trade.quantity, now),
+        projection={"current_price": 1, "previous_price": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if repriced is None:
+        # The pool ran out (or the window closed) since the meme was read.
+        settlement.credit(user_id, total_cost)
+        raise ValueError("Not enough IPO shares available.")
+    settlement.undo("memes", UpdateOne(
+        {"_id": ObjectId(trade.meme_id)},
+        {"$inc": {"ipo_shares_remaining": trade.quantity, "available_shares": trade.quantity, "total_trades": -1}},
+    ))
+    await _publish_price(trade.meme_id, repriced, trade.quantity)
+
+    # Credit creator with IPO proceeds (issuer revenue), give the buyer the shares
+    settlement.credit(meme.get("creator_id"), total_cost)
+    settlement.buy_shares(user_id, trade.meme_id, trade.quantity, ipo_price)
+
+    tx_doc = _transaction_doc(
+        user_id, username, meme, TransactionType.BUY,
+        trade.quantity, ipo_price, total_cost, TransactionStatus.COMPLETED,
+    )
+    settlement.insert_transaction(tx_doc)
+    settlement.inc_user(user_id, "total_trades", 1)
+
+    return _transaction_response(tx_doc), float(buyer["wallet_balance"]) + settlement.pending_credit(user_id)
+
+
+async def _execute_secondary_buy(
+    user_id: str,
+    username: Optional[str],
+    meme: dict,
+    trade: TransactionCreate,
+    settlement: Settlement,
+) -> Tuple[TransactionResponse, float]:
+    """
+    Post-IPO BUY: escrow the bid, match asks in the book, rest any remainder as a buy order.
+    IOC/FOK orders only escrow what the book can fill and never write a buy order.
+    """
+
+    bid_price = float(trade.limit_price) if trade.limit_price is not None else float(meme.get("current_price", 0))
+    if bid_price <= 0:
+        raise ValueError("Max price must be greater than 0")
+
+    total_qty = int(trade.quantity)
+    if total_qty <= 0:
+        raise ValueError("Quantity must be positive")
+
+    # Trading band enforcement for Post-IPO buy orders
+    intrinsic, min_price, max_price = band_cache.band_for(meme)
+    hype_score = int(meme.get("total_trades", 0) or 0)
+
+    if bid_price < min_price:
+        raise ValueError(f"Bid price ${bid_price:.2f} is below minimum ${min_price:.2f} (50% of intrinsic ${intrinsic:.2f})")
+    if bid_price > max_price:
+        raise ValueError(f"Bid price ${bid_price:.2f} exceeds max ${max_price:.2f} (intrinsic ${intrinsic:.2f} × {2.0 + hype_score * 0.05:.2f} hype multiplier)")
+
+    book = get_order_book(trade.meme_id)
+    tif = trade.time_in_force
+    escrow_qty = total_qty
+    if tif != TimeInForce.GTC:
+        escrow_qty = book.fillable("buy", bid_price, total_qty)
+        if tif == TimeInForce.FOK and escrow_qty < total_qty:
+            raise ValueError(f"Fill-or-kill order cannot be filled: only {escrow_qty} shares available at ${bid_price:.2f} or better")
+        if escrow_qty == 0:
+            return await _unfilled_order(user_id, meme, trade, bid_price)
+
+    # Escrow the bid amount
+    reserve_total = bid_price * escrow_qty
+    buyer = await _debit_wallet(user_id, reserve_total)
+    settlement.refund_on_rollback(user_id, reserve_total)
+    username = username or buyer.get("username", "")
+
+    # The book may have changed while we awaited the escrow; FOK re-checks before matching.
+    if tif == TimeInForce.FOK and book.fillable("buy", bid_price, total_qty) < total_qty:
+        settlement.credit(user_id, reserve_total)
+        raise ValueError("Fill-or-kill order cannot be filled: liquidity changed")
+
+    # Match against resting asks priced <= bid in the in-memory book.
+    # No awaits between the supply snapshot and the match, so the book can't shift underneath us.
+    total_available = book.open_quantity("sell")
+    fills = [(o, take, o.quantity_remaining) for (o, take) in book.match("buy", bid_price, escrow_qty)]
+
+    running_cost = sum(o.price * take for (o, take, _) in fills)
+    last_trade_price = fills[-1][0].price if fills else bid_price
+    filled_qty = sum(take for (_, take, _) in fills)
+    remaining_qty = total_qty - filled_qty
+
+    if tif != TimeInForce.GTC:
+        # Nothing rests: release escrow for anything that didn't fill.
+        settlement.credit(user_id, bid_price * (escrow_qty - filled_qty))
+        remaining_qty = 0
+
+    # Journal the buy order listing (even if it filled immediately), then rest any remainder.
+    now = datetime.utcnow()
+    buy_order_doc = {
+        "_id": ObjectId(),
+        "type": "buy",
+        "status": "open" if remaining_qty > 0 else "filled",
+        "meme_id": trade.meme_id,
+        "buyer_id": user_id,
+        "buyer_username": username,
+        "price": bid_price,
+        "quantity_total": total_qty,
+        "quantity_remaining": remaining_qty,
+        "reserved_total": reserve_total,
+        "reserved_remaining": bid_price * remaining_qty,
+        "created_at": now,
+        "updated_at": now,
+    }
+    if tif == TimeInForce.GTC:
+        settlement.insert_order(buy_order_doc)
+    if remaining_qty > 0:
+        book.add(RestingOrder.from_doc(buy_order_doc))
+    settlement.inc_meme(trade.meme_id, "open_buy_qty", remaining_qty)
+    settlement.inc_meme(trade.meme_id, "open_sell_qty", -filled_qty)
+
+    completed_tx = None
+    if filled_qty > 0:
+        avg_fill_price = running_cost / filled_qty
+        settlement.buy_shares(user_id, trade.meme_id, filled_qty, avg_fill_price)
+
+        for (o, take, remaining_after) in fills:
+            price = o.price
+            payout_gross = price * take
+            fee_total, fee_burn, fee_creator, fee_treasury, payout_net = split_fee(payout_gross)
+
+            settlement.credit(o.owner_id, payout_net)
+            if fee_total > 0:
+                settlement.credit(meme.get("creator_id"), fee_creator)
+                settlement.add_fees(fee_total, fee_burn, fee_creator, fee_treasury)
+
+            settlement.fill_order(o.order_id, take, filled=remaining_after <= 0)
+
+            # Buyer refund: bid - execution
+            refund = max(0.0, (bid_price - price) * take)
+            settlement.credit(user_id, refund)
+
+            # Record seller-side completed transaction
+            if o.owner_id:
+                settlement.insert_transaction(_transaction_doc(
+                    o.owner_id, o.owner_username, meme, TransactionType.SELL,
+                    take, price, payout_net, TransactionStatus.COMPLETED,
+                    gross_value=payout_gross,
+                    fee_paid=fee_total,
+                    fee_burned=fee_burn,
+                    fee_to_creator=fee_creator,
+                    fee_to_treasury=fee_treasury,
+                ))
+
+        # Reprices and counts the trade for the hype score
+        await _set_meme_trade_price(trade.meme_id, last_trade_price, filled_qty, settlement, supply_before=total_available)
+
+        completed_tx = _transaction_doc(
+            user_id, username, meme, TransactionType.BUY,
+            filled_qty, avg_fill_price, running_cost, TransactionStatus.COMPLETED,
         )
+        settlement.insert_transaction(completed_tx)
 
-        new_user = await db.users.find_one({"_id": ObjectId(user_id)})
-        new_balance = float(new_user.get("wallet_balance", 0)) if new_user else 0.0
+    settlement.inc_user(user_id, "total_trades", 1)
+    new_balance = float(buyer["wallet_balance"]) + settlement.pending_credit(user_id)
 
-        await db.users.update_one(
-            {"_id": ObjectId(user_id)},
-            {"$inc": {"total_trades": 1}},
+    # Remaining qty stays open on the buy order
+    if remaining_qty > 0:
+        tx_doc = _transaction_doc(
+            user_id, username, meme, TransactionType.BUY,
+            remaining_qty, bid_price, bid_price * remaining_qty, TransactionStatus.PENDING,
         )
+        settlement.insert_transaction(tx_doc)
+        return _transaction_response(tx_doc), new_balance
 
-        return TransactionResponse(
-            id=completed_tx_id or str(ObjectId()),
-            meme_ticker=meme["ticker"],
-            meme_name=meme["name"],
-            transaction_type=TransactionType.BUY.value,
-            quantity=filled_qty,
-            price_per_share=(running_cost / filled_qty) if filled_qty > 0 else bid_price,
-            total_value=running_cost,
-            status=TransactionStatus.COMPLETED.value,
-            created_at=datetime.utcnow(),
-        ), new_balance
+    if completed_tx is None:
+        # IOC whose liquidity vanished while escrowing; the escrow is already released.
+        return _cancelled_response(meme, trade, bid_price), new_balance
+
+    # Fully filled: GTC orders were journaled as "filled" (so a listing record still exists)
+    return _transaction_response(completed_tx), new_balance
 
-    # SELL
-    if is_ipo_active(meme):
-        raise ValueError("Selling is disabled during the initial offering window")
 
-    # Post-IPO SELL: always create a sell order listing first, then match against highest bids.
+async def _execute_secondary_sell(
+    user_id: str,
+    username: Optional[str],
+    meme: dict,
+    trade: TransactionCreate,
+    settlement: Settlement,
+) -> Tuple[TransactionResponse, float]:
+    """
+    Post-IPO SELL: escrow the shares, match bids in the book, rest any remainder as a sell order.
+    IOC/FOK orders only escrow what the book can fill and never write a sell order.
+    """
+
     sell_qty = int(trade.quantity)
     if sell_qty <= 0:
         raise ValueError("Quantity must be positive")
 
     # Trading band enforcement for Post-IPO listings
-    intrinsic = calculate_intrinsic_value(meme)
-    min_price, max_price = get_trading_band(meme)
-    
+    intrinsic, min_price, max_price = band_cache.band_for(meme)
+
     default_price = float(meme.get("current_price", 0))
     list_price = float(trade.limit_price) if trade.limit_price is not None else default_price
     if list_price <= 0:
         raise ValueError("Listing price must be greater than 0")
-    
+
     # Enforce trading band: price must be within dynamic band
     # min = 0.5 * intrinsic, max = intrinsic * (2.0 + hype_score * 0.05)
     hype_score = int(meme.get("total_trades", 0) or 0)
@@ -751,310 +872,170 @@ async def execute_trade(
     if list_price > max_price:
         raise ValueError(f"Listing price ${list_price:.2f} exceeds max ${max_price:.2f} (intrinsic ${intrinsic:.2f} × {2.0 + hype_score * 0.05:.2f} hype multiplier)")
 
-    # Supply snapshot before listing (used to soften price when supply increases).
-    supply_before = 0
-    try:
-        pipeline = [
-            {"$match": {"meme_id": trade.meme_id, "type": "sell", "status": "open"}},
-            {"$group": {"_id": None, "total": {"$sum": "$quantity_remaining"}}},
-        ]
-        rows = await db.orders.aggregate(pipeline).to_list(length=1)
-        if rows:
-            supply_before = int(rows[0].get("total", 0) or 0)
-    except Exception:
-        supply_before = 0
-
-    # Move shares into escrow by decrementing seller portfolio now.
-    await _decrement_portfolio_for_sell(user_id, trade.meme_id, sell_qty)
-
-    # Create the sell order listing up-front (even if it ends up filling immediately)
+    book = get_order_book(trade.meme_id)
+    tif = trade.time_in_force
+    escrow_qty = sell_qty
+    if tif != TimeInForce.GTC:
+        escrow_qty = book.fillable("sell", list_price, sell_qty)
+        if tif == TimeInForce.FOK and escrow_qty < sell_qty:
+            raise ValueError(f"Fill-or-kill order cannot be filled: only {escrow_qty} shares wanted at ${list_price:.2f} or better")
+        if escrow_qty == 0:
+            return await _unfilled_order(user_id, meme, trade, list_price)
+
+    # Move shares into escrow by decrementing seller portfolio now (the user must own the full quantity).
+    seller = await _decrement_portfolio_for_sell(user_id, trade.meme_id, escrow_qty, required=sell_qty)
+    settlement.return_shares_on_rollback(user_id, trade.meme_id, escrow_qty, default_price)
+    username = username or seller.get("username", "")
+
+    # The book may have changed while we awaited the escrow; FOK re-checks before matching.
+    if tif == TimeInForce.FOK and book.fillable("sell", list_price, sell_qty) < sell_qty:
+        settlement.return_shares(user_id, trade.meme_id, escrow_qty, default_price)
+        raise ValueError("Fill-or-kill order cannot be filled: liquidity changed")
+
+    # Supply snapshot before listing (used to soften price when supply increases),
+    # then match against resting bids priced >= ask in the in-memory book.
+    supply_before = book.open_quantity("sell")
+    fills = [(b, take, b.quantity_remaining) for (b, take) in book.match("sell", list_price, escrow_qty)]
+    matched_qty = sum(take for (_, take, _) in fills)
+    listed_qty = sell_qty - matched_qty
+
+    if tif != TimeInForce.GTC:
+        # Nothing rests: hand back escrowed shares that didn't fill.
+        settlement.return_shares(user_id, trade.meme_id, escrow_qty - matched_qty, default_price)
+        listed_qty = 0
+
+    # Journal the sell order listing (even if it filled immediately), then rest any remainder.
+    now = datetime.utcnow()
     sell_order_doc = {
+        "_id": ObjectId(),
         "type": "sell",
-        "status": "open",
+        "status": "open" if listed_qty > 0 else "filled",
         "meme_id": trade.meme_id,
         "seller_id": user_id,
         "seller_username": username,
         "price": list_price,
         "quantity_total": sell_qty,
-        "quantity_remaining": sell_qty,
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow(),
+        "quantity_remaining": listed_qty,
+        "created_at": now,
+        "updated_at": now,
     }
-    sell_order_res = await db.orders.insert_one(sell_order_doc)
-    sell_order_id = sell_order_res.inserted_id
-
-    bids = await db.orders.find(
-        {"meme_id": trade.meme_id, "type": "buy", "status": "open", "price": {"$gte": list_price}}
-    ).sort([("price", -1), ("created_at", 1)]).to_list(length=500)
+    if tif == TimeInForce.GTC:
+        settlement.insert_order(sell_order_doc)
+    if listed_qty > 0:
+        book.add(RestingOrder.from_doc(sell_order_doc))
+    settlement.inc_meme(trade.meme_id, "open_sell_qty", listed_qty)
+    settlement.inc_meme(trade.meme_id, "open_buy_qty", -matched_qty)
 
-    qty_left = sell_qty
     filled_qty = 0
     proceeds_gross = 0.0
     proceeds_net_total = 0.0
+    fees_paid = {"fee_paid": 0.0, "fee_burned": 0.0, "fee_to_creator": 0.0, "fee_to_treasury": 0.0}
     last_trade_price = list_price
 
-    maker_fee_bps = int(getattr(settings, "MAKER_FEE_BPS", 0) or 0)
-    burn_share_bps = int(getattr(settings, "BURN_SHARE_BPS", 0) or 0)
-    creator_share_bps = int(getattr(settings, "CREATOR_FEE_SHARE_BPS", 0) or 0)
-
-    for b in bids:
-        if qty_left <= 0:
-            break
-        available = int(b.get("quantity_remaining", 0))
-        if available <= 0:
-            continue
-        take = min(available, qty_left)
-        price = float(b.get("price", 0))
-        if price <= 0:
-            continue
-
+    for (b, take, remaining_after) in fills:
+        price = b.price
         trade_value = price * take
         proceeds_gross += trade_value
         filled_qty += take
-        qty_left -= take
         last_trade_price = price
 
-        fee_total = max(0.0, trade_value * maker_fee_bps / 10000.0)
-        fee_burn = max(0.0, fee_total * burn_share_bps / 10000.0)
-        fee_remaining = max(0.0, fee_total - fee_burn)
-        fee_creator = max(0.0, fee_remaining * creator_share_bps / 10000.0)
-        fee_treasury = max(0.0, fee_remaining - fee_creator)
-        payout_net = max(0.0, trade_value - fee_total)
+        fee_total, fee_burn, fee_creator, fee_treasury, payout_net = split_fee(trade_value)
         proceeds_net_total += payout_net
+        fees_paid["fee_paid"] += fee_total
+        fees_paid["fee_burned"] += fee_burn
+        fees_paid["fee_to_creator"] += fee_creator
+        fees_paid["fee_to_treasury"] += fee_treasury
 
         # Credit seller
-        await db.users.update_one(
-            {"_id": ObjectId(user_id)},
-            {"$inc": {"wallet_balance": payout_net}},
-        )
+        settlement.credit(user_id, payout_net)
 
         if fee_total > 0:
-            creator_id = meme.get("creator_id")
-            if creator_id and fee_creator > 0:
-                try:
-                    await db.users.update_one(
-                        {"_id": ObjectId(str(creator_id))},
-                        {"$inc": {"wallet_balance": fee_creator}},
-                    )
-                except Exception:
-                    pass
-            await db.treasury.update_one(
-                {"_id": settings.TREASURY_DOC_ID},
-                {
-                    "$inc": {
-                        "total_fees": fee_total,
-                        "burned_fees": fee_burn,
-                        "creator_fees": fee_creator,
-                        "treasury_fees": fee_treasury,
-                    },
-                    "$set": {"updated_at": datetime.utcnow()},
-                    "$setOnInsert": {"created_at": datetime.utcnow()},
-                },
-                upsert=True,
-            )
+            settlement.credit(meme.get("creator_id"), fee_creator)
+            settlement.add_fees(fee_total, fee_burn, fee_creator, fee_treasury)
 
         # Update buy order (reduce quantity and reserved)
-        await db.orders.update_one(
-            {"_id": b["_id"]},
-            {
-                "$inc": {
-                    "quantity_remaining": -take,
-                    "reserved_remaining": -(price * take),
-                },
-                "$set": {"updated_at": datetime.utcnow()},
-            },
-        )
-        if int(b.get("quantity_remaining", 0)) - take <= 0:
-            await db.orders.update_one(
-                {"_id": b["_id"]},
-                {"$set": {"status": "filled", "updated_at": datetime.utcnow()}},
-            )
+        settlement.fill_order(b.order_id, take, reserved=price * take, filled=remaining_after <= 0)
 
-        buyer_id = b.get("buyer_id")
-        buyer_username = b.get("buyer_username", "")
-        if buyer_id:
-            await _upsert_portfolio_buy(str(buyer_id), trade.meme_id, take, price)
-            await db.transactions.insert_one(
-                {
-                    "user_id": str(buyer_id),
-                    "username": buyer_username,
-                    "meme_id": trade.meme_id,
-                    "meme_ticker": meme["ticker"],
-                    "meme_name": meme["name"],
-                    "transaction_type": TransactionType.BUY.value,
-                    "quantity": take,
-                    "price_per_share": price,
-                    "total_value": trade_value,
-                    "status": TransactionStatus.COMPLETED.value,
-                    "created_at": datetime.utcnow(),
-                }
-            )
-
-        # Decrement our sell order remaining
-        await db.orders.update_one(
-            {"_id": sell_order_id},
-            {"$inc": {"quantity_remaining": -take}, "$set": {"updated_at": datetime.utcnow()}},
-        )
+        if b.owner_id:
+            settlement.buy_shares(b.owner_id, trade.meme_id, take, price)
+            settlement.insert_transaction(_transaction_doc(
+                b.owner_id, b.owner_username, meme, TransactionType.BUY,
+                take, price, trade_value, TransactionStatus.COMPLETED,
+            ))
 
+    seller_tx = None
     if filled_qty > 0:
-        await _set_meme_trade_price(trade.meme_id, last_trade_price, filled_qty)
-        
-        # Increment meme's total trades for hype score
-        await db.memes.update_one(
-            {"_id": ObjectId(trade.meme_id)},
-            {"$inc": {"total_trades": 1}}
+        # Reprices and counts the trade for the hype score
+        await _set_meme_trade_price(trade.meme_id, last_trade_price, filled_qty, settlement)
+
+        # Completed leg with its fee breakdown, even if the rest stays listed
+        seller_tx = _transaction_doc(
+            user_id, username, meme, TransactionType.SELL,
+            filled_qty, proceeds_gross / filled_qty, proceeds_net_total, TransactionStatus.COMPLETED,
+            gross_value=proceeds_gross,
+            **fees_paid,
         )
+        settlement.insert_transaction(seller_tx)
 
-    listed_qty = qty_left
-    if listed_qty > 0:
-        # Keep the existing sell order open with remaining quantity
-        await db.orders.update_one(
-            {"_id": sell_order_id},
-            {"$set": {"quantity_remaining": listed_qty, "updated_at": datetime.utcnow()}},
-        )
+    settlement.inc_user(user_id, "total_trades", 1)
+    new_balance = float(seller["wallet_balance"]) + settlement.pending_credit(user_id)
 
+    if listed_qty > 0:
         # Apply supply-side price pressure only for newly listed remainder.
-        try:
-            await _set_meme_trade_price(
-                trade.meme_id,
-                float(meme.get("current_price", 0.01)),
-                0,
-                supply_before=supply_before,
-                supply_added=listed_qty,
-            )
-        except Exception:
-            pass
-
-        tx_doc = {
-            "user_id": user_id,
-            "username": username,
-            "meme_id": trade.meme_id,
-            "meme_ticker": meme["ticker"],
-            "meme_name": meme["name"],
-            "transaction_type": TransactionType.SELL.value,
-            "quantity": listed_qty,
-            "price_per_share": list_price,
-            "total_value": list_price * listed_qty,
-            "status": TransactionStatus.PENDING.value,
-            "created_at": datetime.utcnow(),
-        }
-        tx_res = await db.transactions.insert_one(tx_doc)
-
-        new_user = await db.users.find_one({"_id": ObjectId(user_id)})
-        new_balance = float(new_user.get("wallet_balance", 0)) if new_user else float(user.get("wallet_balance", 0))
-
-        await db.users.update_one(
-            {"_id": ObjectId(user_id)},
-            {"$inc": {"total_trades": 1}},
+        await _set_meme_trade_price(
+            trade.meme_id,
+            float(meme.get("current_price", 0.01)),
+            0,
+            settlement,
+            supply_before=supply_before,
+            supply_added=listed_qty,
         )
 
-        return TransactionResponse(
-            id=str(tx_res.inserted_id),
-            meme_ticker=tx_doc["meme_ticker"],
-            meme_name=tx_doc["meme_name"],
-            transaction_type=tx_doc["transaction_type"],
-            quantity=tx_doc["quantity"],
-            price_per_share=tx_doc["price_per_share"],
-            total_value=tx_doc["total_value"],
-            status=tx_doc["status"],
-            created_at=tx_doc["created_at"],
-        ), new_balance
-
-    # Fully filled immediately
-    if filled_qty > 0:
-        await db.orders.update_one(
-            {"_id": sell_order_id},
-            {"$set": {"status": "filled", "quantity_remaining": 0, "updated_at": datetime.utcnow()}},
+        # Keep the sell order open with remaining quantity and create a pending transaction for visibility
+        tx_doc = _transaction_doc(
+            user_id, username, meme, TransactionType.SELL,
+            listed_qty, list_price, list_price * listed_qty, TransactionStatus.PENDING,
         )
+        settlement.insert_transaction(tx_doc)
+        return _transaction_response(tx_doc), new_balance
 
-        seller_tx = {
-            "user_id": user_id,
-            "username": username,
-            "meme_id": trade.meme_id,
-            "meme_ticker": meme["ticker"],
-            "meme_name": meme["name"],
-            "transaction_type": TransactionType.SELL.value,
-            "quantity": filled_qty,
-            "price_per_share": (proceeds_gross / filled_qty) if filled_qty > 0 else last_trade_price,
-            "total_value": proceeds_net_total,
-            "status": TransactionStatus.COMPLETED.value,
-            "created_at": datetime.utcnow(),
-        }
-        tx_res = await db.transactions.insert_one(seller_tx)
+    if seller_tx is None:
+        # IOC whose bids vanished while escrowing; the shares are already handed back.
+        return _cancelled_response(meme, trade, list_price), new_balance
 
-        new_user = await db.users.find_one({"_id": ObjectId(user_id)})
-        new_balance = float(new_user.get("wallet_balance", 0)) if new_user else float(user.get("wallet_balance", 0))
+    # Fully filled immediately (GTC sell orders were journaled as "filled")
+    return _transaction_response(seller_tx), new_balance
 
-        await db.users.update_one(
-            {"_id": ObjectId(user_id)},
-            {"$inc": {"total_trades": 1}},
-        )
-
-        return TransactionResponse(
-            id=str(tx_res.inserted_id),
-            meme_ticker=seller_tx["meme_ticker"],
-            meme_name=seller_tx["meme_name"],
-            transaction_type=seller_tx["transaction_type"],
-            quantity=seller_tx["quantity"],
-            price_per_share=seller_tx["price_per_share"],
-            total_value=seller_tx["total_value"],
-            status=seller_tx["status"],
-            created_at=seller_tx["created_at"],
-        ), new_balance
 
-    # No bids matched: keep the sell order open at full remaining quantity and create a pending transaction for visibility
-    tx_doc = {
-        "user_id": user_id,
-        "username": username,
-        "meme_id": trade.meme_id,
-        "meme_ticker": meme["ticker"],
-        "meme_name": meme["name"],
-        "transaction_type": TransactionType.SELL.value,
-        "quantity": sell_qty,
-        "price_per_share": list_price,
-        "total_value": list_price * sell_qty,
-        "status": TransactionStatus.PENDING.value,
-        "created_at": datetime.utcnow(),
-    }
-    tx_res = await db.transactions.insert_one(tx_doc)
-
-    await db.users.update_one(
-        {"_id": ObjectId(user_id)},
-        {"$inc": {"total_trades": 1}},
+async def ensure_transaction_indexes() -> None:
+    """Compound indexes behind the keyset-paginated transaction histories."""
+    db = get_database()
+    await db.transactions.create_index([("user_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)])
+    await db.transactions.create_index(
+        [("user_id", ASCENDING), ("transaction_type", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)]
     )
-
-    return TransactionResponse(
-        id=str(tx_res.inserted_id),
-        meme_ticker=tx_doc["meme_ticker"],
-        meme_name=tx_doc["meme_name"],
-        transaction_type=tx_doc["transaction_type"],
-        quantity=tx_doc["quantity"],
-        price_per_share=tx_doc["price_per_share"],
-        total_value=tx_doc["total_value"],
-        status=tx_doc["status"],
-        created_at=tx_doc["created_at"],
-    ), float(user.get("wallet_balance", 0))
-    
-
+    await db.transactions.create_index([("meme_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)])
 
 
 async def get_user_transactions(
     user_id: str,
     page: int = 1,
     per_page: int = 20,
-    transaction_type: Optional[str] = None
-) -> Tuple[List[TransactionResponse], int]:
-    """Get user's transaction history."""
+    transaction_type: Optional[str] = None,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+) -> Tuple[List[TransactionResponse], Optional[int], Optional[str]]:
+    """Get user's transaction history, newest first. Returns (transactions, total, next_cursor); see get_all_memes."""
     db = get_database()
     
     query = {"user_id": user_id}
     if transaction_type:
         query["transaction_type"] = transaction_type
     
-    total = await db.transactions.count_documents(query)
-    
-    cursor = db.transactions.find(query).sort("created_at", -1).skip((page - 1) * per_page).limit(per_page)
-    transactions = await cursor.to_list(length=per_page)
+    total = await count_cache.count(db.transactions, query) if include_total else None
+    transactions, next_cursor = await fetch_page(
+        db.transactions, query, "created_at", -1, per_page, cursor=cursor, page=page,
+    )
     
     return [
         TransactionResponse(
@@ -1068,22 +1049,24 @@ async def get_user_transactions(
             status=t["status"],
             created_at=t["created_at"]
         ) for t in transactions
-    ], total
+    ], total, next_cursor
 
 
 async def get_meme_transactions(
     meme_id: str,
     page: int = 1,
-    per_page: int = 20
-) -> Tuple[List[TransactionResponse], int]:
-    """Get all transactions for a specific meme."""
+    per_page: int = 20,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+) -> Tuple[List[TransactionResponse], Optional[int], Optional[str]]:
+    """Get all transactions for a specific meme, newest first. Returns (transactions, total, next_cursor)."""
     db = get_database()
     
     query = {"meme_id": meme_id}
-    total = await db.transactions.count_documents(query)
-    
-    cursor = db.transactions.find(query).sort("created_at", -1).skip((page - 1) * per_page).limit(per_page)
-    transactions = await cursor.to_list(length=per_page)
+    total = await count_cache.count(db.transactions, query) if include_total else None
+    transactions, next_cursor = await fetch_page(
+        db.transactions, query, "created_at", -1, per_page, cursor=cursor, page=page,
+    )
     
     return [
         TransactionResponse(
@@ -1097,7 +1080,7 @@ async def get_meme_transactions(
             status=t["status"],
             created_at=t["created_at"]
         ) for t in transactions
-    ], total
+    ], total, next_cursor
 
 
 async def get_user_portfolio_value(user_id: str) -> dict:
@@ -1114,7 +1097,7 @@ async def get_user_portfolio_value(user_id: str) -> dict:
     holdings = []
     
     for holding in portfolio:
-        meme = await get_meme_by_id(holding["meme_id"])
+        meme = await get_meme_by_id(holding["meme_id"], {"ticker": 1, "name": 1, "current_price": 1})
         if meme:
             current_value = meme["current_price"] * holding["quantity_owned"]
             invested = holding["total_investment_value"]
@@ -1155,7 +1138,7 @@ async def get_user_open_orders(user_id: str) -> List[dict]:
         "$or": [{"buyer_id": user_id}, {"seller_id": user_id}],
         "status": "open"
     }).sort("created_at", -1):
-        meme = await get_meme_by_id(order["meme_id"])
+        meme = await get_meme_by_id(order["meme_id"], {"ticker": 1, "name": 1})
         orders.append({
             "id": str(order["_id"]),
             "type": order["type"],
@@ -1170,65 +1153,52 @@ async def get_user_open_orders(user_id: str) -> List[dict]:
     return orders
 
 
-async def cancel_order(user_id: str, order_id: str) -> bool:
-    """Cancel an open order."""
+async def find_cancellable_order(user_id: str, order_id: str) -> dict:
+    """Read an open order and check that `user_id` may cancel it."""
     db = get_database()
+    if not ObjectId.is_valid(order_id):
+        raise ValueError("Order not found or already filled/cancelled")
     order = await db.orders.find_one({"_id": ObjectId(order_id), "status": "open"})
     if not order:
         raise ValueError("Order not found or already filled/cancelled")
-    
+
     # Verify ownership
     if order.get("buyer_id") != user_id and order.get("seller_id") != user_id:
         raise ValueError("Not authorized to cancel this order")
-    
+    return order
+
+
+async def cancel_open_order(user_id: str, order: dict, settlement: Settlement) -> bool:
+    """
+    Cancel an order read by find_cancellable_order: pull it from the book and
+    record the refund (buy) or share return (sell) on `settlement`.
+    Like execute_trade, it must run on the meme's actor.
+    """
+    order_id = str(order["_id"])
+    meme_id = order["meme_id"]
+
+    # Pull it from the book first; the book is authoritative for what is still unfilled.
+    resting = get_order_book(meme_id).remove(order_id)
+    if resting is None:
+        raise ValueError("Order not found or already filled/cancelled")
+
+    qty = resting.quantity_remaining
     if order["type"] == "buy":
         # Refund reserved amount
-        refund = float(order.get("reserved_remaining", 0))
-        if refund > 0:
-            await db.users.update_one(
-                {"_id": ObjectId(user_id)},
-                {"$inc": {"wallet_balance": refund}}
-            )
+        settlement.credit(user_id, resting.price * qty)
     else:
-        # Return shares to portfolio
-        meme_id = order["meme_id"]
-        qty = int(order.get("quantity_remaining", 0))
-        if qty > 0:
-            # Check if holding exists
-            user = await db.users.find_one({"_id": ObjectId(user_id)})
-            portfolio = user.get("portfolio", [])
-            holding = next((p for p in portfolio if p["meme_id"] == meme_id), None)
-            
-            if holding:
-                await db.users.update_one(
-                    {"_id": ObjectId(user_id), "portfolio.meme_id": meme_id},
-                    {"$inc": {"portfolio.$.quantity_owned": qty}}
-                )
-            else:
-                # Should not happen for sell order, but handle it
-                # We need average buy price. Use current price or 0?
-                # Ideally we should have stored original avg price in order, but we didn't.
-                # We'll use 0 or current price.
-                meme = await get_meme_by_id(meme_id)
-                price = meme["current_price"] if meme else 0
-                await db.users.update_one(
-                    {"_id": ObjectId(user_id)},
-                    {
-                        "$push": {
-                            "portfolio": {
-                                "meme_id": meme_id,
-                                "quantity_owned": qty,
-                                "average_buy_price": price,
-                                "total_investment_value": price * qty
-                            }
-                        }
-                    }
-                )
-    
-    # Mark as cancelled
-    await db.orders.update_one(
-        {"_id": ObjectId(order_id)},
-        {"$set": {"status": "cancelled", "updated_at": datetime.utcnow()}}
-    )
-    
+        # Return escrowed shares; a holding dropped since is recreated at the ask price.
+        settlement.return_shares(user_id, meme_id, qty, resting.price)
+
+    settlement.cancel_order(order_id)
+    settlement.inc_meme(meme_id, f"open_{order['type']}_qty", -qty)
+    return True
+
+
+async def cancel_order(user_id: str, order_id: str) -> bool:
+    """Cancel an open order. Not serialized with trading; routes go through matching_actor.submit_cancel."""
+    order = await find_cancellable_order(user_id, order_id)
+    settlement = Settlement()
+    await cancel_open_order(user_id, order, settlement)
+    await settlement.flush()
     return True
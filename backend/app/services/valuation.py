@@ -0,0 +1,177 @@
+"""
+Bulk recompute of intrinsic values and trading bands.
+
+calculate_intrinsic_value / get_trading_band in meme_service price one meme
+at a time. After changing INTRINSIC_* or TRADING_BAND_* settings, this
+module refreshes the stored values for every meme at once: the inputs
+(upvotes, comments_count, total_trades) are loaded into NumPy arrays, the
+same formulas are applied vectorized, and only memes whose values changed
+are written back with chunked bulk_writes.
+
+Stored fields: intrinsic_value, min_allowed_price, max_allowed_price, and
+band_key, the (upvotes, comments_count, total_trades, settings) they were
+computed from. The band cache uses the stored band while band_key still
+matches the meme; once a vote, comment or trade moves an input it falls
+back to computing. Whether band_key is stale is worked out by the server
+while loading, against the current settings, so no key is built per meme
+in Python.
+
+The same write clamps current_price into the new band (with the usual
+ATH/ATL/market cap bookkeeping), so stored prices follow a settings change.
+Changed memes are dropped from this process's band and response caches,
+and clamped prices are applied to the market index. No candle ticks are
+recorded: nothing traded.
+"""
+
+import time
+from datetime import datetime
+from typing import Tuple
+
+import numpy as np
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.core.database import get_database
+from app.services.band_cache import band_cache, settings_version
+from app.services.market_index import market_index
+from app.services.meme_service import price_bookkeeping_stage
+from app.services.response_cache import response_cache
+
+
+BAND_FIELDS = ("intrinsic_value", "min_allowed_price", "max_allowed_price")
+
+
+def compute_bands(
+    upvotes: np.ndarray,
+    comments: np.ndarray,
+    total_trades: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Vectorized calculate_intrinsic_value + get_trading_band.
+    Returns (intrinsic, min_price, max_price) arrays, rounded the same way as the scalar versions.
+    """
+    intrinsic = (
+        float(settings.INTRINSIC_BASE_PRICE)
+        + upvotes * float(settings.INTRINSIC_UPVOTE_WEIGHT)
+        + comments * float(settings.INTRINSIC_COMMENT_WEIGHT)
+    )
+    intrinsic = np.maximum(0.01, np.round(intrinsic, 4))
+
+    min_price = np.maximum(0.01, np.round(intrinsic * float(settings.TRADING_BAND_MIN_MULTIPLIER), 4))
+    hype_multiplier = (
+        float(settings.TRADING_BAND_BASE_MAX_MULTIPLIER)
+        + total_trades * float(settings.TRADING_BAND_HYPE_FACTOR)
+    )
+    max_price = np.maximum(min_price, np.round(intrinsic * hype_multiplier, 4))
+    return intrinsic, min_price, max_price
+
+
+def _load_pipeline() -> list:
+    """
+    The band inputs, stored band and price of every meme, plus whether its
+    band_key matches those inputs under the current settings.
+    """
+    inputs = {field: {"$ifNull": ["$" + field, 0]} for field in ("upvotes", "comments_count", "total_trades")}
+    current_key = [*inputs.values(), {"$literal": list(settings_version())}]
+    stored_key = {"$ifNull": ["$band_key", []]}
+    return [{"$project": {
+        **inputs,
+        **{field: {"$ifNull": ["$" + field, None]} for field in BAND_FIELDS + ("current_price",)},
+        "fresh": {"$and": [
+            {"$eq": [{"$size": stored_key}, len(current_key)]},
+            *({"$eq": [{"$arrayElemAt": [stored_key, i]}, part]} for i, part in enumerate(current_key)),
+        ]},
+    }}]
+
+
+def _update_pipeline(intrinsic: float, min_price: float, max_price: float, key: list, now: datetime) -> list:
+    """Store the band and clamp current_price into it (server-side, so a concurrent trade price is respected)."""
+    price = {"$ifNull": ["$current_price", min_price]}
+    clamped = {"$min": [max_price, {"$max": [min_price, price]}]}
+    return [
+        {"$set": {
+            "intrinsic_value": intrinsic,
+            "min_allowed_price": min_price,
+            "max_allowed_price": max_price,
+            "band_key": key,
+            "band_updated_at": now,
+            "previous_price": {"$cond": [{"$eq": [clamped, price]}, "$previous_price", price]},
+            "current_price": clamped,
+        }},
+        price_bookkeeping_stage(now),
+    ]
+
+
+async def recompute_all_bands(chunk_size: int = 0) -> dict:
+    """
+    Recompute and store intrinsic value and trading band for every meme,
+    clamping current prices into the new bands.
+    Returns counts and timings.
+    """
+    db = get_database()
+    chunk_size = int(chunk_size or settings.BAND_RECOMPUTE_CHUNK_SIZE)
+    started = time.perf_counter()
+
+    columns = {field: [] for field in ("_id", "fresh", "upvotes", "comments_count", "total_trades", "current_price") + BAND_FIELDS}
+    cursor = db.memes.aggregate(_load_pipeline(), batchSize=chunk_size)
+    while True:
+        chunk = await cursor.to_list(length=chunk_size)
+        if not chunk:
+            break
+        for field, column in columns.items():
+            column.extend([meme[field] for meme in chunk])
+    loaded = time.perf_counter()
+
+    ids = columns["_id"]
+    upvotes = np.asarray(columns["upvotes"], dtype=np.int64)
+    comments = np.asarray(columns["comments_count"], dtype=np.int64)
+    trades = np.asarray(columns["total_trades"], dtype=np.int64)
+    intrinsic, min_price, max_price = compute_bands(
+        upvotes.astype(np.float64), comments.astype(np.float64), trades.astype(np.float64),
+    )
+    # Missing stored values / prices load as None, i.e. NaN, so they count as changed.
+    price = np.asarray(columns["current_price"], dtype=np.float64)
+    clamped = np.minimum(max_price, np.maximum(min_price, np.nan_to_num(price, nan=0.0)))
+    repriced = clamped != price
+    changed = (
+        ~np.asarray(columns["fresh"], dtype=bool)
+        | repriced
+        | (intrinsic != np.asarray(columns["intrinsic_value"], dtype=np.float64))
+        | (min_price != np.asarray(columns["min_allowed_price"], dtype=np.float64))
+        | (max_price != np.asarray(columns["max_allowed_price"], dtype=np.float64))
+    )
+    changed_idx = np.flatnonzero(changed)
+    computed = time.perf_counter()
+
+    now = datetime.utcnow()
+    version = list(settings_version())
+    for start in range(0, len(changed_idx), chunk_size):
+        ops = [
+            UpdateOne(
+                {"_id": ids[i]},
+                _update_pipeline(
+                    float(intrinsic[i]), float(min_price[i]), float(max_price[i]),
+                    [int(upvotes[i]), int(comments[i]), int(trades[i]), version], now,
+                ),
+            )
+            for i in changed_idx[start:start + chunk_size].tolist()
+        ]
+        await db.memes.bulk_write(ops, ordered=False)
+    for i in changed_idx.tolist():
+        meme_id = str(ids[i])
+        band_cache.invalidate(meme_id)
+        response_cache.invalidate_meme(meme_id)
+    repriced_idx = np.flatnonzero(repriced)
+    for i in repriced_idx.tolist():
+        market_index.on_price(str(ids[i]), float(clamped[i]))
+    finished = time.perf_counter()
+
+    return {
+        "memes": len(ids),
+        "updated": int(len(changed_idx)),
+        "repriced": int(len(repriced_idx)),
+        "load_seconds": round(loaded - started, 3),
+        "compute_seconds": round(computed - loaded, 3),
+        "write_seconds": round(finished - computed, 3),
+        "total_seconds": round(finished - started, 3),
+    }
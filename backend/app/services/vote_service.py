@@ -0,0 +1,173 @@
+"""
+Votes and reports, one document per (meme, user).
+
+They used to live in upvoted_by / downvoted_by / reported_by arrays on the
+meme, which grew without bound, were loaded with every meme and were
+checked with a linear scan. Now:
+- `votes`: {meme_id, user_id, direction: "up" | "down"}, unique on
+  (meme_id, user_id). Clearing a vote deletes the document.
+- `reports`: {meme_id, user_id}, unique on (meme_id, user_id).
+
+cast_vote() moves a user's vote atomically (each step is a single-document
+operation guarded by the unique index) and returns the previous and new
+direction; the caller turns that into exact $inc deltas for the meme's
+upvotes/downvotes counters, so concurrent clicks can't double count.
+user_votes() answers "has this user voted" for a whole page of memes with
+one $in query.
+
+The vote/report write and the counter $inc are separate writes, so a
+failure between them leaves a counter off by one. reconcile_vote_counters()
+recounts upvotes, downvotes and reports_count from the collections; it runs
+on startup and from `python -m app.reconcile votes`.
+"""
+
+from datetime import datetime
+from typing import Optional, List, Dict, Tuple
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from app.core.database import get_database
+
+
+UP = "up"
+DOWN = "down"
+
+
+async def ensure_vote_indexes() -> None:
+    db = get_database()
+    await db.votes.create_index([("meme_id", ASCENDING), ("user_id", ASCENDING)], unique=True)
+    await db.reports.create_index([("meme_id", ASCENDING), ("user_id", ASCENDING)], unique=True)
+
+
+async def cast_vote(meme_id: str, user_id: str, direction: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Toggle the user's `direction` vote on a meme: clears it if already cast,
+    otherwise sets it (replacing an opposite vote). Returns (previous, current).
+    """
+    db = get_database()
+    removed = await db.votes.find_one_and_delete(
+        {"meme_id": meme_id, "user_id": user_id, "direction": direction}
+    )
+    if removed:
+        return direction, None
+
+    now = datetime.utcnow()
+    for attempt in range(2):
+        try:
+            previous = await db.votes.find_one_and_update(
+                {"meme_id": meme_id, "user_id": user_id},
+                {
+                    "$set": {"direction": direction, "updated_at": now},
+                    "$setOnInsert": {"created_at": now},
+                },
+                upsert=True,
+                return_document=ReturnDocument.BEFORE,
+            )
+            return (previous or {}).get("direction"), direction
+        except DuplicateKeyError:
+            # A concurrent first vote inserted the document; the retry updates it.
+            if attempt:
+                raise
+
+
+def vote_counter_deltas(previous: Optional[str], current: Optional[str]) -> Dict[str, int]:
+    """$inc for the meme's upvotes/downvotes after a vote moved from `previous` to `current`."""
+    deltas: Dict[str, int] = {}
+    if previous == current:
+        return deltas
+    for vote, step in ((previous, -1), (current, 1)):
+        if vote is not None:
+            field = "upvotes" if vote == UP else "downvotes"
+            deltas[field] = deltas.get(field, 0) + step
+    return deltas
+
+
+async def user_votes(user_id: str, meme_ids: List[str]) -> Dict[str, str]:
+    """meme_id -> the user's vote direction, for the memes among `meme_ids` they voted on."""
+    if not meme_ids:
+        return {}
+    db = get_database()
+    cursor = db.votes.find({"meme_id": {"$in": meme_ids}, "user_id": user_id}, {"meme_id": 1, "direction": 1})
+    return {v["meme_id"]: v["direction"] async for v in cursor}
+
+
+async def add_report(meme_id: str, user_id: str) -> bool:
+    """Record a report; False if the user already reported the meme."""
+    try:
+        await get_database().reports.insert_one(
+            {"meme_id": meme_id, "user_id": user_id, "created_at": datetime.utcnow()}
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+async def migrate_vote_arrays() -> int:
+    """
+    Move legacy upvoted_by / downvoted_by / reported_by arrays into the votes
+    and reports collections and drop them from the memes. Safe to re-run.
+    Returns the number of memes migrated.
+    """
+    db = get_database()
+    now = datetime.utcnow()
+    migrated = 0
+    legacy = {"$or": [{f: {"$exists": True}} for f in ("upvoted_by", "downvoted_by", "reported_by")]}
+    async for meme in db.memes.find(legacy, {"upvoted_by": 1, "downvoted_by": 1, "reported_by": 1}):
+        meme_id = str(meme["_id"])
+        votes, reports = [], []
+        for field, direction in (("downvoted_by", DOWN), ("upvoted_by", UP)):
+            for user_id in meme.get(field) or []:
+                votes.append(UpdateOne(
+                    {"meme_id": meme_id, "user_id": user_id},
+                    {"$set": {"direction": direction, "updated_at": now}, "$setOnInsert": {"created_at": now}},
+                    upsert=True,
+                ))
+        for user_id in set(meme.get("reported_by") or []):
+            reports.append(UpdateOne(
+                {"meme_id": meme_id, "user_id": user_id},
+                {"$setOnInsert": {"created_at": now}},
+                upsert=True,
+            ))
+        if votes:
+            await db.votes.bulk_write(votes, ordered=True)
+        if reports:
+            await db.reports.bulk_write(reports, ordered=False)
+        await db.memes.update_one(
+            {"_id": meme["_id"]},
+            {"$unset": {"upvoted_by": "", "downvoted_by": "", "reported_by": ""}},
+        )
+        migrated += 1
+    return migrated
+
+
+async def reconcile_vote_counters() -> int:
+    """
+    Recompute upvotes / downvotes / reports_count on every meme from the
+    votes and reports collections, repairing drift in the $inc-maintained
+    counters. Returns the number of memes whose counters were corrected.
+    """
+    db = get_database()
+
+    totals: Dict[str, Dict[str, int]] = {}
+    pipeline = [{"$group": {"_id": {"meme_id": "$meme_id", "direction": "$direction"}, "total": {"$sum": 1}}}]
+    async for row in db.votes.aggregate(pipeline):
+        key = row["_id"]
+        field = "upvotes" if key.get("direction") == UP else "downvotes"
+        totals.setdefault(str(key.get("meme_id")), {})[field] = int(row.get("total", 0))
+    async for row in db.reports.aggregate([{"$group": {"_id": "$meme_id", "total": {"$sum": 1}}}]):
+        totals.setdefault(str(row["_id"]), {})["reports_count"] = int(row.get("total", 0))
+
+    ops = []
+    async for meme in db.memes.find({}, {"upvotes": 1, "downvotes": 1, "reports_count": 1}):
+        expected = totals.get(str(meme["_id"]), {})
+        fixed = {
+            field: int(expected.get(field, 0))
+            for field in ("upvotes", "downvotes", "reports_count")
+            if meme.get(field) != int(expected.get(field, 0))
+        }
+        if fixed:
+            ops.append(UpdateOne({"_id": meme["_id"]}, {"$set": fixed}))
+
+    if ops:
+        await db.memes.bulk_write(ops, ordered=False)
+    return len(ops)
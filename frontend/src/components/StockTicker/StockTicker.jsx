@@ -1,4 +1,5 @@
-import React from 'react';
+import React, { useEffect, useState } from 'react';
+import { memeService, streamService } from '../../services/api';
 import { TrendingUp, TrendingDown } from 'lucide-react';
 import './StockTicker.css';
 
@@ -15,9 +16,45 @@ const tickerData = [
   { name: 'GG', price: 45.67, change: -2.3, up: false },
 ];
 
+const toTickerItem = (meme) => {
+  const change = Number((meme.price_change_percent_24h || 0).toFixed(1));
+  return { id: meme.id, name: meme.ticker, price: meme.current_price, change, up: change >= 0 };
+};
+
 const StockTicker = () => {
+  const [items, setItems] = useState(tickerData);
+
+  // Trending memes once, then live prices over the price stream (no polling)
+  useEffect(() => {
+    let closeStream = null;
+    let cancelled = false;
+
+    memeService.getTrendingMemes().then((memes) => {
+      if (cancelled || !memes || memes.length === 0) return;
+      setItems(memes.map(toTickerItem));
+      closeStream = streamService.subscribePrices(memes.map((m) => m.id), (ticks) => {
+        const byId = Object.fromEntries(ticks.map((t) => [t.meme_id, t]));
+        setItems((prev) => prev.map((item) => {
+          const tick = byId[item.id];
+          if (!tick) return item;
+          return toTickerItem({
+            id: item.id,
+            ticker: item.name,
+            current_price: tick.price,
+            price_change_percent_24h: tick.price_change_percent_24h ?? item.change,
+          });
+        }));
+      });
+    }).catch(() => {});
+
+    return () => {
+      cancelled = true;
+      if (closeStream) closeStream();
+    };
+  }, []);
+
   // Double the data for seamless loop
-  const doubledData = [...tickerData, ...tickerData];
+  const doubledData = [...items, ...items];
 
   return (
     <div className="ticker-wrapper">
@@ -1,7 +1,7 @@
 import React, { useState, useEffect, useRef, useCallback } from 'react';
 import { useSearchParams } from 'react-router-dom';
 import { Search, Filter, Loader } from 'lucide-react';
-import { memeService } from '../services/api';
+import { memeService, streamService, PRICE_STREAM_MAX_MEMES } from '../services/api';
 import MemeCard from '../components/MemeCard';
 import TradeModal from '../components/TradeModal';
 import './FeedPage.css';
@@ -45,6 +45,7 @@ function FeedPage() {
   
   // Infinite scroll
   const [page, setPage] = useState(1);
+  const nextCursor = useRef(null);
   const observer = useRef();
   const lastMemeRef = useCallback(node => {
     if (loading) return;
@@ -70,12 +71,14 @@ function FeedPage() {
     setError(null);
     
     try {
+      // Keyset pagination: follow the cursor instead of a page offset
       const params = {
-        page: resetPage ? 1 : page,
         per_page: 10,
         sort_by: sortBy,
         sort_order: 'desc',
+        include_total: false,
       };
+      if (!resetPage && nextCursor.current) params.cursor = nextCursor.current;
       
       if (category) params.category = category;
       if (searchQuery) params.search = searchQuery;
@@ -89,7 +92,8 @@ function FeedPage() {
         setMemes(prevMemes => [...prevMemes, ...data.memes]);
       }
       
-      setHasMore(data.memes.length === 10);
+      nextCursor.current = data.next_cursor;
+      setHasMore(Boolean(data.next_cursor));
     } catch (err) {
       console.error('Error fetching memes:', err);
       setError('Failed to load memes. Please try again.');
@@ -132,6 +136,26 @@ function FeedPage() {
     return () => clearTimeout(timer);
   }, [searchQuery]);
 
+  // Live prices for the most recently loaded memes (one stream holds at most PRICE_STREAM_MAX_MEMES)
+  const memeIds = memes.slice(-PRICE_STREAM_MAX_MEMES).map((m) => m.id).join(',');
+  useEffect(() => {
+    if (!memeIds) return undefined;
+    return streamService.subscribePrices(memeIds.split(','), (ticks) => {
+      const byId = Object.fromEntries(ticks.map((t) => [t.meme_id, t]));
+      setMemes((prev) => prev.map((m) => {
+        const tick = byId[m.id];
+        if (!tick) return m;
+        return {
+          ...m,
+          current_price: tick.price,
+          volume_24h: tick.volume_24h ?? m.volume_24h,
+          price_change_24h: tick.price_change_24h ?? m.price_change_24h,
+          price_change_percent_24h: tick.price_change_percent_24h ?? m.price_change_percent_24h,
+        };
+      }));
+    });
+  }, [memeIds]);
+
   // Handle meme interactions
   const handleUpvote = async (memeId) => {
     try {
@@ -92,6 +92,10 @@ export const authService = {
 
 // ============ MEME SERVICES ============
 export const memeService = {
+  /**
+   * List memes. For infinite scroll pass the previous response's next_cursor
+   * as params.cursor (and include_total: false to skip counting).
+   */
   getMemes: async (params = {}) => {
     const response = await api.get('/memes', { params });
     return response.data;
@@ -150,6 +154,16 @@ export const memeService = {
   getComments: async (id, page = 1, perPage = 20) => {
     const response = await api.get(`/memes/${id}/comments`, { params: { page, per_page: perPage } });
     return response.data;
+  },
+
+  getOrderBook: async (id, levels = 10) => {
+    const response = await api.get(`/memes/${id}/orderbook`, { params: { levels } });
+    return response.data;
+  },
+
+  getCandles: async (id, res = '1m', from, to) => {
+    const response = await api.get(`/memes/${id}/candles`, { params: { res, from, to } });
+    return response.data;
   }
 };
 
@@ -192,6 +206,51 @@ export const tradingService = {
   }
 };
 
+// ============ MARKET SERVICES ============
+export const marketService = {
+  getIndex: async () => {
+    const response = await api.get('/market/index');
+    return response.data;
+  },
+
+  getIndexCandles: async (category, res = '1h', from, to) => {
+    const response = await api.get('/market/index/candles', { params: { category, res, from, to } });
+    return response.data;
+  }
+};
+
+// ============ STREAM SERVICES ============
+// Keep in sync with PRICE_STREAM_MAX_MEMES on the backend; larger subscriptions are rejected with a 400.
+export const PRICE_STREAM_MAX_MEMES = 200;
+// Give up after this many errors in a row without a single event (bad request, server gone).
+const PRICE_STREAM_MAX_FAILURES = 5;
+
+export const streamService = {
+  // Live price ticks over SSE. onTicks receives arrays of { meme_id, price, ...24h stats };
+  // the initial snapshot arrives the same way. Only the first PRICE_STREAM_MAX_MEMES ids are
+  // subscribed. Returns a function that closes the stream.
+  subscribePrices: (memeIds, onTicks) => {
+    const ids = (memeIds || []).slice(0, PRICE_STREAM_MAX_MEMES);
+    const query = ids.length ? `?memes=${ids.join(',')}` : '';
+    const source = new EventSource(`${API_BASE_URL}/stream/prices${query}`);
+    let failures = 0;
+    const handle = (event) => {
+      failures = 0;
+      onTicks(JSON.parse(event.data));
+    };
+    source.addEventListener('snapshot', handle);
+    source.addEventListener('ticks', handle);
+    source.onerror = () => {
+      // EventSource retries on its own; stop it if the stream was refused or keeps failing.
+      failures += 1;
+      if (source.readyState === EventSource.CLOSED || failures >= PRICE_STREAM_MAX_FAILURES) {
+        source.close();
+      }
+    };
+    return () => source.close();
+  }
+};
+
 // ============ USER SERVICES ============
 export const userService = {
   getLeaderboard: async (limit = 10) => {
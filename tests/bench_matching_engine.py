@@ -0,0 +1,358 @@
+"""
+Matching engine benchmark.
+
+Drives trading_service.execute_trade / cancel_order directly (no HTTP, no
+matching actors) with deterministic synthetic order flow and reports, per
+scenario: trades/sec, p50/p99 latency and database calls per trade.
+
+Scenarios:
+    ipo_buy         market buys from the IPO pool
+    crossing_limit  alternating limit sells/buys around the current price
+    deep_sweep      one buy sweeping many resting ask levels
+    cancel          resting bids placed and then cancelled (cancels are timed)
+
+Backends:
+    mongomock   in-process stand-in (mongomock-motor), no server needed
+    mongod      a real server at --mongodb-url (uses a throwaway database)
+
+Usage (from the repo root):
+    python tests/bench_matching_engine.py
+    python tests/bench_matching_engine.py --backend mongod --mongodb-url mongodb://localhost:27017
+    python tests/bench_matching_engine.py --write-baseline     # refresh tests/bench_matching_engine_baseline.json
+
+Absolute timings depend on the machine; db_calls_per_trade is deterministic
+for a given seed and is the number to watch when diffing against the baseline.
+The run exits with status 1 if any scenario makes more db calls per op than
+the baseline (same backend, seed and trade count only).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+from bson import ObjectId  # noqa: E402
+
+from app.core import database  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.models.meme import MemeCreate  # noqa: E402
+from app.models.transaction import TransactionCreate, TransactionType  # noqa: E402
+from app.services import orderbook  # noqa: E402
+from app.services.meme_service import create_meme  # noqa: E402
+from app.services.trading_service import execute_trade, cancel_order  # noqa: E402
+
+# db calls/op may exceed the baseline by this much before the run fails (rounding only).
+DB_CALLS_TOLERANCE = 0.005
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_matching_engine_baseline.json")
+BENCH_DATABASE = "memestreet_bench"
+
+# Collection methods that cost (at least) one round trip to the server.
+DB_METHODS = {
+    "find", "find_one", "find_one_and_update", "insert_one", "insert_many",
+    "update_one", "update_many", "delete_one", "delete_many", "bulk_write",
+    "aggregate", "count_documents",
+}
+
+
+# ============ DB call counting ============
+class CallCounter:
+    def __init__(self):
+        self.calls = 0
+
+
+class _CountingCollection:
+    def __init__(self, collection, counter: CallCounter):
+        self._collection = collection
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in DB_METHODS:
+            return attr
+
+        def counted(*args, **kwargs):
+            self._counter.calls += 1
+            return attr(*args, **kwargs)
+        return counted
+
+
+class _CountingDatabase:
+    def __init__(self, db, counter: CallCounter):
+        self._db = db
+        self._counter = counter
+
+    def __getitem__(self, name):
+        return _CountingCollection(self._db[name], self._counter)
+
+    def __getattr__(self, name):
+        return _CountingCollection(getattr(self._db, name), self._counter)
+
+
+class _CountingClient:
+    def __init__(self, client, counter: CallCounter):
+        self._client = client
+        self._counter = counter
+
+    def __getitem__(self, name):
+        return _CountingDatabase(self._client[name], self._counter)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def _add_mongomock_round() -> None:
+    """mongomock doesn't implement the $round expression the repricing pipelines use."""
+    import mongomock.aggregate as aggregate
+
+    if "$round" in aggregate.arithmetic_operators:
+        return
+    aggregate.arithmetic_operators.add("$round")
+    handle = aggregate._Parser._handle_arithmetic_operator
+
+    def handle_with_round(parser, operator, values):
+        if operator != "$round":
+            return handle(parser, operator, values)
+        number, places = list(parser.parse_many(values))
+        return None if number is None else round(number, places)
+
+    aggregate._Parser._handle_arithmetic_operator = handle_with_round
+
+
+def make_client(backend: str, mongodb_url: str):
+    if backend == "mongomock":
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("mongomock backend needs `pip install -r backend/requirements-dev.txt` (or use --backend mongod)")
+        _add_mongomock_round()
+        return AsyncMongoMockClient()
+    from motor.motor_asyncio import AsyncIOMotorClient
+    return AsyncIOMotorClient(mongodb_url)
+
+
+# ============ Fixtures ============
+async def reset_state(raw_client) -> None:
+    await raw_client.drop_database(BENCH_DATABASE)
+    orderbook._books.clear()
+
+
+async def make_user(name: str, balance: float = 1e9) -> str:
+    db = database.get_database()
+    result = await db.users.insert_one({
+        "username": name,
+        "email": f"{name}@bench.local",
+        "wallet_balance": balance,
+        "portfolio": [],
+        "total_trades": 0,
+        "created_at": datetime.utcnow(),
+    })
+    return str(result.inserted_id)
+
+
+async def make_meme(creator_id: str, ticker: str, ipo_open: bool) -> str:
+    meme = await create_meme(
+        MemeCreate(name=ticker, ticker=ticker, description="bench", image_url="x", initial_price=10.0),
+        creator_id,
+        "creator",
+    )
+    if not ipo_open:
+        await database.get_database().memes.update_one(
+            {"_id": ObjectId(meme.id)},
+            {"$set": {"ipo_end_at": datetime.utcnow() - timedelta(minutes=1)}},
+        )
+    return meme.id
+
+
+def order(meme_id: str, side: str, quantity: int, price=None) -> TransactionCreate:
+    return TransactionCreate(
+        meme_id=meme_id,
+        transaction_type=TransactionType(side),
+        quantity=quantity,
+        limit_price=price,
+    )
+
+
+# ============ Scenarios ============
+# Each scenario is an async generator of timed operations (coroutine factories).
+# Setup work inside a scenario is awaited directly and not measured.
+async def scenario_ipo_buy(rng: random.Random, n: int):
+    creator = await make_user("creator")
+    meme_id = await make_meme(creator, "BIPO", ipo_open=True)
+    buyers = [await make_user(f"ipo{i}") for i in range(20)]
+    for i in range(n):
+        user = buyers[i % len(buyers)]
+        yield lambda u=user, q=rng.randint(1, 20): execute_trade(u, None, order(meme_id, "buy", q))
+
+
+async def scenario_crossing_limit(rng: random.Random, n: int):
+    creator = await make_user("creator")
+    meme_id = await make_meme(creator, "BCRS", ipo_open=False)
+    buyers = [await make_user(f"crs{i}") for i in range(20)]
+    for i in range(n):
+        price = round(rng.uniform(9.5, 10.5), 2)
+        qty = rng.randint(1, 50)
+        if i % 2 == 0:
+            yield lambda p=price, q=qty: execute_trade(creator, None, order(meme_id, "sell", q, p))
+        else:
+            user = buyers[i % len(buyers)]
+            yield lambda u=user, p=price, q=qty: execute_trade(u, None, order(meme_id, "buy", q, p))
+
+
+async def scenario_deep_sweep(rng: random.Random, n: int, depth: int = 20):
+    creator = await make_user("creator")
+    meme_id = await make_meme(creator, "BSWP", ipo_open=False)
+    buyer = await make_user("sweeper")
+    for _ in range(n):
+        # Rest `depth` asks on distinct levels, then time one buy that takes them all.
+        total = 0
+        for level in range(depth):
+            qty = rng.randint(1, 10)
+            total += qty
+            await execute_trade(creator, None, order(meme_id, "sell", qty, round(9.0 + level * 0.05, 2)))
+        yield lambda q=total: execute_trade(buyer, None, order(meme_id, "buy", q, 12.0))
+
+
+async def scenario_cancel(rng: random.Random, n: int):
+    creator = await make_user("creator")
+    meme_id = await make_meme(creator, "BCXL", ipo_open=False)
+    users = [await make_user(f"cxl{i}") for i in range(20)]
+    for i in range(n):
+        user = users[i % len(users)]
+        await execute_trade(user, None, order(meme_id, "buy", rng.randint(1, 50), round(rng.uniform(6.0, 8.0), 2)))
+        resting = await database.get_database().orders.find_one(
+            {"buyer_id": user, "status": "open"}, sort=[("created_at", -1)]
+        )
+        yield lambda u=user, oid=str(resting["_id"]): cancel_order(u, oid)
+
+
+SCENARIOS = {
+    "ipo_buy": scenario_ipo_buy,
+    "crossing_limit": scenario_crossing_limit,
+    "deep_sweep": scenario_deep_sweep,
+    "cancel": scenario_cancel,
+}
+
+
+# ============ Runner ============
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+async def run_scenario(name: str, raw_client, counter: CallCounter, seed: int, n: int) -> dict:
+    await reset_state(raw_client)
+    rng = random.Random(f"{seed}:{name}")
+    latencies = []
+    calls = 0
+    elapsed = 0.0
+    async for op in SCENARIOS[name](rng, n):
+        before = counter.calls
+        start = time.perf_counter()
+        await op()
+        took = time.perf_counter() - start
+        calls += counter.calls - before
+        elapsed += took
+        latencies.append(took)
+
+    count = len(latencies)
+    return {
+        "trades": count,
+        "seconds": round(elapsed, 4),
+        "trades_per_sec": round(count / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "db_calls_per_trade": round(calls / count, 2) if count else 0.0,
+    }
+
+
+def compare(report: dict, baseline: dict) -> List[str]:
+    """Print the run against the baseline. Returns the scenarios whose db calls/op went up."""
+    print(f"\nvs baseline ({baseline.get('backend')}, seed {baseline.get('seed')}):")
+    comparable = all(report.get(k) == baseline.get(k) for k in ("backend", "seed", "trades_per_scenario"))
+    regressions = []
+    for name, now in report["scenarios"].items():
+        then = baseline.get("scenarios", {}).get(name)
+        if not then:
+            print(f"  {name:<15} (no baseline)")
+            continue
+        parts = []
+        for key in ("trades_per_sec", "p50_ms", "p99_ms", "db_calls_per_trade"):
+            old, new = then.get(key), now.get(key)
+            if old:
+                parts.append(f"{key} {old} -> {new} ({(new - old) / old * 100:+.1f}%)")
+        print(f"  {name:<15} " + ", ".join(parts))
+        if comparable and now["db_calls_per_trade"] > then.get("db_calls_per_trade", 0) + DB_CALLS_TOLERANCE:
+            regressions.append(f"{name}: {then['db_calls_per_trade']} -> {now['db_calls_per_trade']} db calls/op")
+    if not comparable:
+        print("  (backend, seed or trade count differ from the baseline; db calls not checked)")
+    return regressions
+
+
+async def main(args) -> dict:
+    raw_client = make_client(args.backend, args.mongodb_url)
+    counter = CallCounter()
+    settings.DATABASE_NAME = BENCH_DATABASE
+    database.db.client = _CountingClient(raw_client, counter)
+
+    names = args.scenario or list(SCENARIOS)
+    report = {
+        "backend": args.backend,
+        "seed": args.seed,
+        "trades_per_scenario": args.trades,
+        "scenarios": {},
+    }
+    try:
+        for name in names:
+            result = await run_scenario(name, raw_client, counter, args.seed, args.trades)
+            report["scenarios"][name] = result
+            print(
+                f"{name:<15} {result['trades']:>5} ops  {result['trades_per_sec']:>9.1f}/s  "
+                f"p50 {result['p50_ms']:>8.3f}ms  p99 {result['p99_ms']:>8.3f}ms  "
+                f"{result['db_calls_per_trade']:>6.2f} db calls/op"
+            )
+        await reset_state(raw_client)
+    finally:
+        if args.backend == "mongod":
+            raw_client.close()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark trading_service.execute_trade")
+    parser.add_argument("--backend", choices=["mongomock", "mongod"], default="mongomock")
+    parser.add_argument("--mongodb-url", default=os.environ.get("MONGODB_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--trades", type=int, default=300, help="timed operations per scenario")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="run only these (repeatable)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--write-baseline", action="store_true", help="overwrite the baseline with this run")
+    parser.add_argument("--json", help="also write this run's report to a file")
+    args = parser.parse_args()
+
+    report = asyncio.run(main(args))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.write_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f))
+        if regressions:
+            # Timings depend on the machine, db calls don't: only those fail the run.
+            print("\nDB call regressions against the baseline:\n  " + "\n  ".join(regressions))
+            print("Fix them, or refresh the baseline with --write-baseline if the extra calls are intended.")
+            sys.exit(1)
@@ -0,0 +1,55 @@
+"""
+Shared setup for the unit tests: puts backend/ on the path and provides an
+in-memory Mongo (mongomock-motor, see backend/requirements-dev.txt).
+
+test_portfolio.py is an integration check against a running API on
+localhost:8000; leave it out (`--ignore=tests/test_portfolio.py`) without one.
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+
+def _add_mongomock_round() -> None:
+    """mongomock doesn't implement the $round expression the repricing pipelines use."""
+    import mongomock.aggregate as aggregate
+
+    if "$round" in aggregate.arithmetic_operators:
+        return
+    aggregate.arithmetic_operators.add("$round")
+    handle = aggregate._Parser._handle_arithmetic_operator
+
+    def handle_with_round(parser, operator, values):
+        if operator != "$round":
+            return handle(parser, operator, values)
+        number, places = list(parser.parse_many(values))
+        return None if number is None else round(number, places)
+
+    aggregate._Parser._handle_arithmetic_operator = handle_with_round
+
+
+@pytest.fixture
+def db():
+    """A fresh in-memory database behind app.core.database, and empty order books."""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    from app.core import database
+    from app.services import orderbook
+
+    _add_mongomock_round()
+    previous = database.db.client
+    database.db.client = mongomock_motor.AsyncMongoMockClient()
+    orderbook._books.clear()
+    yield database.get_database()
+    database.db.client = previous
+    orderbook._books.clear()
+
+
+def run(coro):
+    """Run one coroutine to completion (the tests are plain functions)."""
+    return asyncio.run(coro)
@@ -0,0 +1,116 @@
+from app.services.orderbook import OrderBook, RestingOrder
+
+
+def resting(order_id, side, price, quantity):
+    return RestingOrder(order_id, side, "meme", f"owner-{order_id}", order_id, price, quantity)
+
+
+def book_with_asks(*asks):
+    book = OrderBook("meme")
+    for order_id, price, quantity in asks:
+        book.add(resting(order_id, "sell", price, quantity))
+    return book
+
+
+def level_ids(book, side, price):
+    return list(book._levels[side][price].orders)
+
+
+def test_match_takes_best_price_then_arrival_order():
+    book = book_with_asks(("a", 10.5, 5), ("b", 10.0, 3), ("c", 10.0, 4))
+
+    fills = book.match("buy", 11.0, 9)
+
+    assert [(order.order_id, take) for order, take in fills] == [("b", 3), ("c", 4), ("a", 2)]
+    assert book.best_price("sell") == 10.5
+    assert book.get("a").quantity_remaining == 3
+    assert "b" not in book and "c" not in book
+    assert book.open_quantity("sell") == 3
+
+
+def test_match_stops_at_limit_price():
+    book = book_with_asks(("a", 10.0, 2), ("b", 12.0, 5))
+
+    fills = book.match("buy", 11.0, 10)
+
+    assert [(order.order_id, take) for order, take in fills] == [("a", 2)]
+    assert book.best_price("sell") == 12.0
+
+
+def test_sell_crosses_bids_at_or_above_limit():
+    book = OrderBook("meme")
+    book.add(resting("low", "buy", 9.0, 5))
+    book.add(resting("high", "buy", 9.5, 5))
+
+    fills = book.match("sell", 9.5, 8)
+
+    assert [(order.order_id, take) for order, take in fills] == [("high", 5)]
+    assert book.best_price("buy") == 9.0
+
+
+def test_fillable_matches_match_without_touching_the_book():
+    book = book_with_asks(("a", 10.0, 2), ("b", 10.5, 3), ("c", 12.0, 5))
+
+    assert book.fillable("buy", 11.0, 4) == 4
+    assert book.fillable("buy", 11.0, 10) == 5
+    assert book.fillable("buy", 9.0, 10) == 0
+    assert book.open_quantity("sell") == 10
+    assert sum(take for _, take in book.match("buy", 11.0, 10)) == 5
+
+
+def test_depth_aggregates_levels_best_first():
+    book = book_with_asks(("a", 10.0, 2), ("b", 10.0, 3), ("c", 11.0, 1))
+    book.add(resting("d", "buy", 9.0, 4))
+
+    depth = book.depth(1)
+
+    assert depth["asks"] == [{"price": 10.0, "quantity": 5, "orders": 2}]
+    assert depth["bids"] == [{"price": 9.0, "quantity": 4, "orders": 1}]
+
+
+def test_rollback_undoes_adds_and_fills():
+    book = book_with_asks(("a", 10.0, 2), ("b", 10.0, 3), ("c", 10.5, 4))
+    book.checkpoint()
+    book.match("buy", 10.5, 6)
+    book.add(resting("new", "buy", 9.0, 7))
+
+    assert book.rollback() == []
+
+    assert level_ids(book, "sell", 10.0) == ["a", "b"]
+    assert [book.get(i).quantity_remaining for i in ("a", "b", "c")] == [2, 3, 4]
+    assert book.open_quantity("sell") == 9
+    assert "new" not in book and book.best_price("buy") is None
+
+
+def test_unfill_puts_fully_filled_order_back_at_the_front():
+    book = book_with_asks(("a", 10.0, 2), ("b", 10.0, 3))
+    book.checkpoint()
+    book.match("buy", 10.0, 2)
+    assert level_ids(book, "sell", 10.0) == ["b"]
+
+    book.rollback()
+
+    assert level_ids(book, "sell", 10.0) == ["a", "b"]
+    assert book._levels["sell"][10.0].total_quantity == 5
+
+
+def test_rollback_keeps_orders_cancelled_since_the_checkpoint_out():
+    book = book_with_asks(("a", 10.0, 2), ("b", 10.5, 3))
+    book.checkpoint()
+    book.match("buy", 10.5, 3)
+    book.remove("b")
+
+    assert book.rollback() == ["b"]
+
+    assert "b" not in book
+    assert book.get("a").quantity_remaining == 2
+
+
+def test_commit_stops_recording():
+    book = book_with_asks(("a", 10.0, 2))
+    book.checkpoint()
+    book.match("buy", 10.0, 2)
+    book.commit()
+
+    assert book.rollback() == []
+    assert "a" not in book
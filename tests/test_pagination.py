@@ -0,0 +1,42 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from app.services.pagination import decode_cursor, encode_cursor, keyset_query
+
+
+@pytest.mark.parametrize("value", [12.5, 0, None, "TICKER", datetime(2024, 5, 1, 12, 30, 15, 123000)])
+def test_cursor_round_trips_sort_value_and_id(value):
+    doc_id = ObjectId()
+
+    token = encode_cursor("current_price", value, doc_id)
+
+    assert "=" not in token
+    assert decode_cursor(token, "current_price") == (value, doc_id)
+
+
+def test_cursor_from_another_sort_is_rejected():
+    token = encode_cursor("created_at", 1, ObjectId())
+
+    with pytest.raises(ValueError, match="different sort order"):
+        decode_cursor(token, "current_price")
+
+
+@pytest.mark.parametrize("token", ["not a cursor", "", "bm9wZQ", encode_cursor("x", 1, ObjectId())[:-3]])
+def test_garbage_cursor_is_invalid(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token, "x")
+
+
+def test_keyset_query_continues_after_the_cursor_position():
+    doc_id = ObjectId()
+
+    query = keyset_query({"is_active": True}, "current_price", -1, 5.0, doc_id)
+
+    assert query["is_active"] is True
+    assert query["$and"] == [{"$or": [
+        {"current_price": {"$lt": 5.0}},
+        {"current_price": 5.0, "_id": {"$lt": doc_id}},
+        {"current_price": None},
+    ]}]
@@ -0,0 +1,45 @@
+from bson import ObjectId
+
+from app.models.transaction import TransactionCreate, TransactionType
+from app.services.matching_actor import _precheck_batch
+
+MEME = str(ObjectId())
+OTHER = str(ObjectId())
+
+
+def order(side, quantity, limit_price=None, meme_id=MEME):
+    return TransactionCreate(
+        meme_id=meme_id, transaction_type=TransactionType(side), quantity=quantity, limit_price=limit_price,
+    )
+
+
+def user(balance=100.0, holdings=None):
+    portfolio = [{"meme_id": meme_id, "quantity_owned": qty} for meme_id, qty in (holdings or {}).items()]
+    return {"wallet_balance": balance, "portfolio": portfolio}
+
+
+def test_limit_buys_reserve_against_the_snapshot_balance_in_order():
+    errors = _precheck_batch(user(100.0), [order("buy", 5, 10.0), order("buy", 4, 10.0), order("buy", 5, 10.0)])
+
+    assert errors[:2] == [None, None]
+    assert errors[2] == "Insufficient balance. Need $50.00, have $10.00"
+
+
+def test_sells_reserve_against_snapshot_holdings():
+    errors = _precheck_batch(
+        user(holdings={MEME: 10}),
+        [order("sell", 6, 1.0), order("sell", 5, 1.0), order("sell", 4, 1.0), order("sell", 1, 1.0, OTHER)],
+    )
+
+    assert errors == [
+        None,
+        "Not enough shares to sell. You own 4 shares.",
+        None,
+        "Not enough shares to sell. You own 0 shares.",
+    ]
+
+
+def test_market_buys_and_bad_ids_are_checked_cheaply():
+    errors = _precheck_batch(user(0.0), [order("buy", 1000), order("buy", 1, 1.0, meme_id="not-an-id")])
+
+    assert errors == [None, "Meme not found"]
@@ -0,0 +1,101 @@
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.services.settlement import Settlement
+from conftest import run
+
+
+async def make_user(db, balance=100.0, portfolio=None):
+    result = await db.users.insert_one({"wallet_balance": balance, "portfolio": portfolio or []})
+    return str(result.inserted_id)
+
+
+async def wallet(db, user_id):
+    return (await db.users.find_one({"_id": ObjectId(user_id)}))["wallet_balance"]
+
+
+def test_flush_merges_repeated_effects_into_one_write(db):
+    async def scenario():
+        user_id = await make_user(db)
+        settlement = Settlement()
+        settlement.credit(user_id, 5.0)
+        settlement.credit(user_id, 2.5)
+        settlement.buy_shares(user_id, "meme", 2, 10.0)
+        settlement.buy_shares(user_id, "meme", 2, 20.0)
+        settlement.credit("system", 99.0)
+        await settlement.flush()
+        return await db.users.find_one({"_id": ObjectId(user_id)})
+
+    user = run(scenario())
+
+    assert user["wallet_balance"] == 107.5
+    assert user["portfolio"] == [{
+        "meme_id": "meme", "quantity_owned": 4, "average_buy_price": 15.0, "total_investment_value": 60.0,
+    }]
+
+
+def test_rollback_drops_recorded_effects_and_applies_undo(db):
+    async def scenario():
+        user_id = await make_user(db)
+        # A guarded debit already made outside the settlement...
+        await db.users.update_one({"_id": ObjectId(user_id)}, {"$inc": {"wallet_balance": -40.0}})
+        settlement = Settlement()
+        settlement.refund_on_rollback(user_id, 40.0)
+        # ...and effects that were only recorded.
+        settlement.credit(user_id, 1000.0)
+        settlement.insert_transaction({"user_id": user_id})
+        await settlement.rollback()
+        await settlement.flush()
+        return await wallet(db, user_id), await db.transactions.count_documents({})
+
+    assert run(scenario()) == (100.0, 0)
+
+
+def test_rollback_applies_undo_newest_first(db):
+    async def scenario():
+        user_id = await make_user(db, portfolio=[{"meme_id": "meme", "quantity_owned": 5, "average_buy_price": 2.0}])
+        settlement = Settlement()
+        settlement.undo("users", UpdateOne({"_id": ObjectId(user_id)}, {"$set": {"wallet_balance": 1.0}}))
+        settlement.undo("users", UpdateOne({"_id": ObjectId(user_id)}, {"$set": {"wallet_balance": 2.0}}))
+        settlement.return_shares_on_rollback(user_id, "meme", 3, 9.0)
+        await settlement.rollback()
+        return await db.users.find_one({"_id": ObjectId(user_id)})
+
+    user = run(scenario())
+
+    assert user["wallet_balance"] == 1.0
+    assert user["portfolio"][0]["quantity_owned"] == 8
+    assert user["portfolio"][0]["average_buy_price"] == 2.0
+
+
+def test_rollback_to_checkpoint_keeps_earlier_trades(db):
+    async def scenario():
+        first, second = await make_user(db), await make_user(db)
+        settlement = Settlement()
+        settlement.credit(first, 10.0)
+        settlement.inc_meme(str(ObjectId()), "open_sell_qty", 1)
+
+        mark = settlement.checkpoint()
+        await db.users.update_one({"_id": ObjectId(second)}, {"$inc": {"wallet_balance": -30.0}})
+        settlement.refund_on_rollback(second, 30.0)
+        settlement.credit(first, 500.0)
+        settlement.insert_transaction({"user_id": second})
+        await settlement.rollback(mark)
+
+        await settlement.flush()
+        return await wallet(db, first), await wallet(db, second), await db.transactions.count_documents({})
+
+    assert run(scenario()) == (110.0, 100.0, 0)
+
+
+def test_flush_clears_undo(db):
+    async def scenario():
+        user_id = await make_user(db)
+        settlement = Settlement()
+        settlement.refund_on_rollback(user_id, 50.0)
+        settlement.credit(user_id, 1.0)
+        await settlement.flush()
+        await settlement.rollback()
+        return await wallet(db, user_id), settlement.started_writing
+
+    assert run(scenario()) == (101.0, True)
@@ -0,0 +1,88 @@
+from bson import ObjectId
+
+from app.services.meme_service import downvote_meme, report_meme, upvote_meme
+from app.services.vote_service import DOWN, UP, cast_vote, ensure_vote_indexes, vote_counter_deltas
+from conftest import run
+
+
+async def make_meme(db):
+    result = await db.memes.insert_one({
+        "current_price": 10.0, "upvotes": 0, "downvotes": 0, "comments_count": 0, "total_trades": 0,
+    })
+    return str(result.inserted_id)
+
+
+async def counters(db, meme_id):
+    meme = await db.memes.find_one({"_id": ObjectId(meme_id)})
+    return meme["upvotes"], meme["downvotes"]
+
+
+def test_cast_vote_toggles_and_replaces(db):
+    async def scenario():
+        return [
+            await cast_vote("m", "u", UP),
+            await cast_vote("m", "u", UP),
+            await cast_vote("m", "u", DOWN),
+            await cast_vote("m", "u", UP),
+            await db.votes.count_documents({}),
+        ]
+
+    assert run(scenario()) == [(None, UP), (UP, None), (None, DOWN), (DOWN, UP), 1]
+
+
+def test_vote_counter_deltas():
+    assert vote_counter_deltas(None, UP) == {"upvotes": 1}
+    assert vote_counter_deltas(UP, None) == {"upvotes": -1}
+    assert vote_counter_deltas(DOWN, UP) == {"downvotes": -1, "upvotes": 1}
+    assert vote_counter_deltas(UP, UP) == {}
+
+
+def test_vote_toggling_keeps_counters_exact(db):
+    async def scenario():
+        meme_id = await make_meme(db)
+        seen = []
+        for vote in (upvote_meme, upvote_meme, downvote_meme, upvote_meme, downvote_meme, downvote_meme):
+            cast = (await vote(meme_id, "user"))[0]
+            seen.append((cast, *await counters(db, meme_id)))
+        await upvote_meme(meme_id, "other")
+        seen.append(await counters(db, meme_id))
+        return seen
+
+    assert run(scenario()) == [
+        (True, 1, 0),
+        (False, 0, 0),
+        (True, 0, 1),
+        (True, 1, 0),
+        (True, 0, 1),
+        (False, 0, 0),
+        (1, 0),
+    ]
+
+
+def test_vote_on_missing_meme_is_rejected(db):
+    async def scenario():
+        errors = []
+        for vote in (upvote_meme, downvote_meme):
+            try:
+                await vote(str(ObjectId()), "user")
+            except ValueError as e:
+                errors.append(str(e))
+        return errors, await db.votes.count_documents({})
+
+    assert run(scenario()) == (["Meme not found", "Meme not found"], 0)
+
+
+def test_report_counts_once_per_user(db):
+    async def scenario():
+        await ensure_vote_indexes()
+        meme_id = await make_meme(db)
+        first = (await report_meme(meme_id, "user"))[0]
+        again = await report_meme(meme_id, "user")
+        try:
+            await report_meme(str(ObjectId()), "user")
+        except ValueError as e:
+            missing = str(e)
+        meme = await db.memes.find_one({"_id": ObjectId(meme_id)})
+        return first, again, missing, meme["reports_count"], await db.reports.count_documents({})
+
+    assert run(scenario()) == (True, (False, 10.0, 0, 0), "Meme not found", 1, 1)